@@ -0,0 +1,270 @@
+#
+# Copyright (c) 2014 Chris Jerdonek. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+"""Exposes an asyncio counterpart to the stream resource API.
+
+Every stream resource supports async reading and writing via its
+areading() and awriting() methods, for example--
+
+    async with resource.areading() as agen:
+        async for item in agen:
+            # Do stuff.
+            ...
+
+    async with resource.awriting() as writer:
+        for item in items:
+            await writer.send(item)
+
+Since stream resources do blocking I/O, these methods run the synchronous
+stream resource API in a thread executor so that the event loop is never
+blocked.  To keep the number of executor round trips small, items are
+transferred to and from the executor in batches.
+
+This module also provides the adapter in the other direction:
+SyncResource wraps an object implementing areading() and awriting()
+natively so that it can be used wherever a synchronous stream resource
+is expected.
+"""
+
+import asyncio
+from collections import deque
+from contextlib import contextmanager
+from itertools import islice
+import sys
+
+from openrcv import streams, utils
+
+
+# The default number of items per executor round trip.
+ASYNC_BATCH_SIZE = 1000
+
+
+def _run_blocking(executor, func, *args):
+    """Run a blocking function in an executor, and return an awaitable."""
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(executor, func, *args)
+
+
+class AsyncReadingStream(object):
+
+    """An async iterator over the items of a synchronous iterator."""
+
+    def __init__(self, iterator, executor=None, batch_size=None):
+        if batch_size is None:
+            batch_size = ASYNC_BATCH_SIZE
+        self.batch_size = batch_size
+        self.executor = executor
+        self.iterator = iterator
+        self._done = False
+        self._items = deque()
+        # The number and value of the last item returned, for error reporting.
+        self.item = None
+        self.number = 0
+
+    def _read_batch(self):
+        return list(islice(self.iterator, self.batch_size))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        items = self._items
+        if not items:
+            if self._done:
+                raise StopAsyncIteration
+            batch = await _run_blocking(self.executor, self._read_batch)
+            if len(batch) < self.batch_size:
+                self._done = True
+            if not batch:
+                raise StopAsyncIteration
+            items.extend(batch)
+        self.item = items.popleft()
+        self.number += 1
+        return self.item
+
+
+class AsyncWriter(object):
+
+    """Writes items to a generator returned by writing_batches().
+
+    Items passed to send() are buffered and written in batches.  The
+    buffer is flushed when it reaches the batch size, when flush() is
+    called, and when the awriting() context manager exits.
+    """
+
+    def __init__(self, gen, executor=None, batch_size=None):
+        """
+        Arguments:
+          gen: a generator yielded by a writing_batches() context manager.
+        """
+        if batch_size is None:
+            batch_size = ASYNC_BATCH_SIZE
+        self.batch_size = batch_size
+        self.executor = executor
+        self.gen = gen
+        self._items = []
+
+    async def send(self, item):
+        self._items.append(item)
+        if len(self._items) >= self.batch_size:
+            await self.flush()
+
+    async def send_batch(self, items):
+        """Write a list of items."""
+        await self.flush()
+        await _run_blocking(self.executor, self.gen.send, list(items))
+
+    async def flush(self):
+        items = self._items
+        if items:
+            self._items = []
+            await _run_blocking(self.executor, self.gen.send, items)
+
+
+class _AsyncContextBase(object):
+
+    """Base class for async context managers wrapping a sync context manager."""
+
+    def __init__(self, resource, executor=None, batch_size=None):
+        self.batch_size = batch_size
+        self.executor = executor
+        self.resource = resource
+        self._context = None
+
+    def make_context(self):
+        raise utils.NoImplementation(self)
+
+    def make_target(self, value):
+        raise utils.NoImplementation(self)
+
+    async def __aenter__(self):
+        self._context = self.make_context()
+        value = await _run_blocking(self.executor, self._context.__enter__)
+        self.target = self.make_target(value)
+        return self.target
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return await _run_blocking(self.executor, self._context.__exit__, exc_type, exc, tb)
+
+
+class AsyncReading(_AsyncContextBase):
+
+    """The async context manager returned by areading()."""
+
+    def make_context(self):
+        return self.resource.reading()
+
+    def make_target(self, value):
+        return AsyncReadingStream(value, executor=self.executor, batch_size=self.batch_size)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        # The synchronous stream has been read ahead, so we annotate
+        # errors here rather than relying on streams.tracked().
+        stream = self.target
+        if not isinstance(exc, Exception) or not stream.number:
+            return await super().__aexit__(exc_type, exc, tb)
+        await super().__aexit__(None, None, None)
+        raise streams.make_read_error(exc, self.resource, stream.number, stream.item) from exc
+
+
+class AsyncWriting(_AsyncContextBase):
+
+    """The async context manager returned by awriting()."""
+
+    def make_context(self):
+        return self.resource.writing_batches()
+
+    def make_target(self, value):
+        return AsyncWriter(value, executor=self.executor, batch_size=self.batch_size)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        # Like writing(), flush buffered items even if there was an error,
+        # and let any error flushing propagate.
+        try:
+            await self.target.flush()
+        except BaseException:
+            await super().__aexit__(*sys.exc_info())
+            raise
+        return await super().__aexit__(exc_type, exc, tb)
+
+
+@utils.coroutine
+def _async_sink(loop, writer):
+    while True:
+        item = yield
+        loop.run_until_complete(writer.send(item))
+
+
+class SyncResource(streams.StreamResourceMixin):
+
+    """A synchronous stream resource backed by an async stream resource.
+
+    The async resource is any object whose areading() and awriting()
+    methods return async context managers with the semantics described
+    in the module docstring.  Each reading() or writing() call runs the
+    async resource on a new event loop, so these methods cannot be called
+    from a thread that is already running an event loop.
+    """
+
+    def __init__(self, async_resource):
+        self.async_resource = async_resource
+
+    def repr_info(self):
+        return "async_resource=%r" % (self.async_resource, )
+
+    @contextmanager
+    def _run_context(self, async_context, make_gen):
+        loop = asyncio.new_event_loop()
+        try:
+            target = loop.run_until_complete(async_context.__aenter__())
+            gen = make_gen(loop, target)
+            try:
+                yield gen
+            except BaseException:
+                gen.close()
+                suppress = loop.run_until_complete(async_context.__aexit__(*sys.exc_info()))
+                if not suppress:
+                    raise
+            else:
+                gen.close()
+                loop.run_until_complete(async_context.__aexit__(None, None, None))
+        finally:
+            loop.close()
+
+    def _iter_items(self, loop, agen):
+        while True:
+            try:
+                yield loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                return
+
+    def reading(self):
+        return self._run_context(self.async_resource.areading(), self._iter_items)
+
+    def writing(self):
+        return self._run_context(self.async_resource.awriting(), _async_sink)
+
+    def areading(self, **kwargs):
+        return self.async_resource.areading(**kwargs)
+
+    def awriting(self, **kwargs):
+        return self.async_resource.awriting(**kwargs)
@@ -0,0 +1,489 @@
+#
+# Copyright (c) 2014 Chris Jerdonek. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+"""Supports a persistent on-disk cache of parsed input files.
+
+Parsing a large BLT or CVR file is expensive, and the same input file is
+often counted many times (e.g. repeated `rcv` invocations while
+experimenting with rules).  The cache in this module stores the result of parsing an
+input file so that later requests for the same file can skip parsing
+entirely.
+
+Cache entries are "content-addressed": they are keyed by the SHA-256
+digest of the input file's contents rather than by its path (together
+with the parser class and the openrcv version, so that e.g. a BLT and a
+CVR parse of the same file are different entries).  To avoid hashing the
+file on every lookup, the cache also remembers the size and modification
+time of each path it has seen, and trusts the previously computed digest
+when those are unchanged.
+
+Each entry is a directory named after the entry key and contains--
+
+  * contest.json: the contest metadata (name, candidates, etc),
+  * ballots.txt: the ballots in the internal ballot format, and
+  * pin.lock: the file locked to pin the entry.
+
+Entries are evicted in least-recently-used order when the total size of
+the cache exceeds a configurable limit.
+
+Since several processes can share a cache directory, each read-modify-write
+of the index is done while holding an exclusive lock on a lock file in the
+cache directory (on platforms that support fcntl).  Input files are parsed
+without holding the lock.  An entry in use is "pinned" by holding a shared
+lock on a file in the entry's directory until the ConversionCache object
+is closed, and eviction skips pinned entries.
+"""
+
+from contextlib import contextmanager
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Then locking is not available (e.g. on Windows).
+    fcntl = None
+
+import openrcv
+from openrcv.formats.cvr import CVRParser
+from openrcv.formats.internal import internal_ballots_resource, ENCODING_BALLOT_FILE
+from openrcv import jsonlib, models
+from openrcv.models import ContestInput
+from openrcv.parsing import BLTParser
+from openrcv.streams import FilePathResource
+from openrcv.utils import PathInfo, ReprMixin
+
+
+log = logging.getLogger(__name__)
+
+CACHE_DIR_ENV_VAR = "OPENRCV_CACHE_DIR"
+# If this environment variable is set to a non-empty value, commands like
+# `rcv count` parse their input files without using the cache.
+NO_CACHE_ENV_VAR = "OPENRCV_NO_CACHE"
+# The default maximum total size of the cache, in bytes.
+DEFAULT_MAX_SIZE = 2 * 1024 ** 3
+
+INDEX_FILE_NAME = "index.json"
+LOCK_FILE_NAME = "index.lock"
+PIN_FILE_NAME = "pin.lock"
+CONTEST_FILE_NAME = "contest.json"
+BALLOTS_FILE_NAME = "ballots.txt"
+NORMALIZED_BALLOTS_FILE_NAME = "normalized.txt"
+
+# The contest attributes stored in contest.json.
+CONTEST_ATTRS = ('ballot_count', 'candidates', 'name', 'seat_count', 'withdrawn')
+
+_HASH_BLOCK_SIZE = 1024 ** 2
+
+
+def default_cache_dir():
+    """Return the cache directory to use if none is provided.
+
+    This is the value of the CACHE_DIR_ENV_VAR environment variable if
+    set, and otherwise "openrcv" inside $XDG_CACHE_HOME (or ~/.cache).
+    """
+    try:
+        return os.environ[CACHE_DIR_ENV_VAR]
+    except KeyError:
+        pass
+    base_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base_dir, "openrcv")
+
+
+def cache_disabled():
+    """Return whether the NO_CACHE_ENV_VAR environment variable is set."""
+    return bool(os.environ.get(NO_CACHE_ENV_VAR))
+
+
+def hash_file(path):
+    """Return the SHA-256 hex digest of the contents of a file."""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def get_parser_name(parser_class):
+    return "%s.%s" % (parser_class.__module__, parser_class.__qualname__)
+
+
+def make_entry_key(digest, parser_name):
+    """Return the key of the cache entry for an input file and parser.
+
+    Arguments:
+      digest: the SHA-256 hex digest of the input file.
+      parser_name: the qualified name of the parser class.
+    """
+    text = "\n".join((digest, parser_name, openrcv.__version__))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def dir_size(path):
+    """Return the total size in bytes of the files in a directory."""
+    total = 0
+    for dir_path, dir_names, file_names in os.walk(path):
+        for file_name in file_names:
+            total += os.path.getsize(os.path.join(dir_path, file_name))
+    return total
+
+
+class CacheEntry(ReprMixin):
+
+    """Describes a cache entry.
+
+    Attributes:
+      digest: the SHA-256 hex digest of the cached input file.
+      key: the key of the entry (see make_entry_key()).
+      last_used: the time the entry was last used, in seconds since the epoch.
+      parser: the qualified name of the parser class used, or None if unknown.
+      paths: a list of the input paths known to have this digest.
+      size: the size of the entry on disk, in bytes.
+    """
+
+    def __init__(self, digest, size, last_used, paths=None, key=None, parser=None):
+        if key is None:
+            key = digest
+        if paths is None:
+            paths = []
+        self.digest = digest
+        self.key = key
+        self.last_used = last_used
+        self.parser = parser
+        self.paths = paths
+        self.size = size
+
+    def repr_info(self):
+        return "digest=%s size=%d" % (self.digest[:12], self.size)
+
+
+class ConversionCache(ReprMixin):
+
+    """A persistent cache of parsed input files.
+
+    The index of the cache is stored in a JSON file in the cache directory
+    with two keys: "entries" maps entry key to entry info, and "paths" maps
+    absolute input path to the size, mtime, and digest last seen.
+
+    The object can be used as a context manager, which calls close() on
+    exit to unpin the entries it loaded.
+    """
+
+    def __init__(self, cache_dir=None, max_size=None):
+        """
+        Arguments:
+          cache_dir: the directory in which to store the cache.  Defaults
+            to the return value of default_cache_dir().
+          max_size: the maximum total size of the cache in bytes.  Defaults
+            to DEFAULT_MAX_SIZE.
+        """
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        if max_size is None:
+            max_size = DEFAULT_MAX_SIZE
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        # A dict mapping entry key to the open pin file of each pinned entry.
+        self._pins = {}
+
+    def repr_info(self):
+        return "cache_dir=%r" % (self.cache_dir, )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """Unpin the entries loaded by this object.
+
+        The contests returned by this object should not be used after
+        calling this method, since their entries can then be evicted.
+        """
+        pins, self._pins = self._pins, {}
+        for f in pins.values():
+            f.close()
+
+    @property
+    def index_path(self):
+        return os.path.join(self.cache_dir, INDEX_FILE_NAME)
+
+    @property
+    def lock_path(self):
+        return os.path.join(self.cache_dir, LOCK_FILE_NAME)
+
+    @contextmanager
+    def locked(self):
+        """Return a context manager that holds the cache's exclusive lock.
+
+        The lock guards read-modify-write cycles of the index against
+        other processes using the same cache directory.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.lock_path, "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _pin(self, key):
+        """Pin an entry, and return whether the entry exists.
+
+        The entry stays pinned until close() is called.
+        """
+        if key in self._pins:
+            return True
+        entry_dir = self.entry_dir(key)
+        try:
+            f = open(os.path.join(entry_dir, PIN_FILE_NAME), "a")
+        except FileNotFoundError:
+            return False
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+        # Check the entry was not removed before the lock was acquired.
+        if not os.path.exists(os.path.join(entry_dir, CONTEST_FILE_NAME)):
+            f.close()
+            return False
+        self._pins[key] = f
+        return True
+
+    def read_index(self):
+        try:
+            index = jsonlib.read_json_path(self.index_path)
+        except FileNotFoundError:
+            index = {}
+        index.setdefault("entries", {})
+        index.setdefault("paths", {})
+        return index
+
+    def write_index(self, index):
+        """Write the index, replacing any existing index atomically.
+
+        Callers that read the index before writing it should hold the
+        lock (see locked()) so that no other process's update is lost.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # This writes to a uniquely named temp file that is renamed over the
+        # index, so readers never see a partial index.
+        jsonlib.write_json(index, path=self.index_path)
+
+    def get_digest(self, path, index):
+        """Return the digest of the file at path, updating the index.
+
+        The digest is recomputed only if the size or mtime of the file
+        changed since the path was last seen.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        paths = index["paths"]
+        info = paths.get(path)
+        if (info is not None and info["size"] == stat.st_size and
+            info["mtime"] == stat.st_mtime):
+            return info["digest"]
+        log.info("hashing input file: %s" % path)
+        digest = hash_file(path)
+        paths[path] = {"digest": digest, "mtime": stat.st_mtime, "size": stat.st_size}
+        return digest
+
+    def _write_entry(self, key, input_path, parser_class, normalize):
+        """Parse the input file into a new entry directory."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_dir = tempfile.mkdtemp(prefix="temp_", dir=self.cache_dir)
+        try:
+            ballots_resource = self._make_ballots_resource(temp_dir, BALLOTS_FILE_NAME)
+            parser = parser_class(ballots_resource)
+            contest = parser.parse(PathInfo(input_path))
+            contest_data = {attr: getattr(contest, attr) for attr in CONTEST_ATTRS}
+            jsonlib.write_json(contest_data, path=os.path.join(temp_dir, CONTEST_FILE_NAME))
+            if normalize:
+                self._write_normalized(temp_dir)
+        except:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+        try:
+            os.rename(temp_dir, self.entry_dir(key))
+        except OSError:
+            # Then another process added the same entry first.
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            if not os.path.exists(self.entry_dir(key)):
+                raise
+
+    def _write_normalized(self, entry_dir):
+        source = self._make_ballots_resource(entry_dir, BALLOTS_FILE_NAME)
+        target = self._make_ballots_resource(entry_dir, NORMALIZED_BALLOTS_FILE_NAME)
+        # Write to a uniquely named temp file in case another process is
+        # normalizing the same entry.
+        with target.replacement() as temp_target:
+            models.normalize_ballots_to(source, temp_target)
+
+    def _make_ballots_resource(self, entry_dir, file_name):
+        path = os.path.join(entry_dir, file_name)
+        resource = FilePathResource(path, encoding=ENCODING_BALLOT_FILE)
+        return internal_ballots_resource(resource)
+
+    def _read_contest(self, entry_dir, normalize):
+        contest_data = jsonlib.read_json_path(os.path.join(entry_dir, CONTEST_FILE_NAME))
+        file_name = NORMALIZED_BALLOTS_FILE_NAME if normalize else BALLOTS_FILE_NAME
+        ballots_resource = self._make_ballots_resource(entry_dir, file_name)
+        contest = ContestInput(ballots_resource=ballots_resource)
+        for attr in CONTEST_ATTRS:
+            setattr(contest, attr, contest_data[attr])
+        return contest
+
+    def _load(self, path, parser_class, normalize):
+        path = os.path.abspath(path)
+        # Hash and parse without holding the lock, so that loading one
+        # file does not block other processes loading other files.
+        index = self.read_index()
+        digest = self.get_digest(path, index)
+        path_info = index["paths"][path]
+        parser_name = get_parser_name(parser_class)
+        key = make_entry_key(digest, parser_name)
+        entry_dir = self.entry_dir(key)
+        if self._pin(key):
+            log.info("using cached parse of: %s" % path)
+            if normalize and not os.path.exists(os.path.join(entry_dir,
+                                                             NORMALIZED_BALLOTS_FILE_NAME)):
+                self._write_normalized(entry_dir)
+        else:
+            self._write_entry(key, path, parser_class, normalize=normalize)
+            if not self._pin(key):
+                raise RuntimeError("cache entry removed while loading: %s" % entry_dir)
+        with self.locked():
+            index = self.read_index()
+            index["paths"][path] = path_info
+            index["entries"][key] = {"digest": digest, "parser": parser_name,
+                                     "last_used": time.time(), "size": dir_size(entry_dir)}
+            self._evict(index)
+            self.write_index(index)
+        return self._read_contest(entry_dir, normalize=normalize)
+
+    def load_blt(self, path, normalize=False):
+        """Return a ContestInput object for a BLT file, using the cache.
+
+        The returned contest's ballots resource is backed by a file inside
+        the cache, so the caller should not modify it.
+
+        Arguments:
+          path: the path to a BLT file.
+          normalize: whether the returned ballots should be normalized.
+        """
+        return self._load(path, BLTParser, normalize=normalize)
+
+    def load_cvr(self, path, normalize=False):
+        """Return a ContestInput object for a CSV CVR file, using the cache.
+
+        See load_blt() for more information.
+        """
+        return self._load(path, CVRParser, normalize=normalize)
+
+    def _remove_entry(self, index, key):
+        """Remove an entry unless it is pinned, and return whether it was removed."""
+        entry_dir = self.entry_dir(key)
+        if key in self._pins:
+            return False
+        try:
+            f = open(os.path.join(entry_dir, PIN_FILE_NAME), "a")
+        except FileNotFoundError:
+            # Then the entry directory is missing or incomplete.
+            f = None
+        try:
+            if f is not None and fcntl is not None:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    log.info("skipping cache entry in use: %s" % key)
+                    return False
+            log.info("removing cache entry: %s" % key)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+        finally:
+            if f is not None:
+                f.close()
+        entries = index["entries"]
+        del entries[key]
+        digests = set(info.get("digest", k) for k, info in entries.items())
+        paths = index["paths"]
+        for path in [p for p, info in paths.items() if info["digest"] not in digests]:
+            del paths[path]
+        return True
+
+    def _evict(self, index, max_size=None):
+        """Remove least-recently-used, unpinned entries until the cache fits."""
+        if max_size is None:
+            max_size = self.max_size
+        entries = index["entries"]
+        total = sum(info["size"] for info in entries.values())
+        by_age = sorted(entries.items(), key=lambda item: item[1]["last_used"])
+        for key, info in by_age:
+            if total <= max_size:
+                break
+            if self._remove_entry(index, key):
+                total -= info["size"]
+
+    def entries(self):
+        """Return a list of CacheEntry objects, most recently used first."""
+        index = self.read_index()
+        paths = {}
+        for path, info in index["paths"].items():
+            paths.setdefault(info["digest"], []).append(path)
+        entries = []
+        for key, info in index["entries"].items():
+            digest = info.get("digest", key)
+            entries.append(CacheEntry(digest, size=info["size"], last_used=info["last_used"],
+                                      paths=sorted(paths.get(digest, [])), key=key,
+                                      parser=info.get("parser")))
+        entries.sort(key=lambda entry: entry.last_used, reverse=True)
+        return entries
+
+    def total_size(self):
+        return sum(entry.size for entry in self.entries())
+
+    def shrink(self, max_size):
+        """Evict least-recently-used entries until the cache fits max_size.
+
+        Entries in use (i.e. pinned) are not evicted.
+        """
+        with self.locked():
+            index = self.read_index()
+            self._evict(index, max_size=max_size)
+            self.write_index(index)
+
+    def purge(self):
+        """Remove all entries from the cache, except ones in use."""
+        if not os.path.exists(self.cache_dir):
+            return
+        with self.locked():
+            index = self.read_index()
+            for key in list(index["entries"]):
+                self._remove_entry(index, key)
+            self.write_index(index)
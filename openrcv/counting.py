@@ -102,6 +102,32 @@ def count_irv_contest(contest):
     return tabulator.count()
 
 
+class CountingEngine(object):
+
+    """A named function for counting contests, e.g. for checking test cases."""
+
+    def __init__(self, label, func, desc=None):
+        """
+        Arguments:
+          func: a function that accepts a ContestInput object and returns
+            a ContestResults object.
+        """
+        self.desc = desc
+        self.func = func
+        self.label = label
+
+    def __str__(self):
+        return '"{!s}" ({!s})'.format(self.label, self.desc)
+
+
+def make_engines():
+    """Return a dict mapping label to CountingEngine object."""
+    engines = (
+        CountingEngine("irv", count_irv_contest, desc="instant-runoff voting"),
+    )
+    mapping = {engine.label: engine for engine in engines}
+    return mapping
+
 
 class Tabulator(object):
 
@@ -42,16 +42,205 @@ Here is an example BLT file (taken from: https://code.google.com/p/droop/wiki/Bl
 
 """
 
+from contextlib import contextmanager
+from itertools import islice
+import logging
 import os
 
-from openrcv.formats.common import Format, FormatWriter
+from openrcv.formats.common import iter_ballot_text, Format, FormatWriter
+from openrcv.formats.internal import parse_internal_ballot
+from openrcv import models, streams
+from openrcv.parsing import is_withdrawn_line, iter_text_lines, BLTParser
+from openrcv.sidecar import SidecarIndexMixin
 from openrcv.utils import FileWriter
 
 
+log = logging.getLogger(__name__)
+
 BLT_ENCODING = 'utf-8'
 
+# The default number of ballots between offsets stored in a BLT index.
+BLT_INDEX_INTERVAL = 10000
+# Increment this when the index format changes.
+BLT_INDEX_VERSION = 1
+
 # TODO: move the code to parse BLT files here.
 
+
+def parse_blt_ballot(line):
+    """
+    Parse a BLT ballot line (with or without a trailing newline).
+
+    A BLT ballot line is a space-delimited string of integers of the
+    form "WEIGHT CHOICE1 CHOICE2 ... 0".  The line can be bytes or str.
+
+    """
+    # A BLT ballot line is an internal ballot line with a terminal 0.
+    weight, choices = parse_internal_ballot(line)
+    return weight, choices[:-1]
+
+
+def is_quoted_text(text):
+    """Return whether text is enclosed in double quotes.
+
+    BLTParser leaves the quotes on candidate names and the contest name.
+    """
+    return len(text) > 1 and text.startswith('"') and text.endswith('"')
+
+
+def _is_ballots_end(line):
+    """Return whether a line ends the ballots section of a BLT file."""
+    values = line.split(None, 1)
+    return bool(values) and int(values[0]) == 0
+
+
+class BLTBallotsResource(SidecarIndexMixin, streams.StreamResourceBase,
+                         models.BallotsResourceMixin):
+
+    """A read-only ballots resource for the ballots in a BLT file.
+
+    The ballots are read directly from the ballots section of the file,
+    so a contest can be counted without first converting the file.
+
+    The first time the resource is used, it scans the file and writes a
+    small JSON index next to the file (at the file path plus ".idx").
+    The index records the byte offsets of the ballots section, of the
+    footer containing the candidate names and title, and of every Nth
+    ballot.  This lets read_contest() and reading_slice() seek rather
+    than scan.  The index is rebuilt if the file's size or modification
+    time changes.
+    """
+
+    index_label = "BLT"
+
+    def __init__(self, path, encoding=None, index_interval=None):
+        """
+        Arguments:
+          index_interval: the number of ballots between offsets stored
+            in the index.  Defaults to BLT_INDEX_INTERVAL.
+        """
+        if encoding is None:
+            encoding = BLT_ENCODING
+        if index_interval is None:
+            index_interval = BLT_INDEX_INTERVAL
+        self.encoding = encoding
+        self.index_interval = index_interval
+        self.path = path
+        self._index = None
+
+    def repr_info(self):
+        return "path=%r" % (self.path, )
+
+    def index_params(self):
+        return {"version": BLT_INDEX_VERSION, "interval": self.index_interval}
+
+    def build_index(self, stat=None):
+        """Scan the BLT file, and return a new index dict."""
+        if stat is None:
+            stat = os.stat(self.path)
+        interval = self.index_interval
+        log.info("indexing BLT file: %s" % self.path)
+        offsets = []
+        ballot_count = 0
+        with open(self.path, "rb") as f:
+            # Skip the header, whose second line is optional.
+            f.readline()
+            position = f.tell()
+            if not is_withdrawn_line(f.readline()):
+                f.seek(position)
+            ballots_start = position = f.tell()
+            for line in f:
+                if _is_ballots_end(line):
+                    break
+                if ballot_count % interval == 0:
+                    offsets.append(position)
+                ballot_count += 1
+                position += len(line)
+            else:
+                raise ValueError("BLT file is missing the line ending the ballots section: %s" %
+                                 self.path)
+        return {
+            "version": BLT_INDEX_VERSION,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "interval": interval,
+            "ballot_count": ballot_count,
+            "ballots_start": ballots_start,
+            "ballots_end": position,
+            "footer_start": position + len(line),
+            "offsets": offsets,
+        }
+
+    def _read_text(self, start, end=None):
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            data = f.read() if end is None else f.read(end - start)
+        return data.decode(self.encoding)
+
+    def read_contest(self):
+        """Return a ContestInput object whose ballots resource is this object.
+
+        Only the header and footer of the file are read.
+        """
+        index = self.get_index()
+        header = iter_text_lines(self._read_text(0, index["ballots_start"]))
+        footer = iter_text_lines(self._read_text(index["footer_start"]))
+        parser = BLTParser(ballots_resource=self)
+        candidate_count, line = parser.parse_header(header)
+        assert line is None
+        parser.parse_footer(footer, candidate_count)
+        contest = parser.info
+        contest.ballot_count = index["ballot_count"]
+        return contest
+
+    def count(self):
+        return self.get_index()["ballot_count"]
+
+    @contextmanager
+    def open_read(self, start=0, stop=None):
+        """Return a context manager that yields an iterator over ballots.
+
+        Arguments:
+          start: the index of the first ballot.
+          stop: the index after the last ballot.  Defaults to reading to
+            the end of the ballots section.
+        """
+        index = self.get_index()
+        ballot_count = index["ballot_count"]
+        stop = ballot_count if stop is None else min(stop, ballot_count)
+        if start >= stop:
+            yield iter(())
+            return
+        interval = index["interval"]
+        with open(self.path, "rb") as f:
+            # Seek to the nearest indexed ballot, and skip the rest.
+            f.seek(index["offsets"][start // interval])
+            skip = start % interval
+            lines = islice(f, skip, skip + stop - start)
+            yield map(parse_blt_ballot, lines)
+
+    @contextmanager
+    def reading_slice(self, start, stop=None):
+        """Return a context manager that yields an iterator over some ballots.
+
+        See open_read() for the arguments.
+        """
+        with self.open_read(start, stop) as ballots:
+            gen = streams.tracked(self, ballots)
+            try:
+                yield gen
+            except Exception as exc:
+                gen.throw(exc)
+            finally:
+                gen.close()
+
+    def writing(self):
+        raise TypeError("BLT ballots resources do not allow writing.")
+
+    def writing_batches(self):
+        raise TypeError("BLT ballots resources do not allow writing.")
+
+
 class BLTFormat(Format):
 
     @property
@@ -67,7 +256,7 @@ class BLTContestWriter(FormatWriter):
         return (self.get_output_info, )
 
     def get_output_info(self, output_dir):
-        return os.path.join(self.output_dir, "output.blt"), BLT_ENCODING
+        return os.path.join(output_dir, "output.blt"), BLT_ENCODING
 
     def resource_write(self, resource, contest):
         writer = BLTFileWriter(resource)
@@ -77,7 +266,10 @@ class BLTContestWriter(FormatWriter):
 class BLTFileWriter(FileWriter):
 
     def write_text(self, text):
-        self.writeln('"%s"' % text)
+        # BLTParser leaves the quotes on names, so don't add them twice.
+        if not is_quoted_text(text):
+            text = '"%s"' % text
+        self.writeln(text)
 
     def write_values(self, values):
         line = " ".join((str(v) for v in values))
@@ -87,10 +279,11 @@ class BLTFileWriter(FileWriter):
         seat_count = contest.seat_count
         assert seat_count is not None
         self.write_values([len(contest.candidates), seat_count])
-        with contest.ballots_resource.reading() as ballots:
-            for ballot in ballots:
-                weight, choices = ballot
-                self.write_values([weight] + list(choices) + [0])
+        withdrawn = getattr(contest, 'withdrawn', None)
+        if withdrawn:
+            self.write_values([-number for number in withdrawn])
+        for text in iter_ballot_text(contest.ballots_resource, line_end=" 0\n"):
+            self.write(text)
         self.write_values([0])
         for candidate in contest.candidates:
             self.write_text(candidate)
@@ -20,12 +20,84 @@
 # DEALINGS IN THE SOFTWARE.
 #
 
+from itertools import accumulate, chain, islice
+from operator import add
+import os
 import sys
 
+from openrcv.models import CompactBallotsResource
 from openrcv.streams import FilePathResource, StandardResource
 from openrcv.utils import NoImplementation
 
 
+# The number of ballots to format at a time when writing ballot files.
+FORMAT_BATCH_SIZE = 10000
+
+
+def _choice_texts(choices):
+    """Return a list of the choices as strings, each preceded by a space."""
+    if not choices:
+        return []
+    low, high = min(choices), max(choices)
+    # Choices are usually small candidate numbers, so look them up in a
+    # table rather than converting each one.
+    if low < 0 or high > len(choices):
+        return list(map(" ".__add__, map(str, choices)))
+    table = [" %d" % n for n in range(high + 1)]
+    return list(map(table.__getitem__, choices))
+
+
+def format_ballot_lines(weights, choices, ends, line_end="\n"):
+    """Return ballots as text, with one line of the form "WEIGHT CHOICE1 ..." per ballot.
+
+    The ballots are passed as flat sequences, as in
+    CompactBallotsResource.extend_ballots().  The operations below avoid
+    looping over ballots in Python, so that whole batches of ballots
+    are formatted at once.
+
+    Arguments:
+      line_end: the text to end each line with, e.g. " 0\n" for BLT files.
+    """
+    ballot_count = len(weights)
+    if not ballot_count:
+        return ""
+    choice_texts = _choice_texts(choices)
+    starts = chain((0, ), islice(ends, ballot_count - 1))
+    ballot_texts = map("".join, map(choice_texts.__getitem__, map(slice, starts, ends)))
+    return line_end.join(map(add, map(str, weights), ballot_texts)) + line_end
+
+
+def iter_ballot_arrays(ballots_resource, batch_size=None):
+    """Yield (weights, choices, ends) sequences for batches of ballots.
+
+    The sequences are as in CompactBallotsResource.extend_ballots().
+    Compact ballots resources are read directly from their arrays.
+    """
+    if batch_size is None:
+        batch_size = FORMAT_BATCH_SIZE
+    if isinstance(ballots_resource, CompactBallotsResource):
+        yield from ballots_resource.iter_batches(batch_size)
+        return
+    with ballots_resource.reading() as ballots:
+        while True:
+            batch = list(islice(ballots, batch_size))
+            if not batch:
+                break
+            weights = [weight for weight, choices in batch]
+            choices_seq = [choices for weight, choices in batch]
+            yield (weights, list(chain.from_iterable(choices_seq)),
+                   list(accumulate(map(len, choices_seq))))
+
+
+def iter_ballot_text(ballots_resource, line_end="\n", batch_size=None):
+    """Yield the ballots of a ballots resource as text, in batches.
+
+    See format_ballot_lines() for the format.
+    """
+    for weights, choices, ends in iter_ballot_arrays(ballots_resource, batch_size):
+        yield format_ballot_lines(weights, choices, ends, line_end=line_end)
+
+
 class Format(object):
 
     def write_contest(self, contest, output_dir=None, stdout=None):
@@ -37,6 +109,14 @@ class Format(object):
         writer = writer_cls(output_dir=output_dir, stdout=stdout)
         return writer.write_output(contest)
 
+    def write_contest_path(self, contest, path):
+        """Write a contest to the file at the given path.
+
+        This method is only supported by formats that write a single file.
+        """
+        writer = self.contest_writer_cls()
+        writer.write_path(path, contest)
+
 
 class FormatWriter(object):
 
@@ -77,6 +157,12 @@ class FormatWriter(object):
         """Return a StreamInfo object for stdout."""
         return StandardResource(self.stdout)
 
+    def write_path(self, path, *args):
+        """Write to the file at the given path instead of to output_dir."""
+        get_output_info, = self.get_output_infos
+        output_path, encoding = get_output_info(os.path.dirname(path))
+        self.resource_write(FilePathResource(path, encoding=encoding), *args)
+
     # TODO: get all the FormatWriter classes using this method.
     def write_output(self, *args, **kwargs):
         """
@@ -0,0 +1,429 @@
+#
+# Copyright (c) 2014 Chris Jerdonek. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+"""
+Support for parsing and writing cast vote records (CVR's) in CSV format.
+
+A CVR export has a header row followed by one row per ballot, with one
+column per rank.  Each rank cell contains a candidate name, or else a
+marker for a skipped rank (an undervote) or for a rank with more than one
+candidate (an overvote).  For example--
+
+    Ballot ID,Precinct,Rank 1,Rank 2,Rank 3
+    1,P1,Alice,Bob,
+    2,P1,Bob,overvote,Alice
+    3,P2,undervote,Carol,Alice
+
+Rank columns are the columns whose header is "Rank N" or "Choice N".
+Skipped ranks are ignored, and an overvote ends the ballot's choices at
+that rank.  A candidate ranked more than once counts only at the first
+of those ranks.  An optional "Weight" column gives the weight of each row,
+which otherwise defaults to 1.  Other columns are ignored.
+
+Parsing a row converts each rank cell to an integer using a single dict
+lookup, and ballots are written to the ballots resource in batches, so
+that a file of any size is parsed in constant memory (apart from the
+ballots resource).
+"""
+
+import collections
+import csv
+import io
+from itertools import islice
+import logging
+from operator import itemgetter
+import os
+import re
+
+from openrcv.formats.blt import is_quoted_text
+from openrcv.formats.common import Format, FormatWriter
+from openrcv.models import CompactBallotsResource, ContestInput
+from openrcv.parsing import get_line_chunk_ranges, Parser, BLT_CHUNK_SIZE
+from openrcv import utils
+from openrcv.utils import FileWriter, PathInfo
+
+
+log = logging.getLogger(__name__)
+
+CVR_ENCODING = 'utf-8'
+# The number of ballots to write to the ballots resource at a time.
+CVR_BATCH_SIZE = 10000
+
+WEIGHT_HEADER = "Weight"
+# Cell values marking a skipped rank, compared case-insensitively.
+UNDERVOTE_MARKERS = ("", "undervote", "skipped")
+# Cell values marking a rank with more than one candidate.
+OVERVOTE_MARKERS = ("overvote", )
+
+# The codes of the marker cell values.  Candidate numbers are positive.
+_UNDERVOTE = 0
+_OVERVOTE = -1
+
+_RANK_HEADER = re.compile(r'^(?:rank|choice)\s*(\d+)$', re.IGNORECASE)
+
+
+def get_rank_indices(header):
+    """Return the indices of the rank columns of a header row, in rank order."""
+    ranks = []
+    for index, name in enumerate(header):
+        match = _RANK_HEADER.match(name.strip())
+        if match:
+            ranks.append((int(match.group(1)), index))
+    return [index for rank, index in sorted(ranks)]
+
+
+def get_weight_index(header):
+    """Return the index of the weight column of a header row, or None."""
+    for index, name in enumerate(header):
+        if name.strip().lower() == WEIGHT_HEADER.lower():
+            return index
+    return None
+
+
+def make_choices(codes):
+    """Return the choices of a ballot from the codes of its rank cells."""
+    if _OVERVOTE in codes:
+        codes = codes[:codes.index(_OVERVOTE)]
+    # Keep only the first rank of each candidate (dicts preserve order).
+    return tuple(dict.fromkeys(filter(None, codes)))
+
+
+class CellCodes(dict):
+
+    """A dict mapping the cell values of rank columns to integer codes.
+
+    Candidate names map to candidate numbers, and markers map to the
+    marker codes.  Each distinct cell value is normalized only the first
+    time it is looked up, so that later lookups are a single dict access.
+    """
+
+    def __init__(self, candidates=None):
+        """
+        Arguments:
+          candidates: the candidate names, in numeric order.  If not
+            provided, candidates are numbered in order of appearance.
+
+        """
+        self.is_fixed = candidates is not None
+        self.candidates = [] if candidates is None else list(candidates)
+        self.numbers = {name: number for number, name in
+                        enumerate(self.candidates, start=1)}
+
+    def __missing__(self, value):
+        name = value.strip()
+        marker = name.lower()
+        if marker in UNDERVOTE_MARKERS:
+            code = _UNDERVOTE
+        elif marker in OVERVOTE_MARKERS:
+            code = _OVERVOTE
+        else:
+            try:
+                code = self.numbers[name]
+            except KeyError:
+                if self.is_fixed:
+                    raise ValueError("unknown candidate: %r" % value)
+                self.candidates.append(name)
+                code = self.numbers[name] = len(self.candidates)
+        self[value] = code
+        return code
+
+
+class CVRParser(Parser):
+
+    name = "CVR (CSV)"
+
+    def __init__(self, ballots_resource=None, candidates=None, contest_name=None,
+                 seat_count=None, batch_size=None):
+        """
+        Arguments:
+          ballots_resource: a ballots resource to which to write the
+            ballots.  Defaults to a new CompactBallotsResource object.
+          candidates: the candidate names, in numeric order.  If provided,
+            cells with other names are errors.  Otherwise, candidates are
+            numbered in order of appearance.
+          contest_name: the name of the returned contest.
+          seat_count: the number of winners.
+          batch_size: the number of ballots to write at a time.
+
+        """
+        if ballots_resource is None:
+            ballots_resource = CompactBallotsResource()
+        if batch_size is None:
+            batch_size = CVR_BATCH_SIZE
+        self.ballots_resource = ballots_resource
+        self.batch_size = batch_size
+        self.codes = CellCodes(candidates)
+        self.contest_name = contest_name
+        self.seat_count = seat_count
+
+    def get_parse_return_value(self):
+        """Return a ContestInput object."""
+        return self.info
+
+    def parse(self, stream_info):
+        """
+        Arguments:
+          stream_info: a StreamInfo object.
+
+        """
+        if isinstance(stream_info, PathInfo) and 'newline' not in stream_info.kwargs:
+            # The csv module requires files opened with newline="" so that
+            # line breaks inside quoted cells are read unchanged.
+            stream_info = PathInfo(stream_info.path, *stream_info.args, newline="",
+                                   **stream_info.kwargs)
+        return super().parse(stream_info)
+
+    def iter_rows(self, f, start=0):
+        """
+        Return an iterator over the rows of a CSV file.
+
+        Each iteration sets self.line to the row and self.line_no to
+        the number of the row's last line.
+
+        Arguments:
+          start: the number of lines before the first row.
+
+        """
+        reader = csv.reader(f)
+        for row in reader:
+            self.line = row
+            self.line_no = start + reader.line_num
+            yield row
+
+    def parse_header_row(self, header):
+        rank_indices = get_rank_indices(header)
+        if not rank_indices:
+            raise ValueError("the header row has no rank columns")
+        self.header = header
+        self.get_ranks = itemgetter(*rank_indices)
+        if len(rank_indices) == 1:
+            get_rank = self.get_ranks
+            self.get_ranks = lambda row: (get_rank(row), )
+        self.weight_index = get_weight_index(header)
+
+    def parse_row(self, row):
+        """Return the ballot for a data row."""
+        codes = list(map(self.codes.__getitem__, self.get_ranks(row)))
+        weight = 1 if self.weight_index is None else int(row[self.weight_index])
+        return weight, make_choices(codes)
+
+    def parse_rows(self, rows):
+        """Write the ballots for the data rows, and return the ballot count."""
+        parse_row = self.parse_row
+        ballot_count = 0
+        batch = []
+        with self.ballots_resource.writing_batches() as gen:
+            for row in rows:
+                # Skip blank rows.
+                if not row:
+                    continue
+                batch.append(parse_row(row))
+                if len(batch) >= self.batch_size:
+                    gen.send(batch)
+                    ballot_count += len(batch)
+                    batch = []
+            if batch:
+                gen.send(batch)
+                ballot_count += len(batch)
+        return ballot_count
+
+    def make_contest(self):
+        info = ContestInput(name=self.contest_name, candidates=self.codes.candidates,
+                            seat_count=self.seat_count,
+                            ballots_resource=self.ballots_resource)
+        info.withdrawn = []
+        self.info = info
+        return info
+
+    def parse_stream(self, f):
+        info = self.make_contest()
+        rows = self.iter_rows(f)
+        self.parse_header_row(next(rows))
+        info.ballot_count = self.parse_rows(rows)
+
+
+# The result of parsing part of a CVR file in a worker process.  The
+# line number and line are relative to the chunk, and error is whether
+# parsing failed on that line.
+_CVRChunkResult = collections.namedtuple('_CVRChunkResult',
+    ('weights', 'choices', 'ends', 'candidates', 'line_no', 'line', 'error'))
+
+
+def _parse_cvr_chunk(args):
+    """Parse a byte range of the rows of a CVR file in a worker process."""
+    path, encoding, start, end, header, candidates = args
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    stream = io.StringIO(data.decode(encoding), newline=None)
+    parser = CVRParser(candidates=candidates)
+    parser.parse_header_row(header)
+    try:
+        parser.parse_rows(parser.iter_rows(stream))
+    except Exception:
+        return _CVRChunkResult(None, None, None, None, parser.line_no, parser.line, True)
+    ballots = parser.ballots_resource
+    return _CVRChunkResult(ballots.weights, ballots.choices, ballots.ends,
+                           parser.codes.candidates, parser.line_no, parser.line, False)
+
+
+class ParallelCVRParser(CVRParser):
+
+    """A CVR parser that parses the rows of a file in a process pool.
+
+    The rows are split into chunks at line boundaries, and each chunk is
+    parsed in a worker process.  The chunks are then added to the ballots
+    resource in order, and candidates are numbered in order of appearance
+    in the file, as with CVRParser.
+
+    Splitting at line boundaries requires that quoted cells not contain
+    line breaks, which is the case for CVR exports in practice.  Streams
+    not backed by a file on disk are parsed by CVRParser.
+    """
+
+    name = "CVR (CSV, parallel)"
+
+    def __init__(self, ballots_resource=None, candidates=None, contest_name=None,
+                 seat_count=None, batch_size=None, processes=None, chunk_size=None):
+        """
+        Arguments:
+          processes: the maximum number of worker processes.  Defaults
+            to the number of CPUs.
+          chunk_size: the approximate number of bytes per chunk.  Defaults
+            to dividing the rows into several chunks per process, up to a
+            maximum of BLT_CHUNK_SIZE bytes.
+
+        """
+        super().__init__(ballots_resource=ballots_resource, candidates=candidates,
+                         contest_name=contest_name, seat_count=seat_count,
+                         batch_size=batch_size)
+        if processes is None:
+            processes = os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.processes = processes
+
+    def get_chunk_size(self, section_size):
+        if self.chunk_size is not None:
+            return self.chunk_size
+        chunk_size = -(-section_size // (4 * self.processes))
+        return max(1, min(chunk_size, BLT_CHUNK_SIZE))
+
+    def add_chunk(self, gen, result):
+        """Add the ballots parsed by a worker to the ballots resource."""
+        choices = result.choices
+        if not self.codes.is_fixed:
+            # Convert the chunk's candidate numbers to the file's.
+            table = [0] + [self.codes[name] for name in result.candidates]
+            if table != list(range(len(table))):
+                choices = map(table.__getitem__, choices)
+        chunk = CompactBallotsResource()
+        chunk.extend_ballots(result.weights, choices, result.ends)
+        if isinstance(self.ballots_resource, CompactBallotsResource):
+            self.ballots_resource.extend_ballots(chunk.weights, chunk.choices, chunk.ends)
+        else:
+            with chunk.reading() as ballots:
+                gen.send(list(ballots))
+        return len(chunk)
+
+    def parse_stream(self, f):
+        path = getattr(f, 'name', None)
+        if not isinstance(path, str) or not os.path.isfile(path):
+            return super().parse_stream(f)
+        encoding = f.encoding
+        info = self.make_contest()
+        with open(path, 'rb') as binary:
+            header_line = binary.readline().decode(encoding)
+            self.parse_header_row(next(self.iter_rows([header_line])))
+            start = binary.tell()
+            end = os.fstat(binary.fileno()).st_size
+            ranges = get_line_chunk_ranges(binary, start, end,
+                                           self.get_chunk_size(end - start))
+        candidates = self.codes.candidates if self.codes.is_fixed else None
+        args = [(path, encoding, chunk_start, chunk_end, self.header, candidates) for
+                chunk_start, chunk_end in ranges]
+        results = utils.parallel_map(_parse_cvr_chunk, args, processes=self.processes)
+
+        ballot_count = 0
+        with self.ballots_resource.writing_batches() as gen:
+            for result in results:
+                # Convert the chunk's line information to the file's.
+                if result.line_no:
+                    self.line_no += result.line_no
+                    self.line = result.line
+                if result.error:
+                    raise ValueError("error parsing row")
+                ballot_count += self.add_chunk(gen, result)
+        info.ballot_count = ballot_count
+
+
+class CVRFormat(Format):
+
+    @property
+    def contest_writer_cls(self):
+        return CVRContestWriter
+
+
+class CVRContestWriter(FormatWriter):
+
+    @property
+    def get_output_infos(self):
+        return (self.get_output_info, )
+
+    def get_output_info(self, output_dir):
+        return os.path.join(output_dir, "cvr.csv"), CVR_ENCODING
+
+    def resource_write(self, resource, contest):
+        writer = CVRFileWriter(resource)
+        writer.write_contest(contest)
+
+
+class CVRFileWriter(FileWriter):
+
+    def write_rows(self, rows):
+        """Write rows of values in CSV format."""
+        output = io.StringIO()
+        csv.writer(output, lineterminator="\n").writerows(rows)
+        self.write(output.getvalue())
+
+    def _write_contest(self, contest):
+        candidates = contest.candidates
+        rank_count = len(candidates)
+        header = [WEIGHT_HEADER] + ["Rank %d" % rank for rank in range(1, rank_count + 1)]
+        self.write_rows([header])
+        # Write names parsed from a BLT file without their quotes, since
+        # the csv module quotes cells as needed.
+        names = [None] + [name[1:-1] if is_quoted_text(name) else name
+                          for name in candidates]
+        with contest.ballots_resource.reading() as ballots:
+            for batch in iter(lambda: list(islice(ballots, CVR_BATCH_SIZE)), []):
+                # Pad each row with undervotes so that it has every column.
+                self.write_rows([weight] + [names[c] for c in choices] +
+                                [""] * (rank_count - len(choices))
+                                for weight, choices in batch)
+
+    def write_contest(self, contest):
+        """
+        Arguments:
+          contest: a ContestInput object.
+        """
+        with self.open():
+            self._write_contest(contest)
@@ -26,10 +26,12 @@ Support for parsing and writing files in OpenRCV's internal format.
 """
 
 from contextlib import contextmanager
+from itertools import accumulate, chain
 import os
 
-from openrcv.formats.common import Format, FormatWriter
+from openrcv.formats.common import iter_ballot_text, Format, FormatWriter
 from openrcv import models, streams
+from openrcv.parsing import split_zero_ended_ints
 from openrcv.streams import StreamResourceBase
 from openrcv.utils import join_values, parse_integer_line, FileWriter, NoImplementation
 
@@ -64,6 +66,47 @@ def parse_internal_ballot(line):
     return weight, choices
 
 
+def parse_internal_ballots(lines):
+    """Parse internal ballot lines in bulk.
+
+    Returns (weights, choices, ends), as in
+    CompactBallotsResource.extend_ballots().  The ballots are the same
+    as from calling parse_internal_ballot() on each line, but the lines
+    are converted with a single split() where possible.
+
+    Arguments:
+      lines: a sequence of strings.
+    """
+    try:
+        # Terminate each ballot with a zero as in the BLT format.
+        ints = list(map(int, " 0 ".join(lines).split()))
+    except (TypeError, ValueError):
+        ints = None
+    if ints is not None:
+        ints.append(0)
+        # A zero weight or choice would throw off the count.
+        if ints.count(0) == len(lines):
+            weights, choices, ends = split_zero_ended_ints(ints)
+            # A blank line would give a zero weight.
+            if 0 not in weights:
+                return weights, list(choices), list(ends)
+    # Parse the lines one at a time, which also raises the same errors
+    # as parse_internal_ballot().
+    ballots = [parse_internal_ballot(line) for line in lines]
+    weights = [weight for weight, choices in ballots]
+    choices = list(chain.from_iterable(choices for weight, choices in ballots))
+    ends = list(accumulate(len(choices) for weight, choices in ballots))
+    return weights, choices, ends
+
+
+@contextmanager
+def temp_ballots_resource():
+    """Return a context manager yielding a ballots resource backed by a temp file."""
+    with streams.TempFileResource.create_temp() as backing_resource:
+        ballots_resource = internal_ballots_resource(backing_resource)
+        yield ballots_resource
+
+
 def internal_ballots_resource(resource):
         """
         Arguments:
@@ -102,7 +145,7 @@ class InternalContestWriter(FormatWriter):
         return (self.get_output_info, )
 
     def get_output_info(self, output_dir):
-        return os.path.join(self.output_dir, "ballots.txt"), ENCODING_BALLOT_FILE
+        return os.path.join(output_dir, "ballots.txt"), ENCODING_BALLOT_FILE
 
     def resource_write(self, resource, contest):
         writer = InternalBallotsWriter(resource)
@@ -113,9 +156,8 @@ class InternalContestWriter(FormatWriter):
 class InternalBallotsWriter(FileWriter):
 
     def _write_ballots(self, contest):
-        with contest.ballots_resource.reading() as ballots:
-            for ballot in ballots:
-                self.writeln(to_internal_ballot(ballot))
+        for text in iter_ballot_text(contest.ballots_resource):
+            self.write(text)
 
     def write_ballots(self, contest):
         """
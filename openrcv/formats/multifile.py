@@ -0,0 +1,173 @@
+#
+# Copyright (c) 2014 Chris Jerdonek. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+"""
+Support for ballots split across many files.
+
+Ballot data often arrives as one file per precinct.  This module lets
+a directory or glob of ballot files be treated as a single ballots
+resource.  Operations that do not depend on ballot order (e.g. counting,
+normalizing, and computing statistics) are done per file in a pool of
+worker processes, and the per-file results are then merged.
+
+"""
+
+from contextlib import contextmanager
+import glob
+import logging
+import os
+
+from openrcv.formats.blt import BLTBallotsResource
+from openrcv.formats.internal import internal_ballots_resource, ENCODING_BALLOT_FILE
+from openrcv import models, streams, utils
+
+
+log = logging.getLogger(__name__)
+
+
+def internal_path_resource(path):
+    """Return a ballots resource for an internal ballot file."""
+    resource = streams.FilePathResource(path, encoding=ENCODING_BALLOT_FILE)
+    return internal_ballots_resource(resource)
+
+
+# A mapping from file extension to a function that accepts a path and
+# returns a ballots resource for the file at that path.
+BALLOT_FILE_TYPES = {
+    '.blt': BLTBallotsResource,
+    '.txt': internal_path_resource,
+}
+
+
+def make_path_resource(path):
+    """Return a ballots resource for a ballot file, based on its extension."""
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        make_resource = BALLOT_FILE_TYPES[ext]
+    except KeyError:
+        raise ValueError("unsupported ballot file extension %r (choose from: %s): %s" %
+                         (ext, ", ".join(sorted(BALLOT_FILE_TYPES)), path))
+    return make_resource(path)
+
+
+# The functions below are run in worker processes, so they need to be
+# module-level functions to be picklable.
+
+def _count_path(path):
+    return make_path_resource(path).count_ballots()
+
+
+def _stats_path(path):
+    return models.get_ballot_stats(make_path_resource(path))
+
+
+def _tally_path(path):
+    return models.tally_choices(make_path_resource(path))
+
+
+class MultiFileBallotsResource(streams.StreamResourceMixin, models.BallotsResourceMixin):
+
+    """A read-only ballots resource backed by a sequence of ballot files.
+
+    Reading yields the ballots of each file in turn.  By default, the
+    files are read and parsed on a background thread, in batches, while
+    the ballots of earlier batches are being processed.
+
+    The resource is read-only, so writing() and normalize() raise
+    TypeError.  Use normalize_to() to write the normalized ballots to
+    another resource.
+    """
+
+    def __init__(self, paths, processes=None, prefetch=True):
+        """
+        Arguments:
+          paths: an iterable of paths to ballot files.
+          processes: the number of worker processes to use for per-file
+            operations.  See utils.parallel_map().
+          prefetch: whether to read the files on a background thread
+            while reading.  See streams.ReadAheadResource for the number
+            of ballots held in memory at a time.
+        """
+        self.paths = list(paths)
+        self.prefetch = prefetch
+        self.processes = processes
+
+    @classmethod
+    def from_glob(cls, pattern, **kwargs):
+        """Create an instance from the files matching a glob pattern."""
+        return cls(sorted(glob.glob(pattern)), **kwargs)
+
+    @classmethod
+    def from_dir(cls, dir_path, **kwargs):
+        """Create an instance from the supported ballot files in a directory."""
+        paths = sorted(os.path.join(dir_path, name) for name in os.listdir(dir_path)
+                       if os.path.splitext(name)[1].lower() in BALLOT_FILE_TYPES)
+        return cls(paths, **kwargs)
+
+    def repr_info(self):
+        return "paths=%d" % (len(self.paths), )
+
+    def _map_paths(self, func):
+        return utils.parallel_map(func, self.paths, processes=self.processes)
+
+    def _iter_sequential(self):
+        for path in self.paths:
+            with make_path_resource(path).reading() as ballots:
+                yield from ballots
+
+    @contextmanager
+    def reading(self):
+        if self.prefetch:
+            # Stopping early stops the background thread after at most
+            # one more batch, rather than after the file being read.
+            sequential = self.create(self.paths, processes=self.processes, prefetch=False)
+            with streams.ReadAheadResource(sequential).reading() as gen:
+                yield gen
+            return
+        gen = self._iter_sequential()
+        try:
+            yield gen
+        finally:
+            gen.close()
+
+    @contextmanager
+    def writing(self):
+        raise TypeError("a multi-file ballots resource does not allow writing.")
+
+    def count_ballots(self):
+        return sum(self._map_paths(_count_path))
+
+    def stats(self):
+        return models.merge_ballot_stats(self._map_paths(_stats_path))
+
+    def tally_choices(self):
+        """Return a dict mapping each tuple of choices to its total weight."""
+        return models.merge_choice_tallies(self._map_paths(_tally_path))
+
+    def normalize_to(self, target):
+        """Write the normalized ballots of all files to a target resource."""
+        models.write_normalized_ballots(self.tally_choices(), target)
+
+    def normalize(self):
+        """Raise TypeError, since the ballot files are not rewritten."""
+        raise TypeError("a multi-file ballots resource cannot be normalized in place. "
+                        "Use normalize_to() instead.")
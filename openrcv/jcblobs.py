@@ -0,0 +1,122 @@
+#
+# Copyright (c) 2014 Chris Jerdonek. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+"""Supports a content-addressed store of contest ballots for tests files.
+
+A contest can belong to more than one rule set, in which case its test
+cases appear in more than one tests file (one per rule set).  Rather
+than copying the contest's ballots into each of those files, the test
+cases can refer to a single copy of the ballots by reference.  The
+reference is the SHA-256 hex digest of the ballots' text, so identical
+ballots are stored once.
+
+The ballots are stored in a "ballots" directory inside the tests
+directory, one file per reference, in the internal ballot format (one
+"WEIGHT CHOICE1 CHOICE2 ..." line per ballot).  Thus, reading them does
+not require JSON parsing.
+"""
+
+import hashlib
+import logging
+import os
+
+from openrcv import streams
+from openrcv.formats.common import format_ballot_lines, iter_ballot_arrays
+from openrcv.jcmodels import JsonCaseBallots
+from openrcv.utils import ReprMixin
+
+
+log = logging.getLogger(__name__)
+
+# The name of the ballots directory inside a tests directory.
+BALLOTS_DIR_NAME = "ballots"
+BLOB_ENCODING = "ascii"
+BLOB_SUFFIX = ".txt"
+
+
+def _to_blob_text(ballots):
+    """Return the text of a blob.
+
+    Arguments:
+      ballots: a JsonCaseBallots object, or a list of ballot strings.
+    """
+    if not isinstance(ballots, JsonCaseBallots):
+        # Parse the ballots so that equal ballots have equal text.
+        ballots = JsonCaseBallots.from_jsobj(ballots)
+    return "".join(format_ballot_lines(weights, choices, ends) for
+                   weights, choices, ends in iter_ballot_arrays(ballots.resource))
+
+
+class BallotBlobStore(ReprMixin):
+
+    """A directory of ballots, each addressed by the digest of its text."""
+
+    def __init__(self, dir_path):
+        self.dir_path = dir_path
+
+    @classmethod
+    def for_tests_dir(cls, tests_dir):
+        """Return the ballots store of a tests directory."""
+        return cls(os.path.join(tests_dir, BALLOTS_DIR_NAME))
+
+    def repr_info(self):
+        return "dir_path=%r" % (self.dir_path, )
+
+    def blob_path(self, ref):
+        return os.path.join(self.dir_path, ref + BLOB_SUFFIX)
+
+    def put(self, ballots):
+        """Add ballots to the store if not already present, and return their reference.
+
+        Arguments:
+          ballots: a JsonCaseBallots object, or a list of ballot strings.
+        """
+        data = _to_blob_text(ballots).encode(BLOB_ENCODING)
+        ref = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(ref)
+        if not os.path.exists(path):
+            os.makedirs(self.dir_path, exist_ok=True)
+            resource = streams.FilePathResource(path)
+            with resource.replacement() as temp_resource:
+                with open(temp_resource.path, "wb") as f:
+                    f.write(data)
+        return ref
+
+    def get(self, ref):
+        """Return the ballots with a reference as a JsonCaseBallots object."""
+        with open(self.blob_path(ref), encoding=BLOB_ENCODING) as f:
+            lines = f.read().splitlines()
+        return JsonCaseBallots.from_jsobj(lines)
+
+    def refs(self):
+        """Return the set of references in the store."""
+        try:
+            file_names = os.listdir(self.dir_path)
+        except FileNotFoundError:
+            return set()
+        return {name[:-len(BLOB_SUFFIX)] for name in file_names if name.endswith(BLOB_SUFFIX)}
+
+    def prune(self, keep_refs):
+        """Delete the ballots whose references are not in keep_refs."""
+        for ref in self.refs() - set(keep_refs):
+            log.info("deleting unreferenced ballots: %s" % ref)
+            os.remove(self.blob_path(ref))
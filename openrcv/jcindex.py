@@ -0,0 +1,143 @@
+#
+# Copyright (c) 2014 Chris Jerdonek. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+"""Supports an index for reading single test cases from a JSON tests file.
+
+A tests file (e.g. "irv.json" in the open-rcv-tests repo) can be large,
+since each test case includes the ballots of its contest.  Finding a
+test case by scanning the file takes time proportional to the file's
+size.  A JsonTestsFileIndex instead stores the byte range of each test
+case in a small JSON file next to the tests file (at the file path plus
+".idx"), keyed by the test index and by the contest ID.  A test case
+can then be read by seeking to its range and decoding only that range.
+
+The index is rebuilt if the tests file's size or modification time
+changes.
+"""
+
+import json
+import logging
+import os
+
+from openrcv import jsonlib
+from openrcv.jcmodels import JsonCaseTestInstance
+from openrcv.sidecar import SidecarIndexMixin
+from openrcv.utils import ReprMixin, ENCODING_JSON
+
+
+log = logging.getLogger(__name__)
+
+# Increment this when the index format changes.
+INDEX_VERSION = 1
+
+# An encoding that decodes each byte as one character, so that the
+# character offsets of JsonStreamReader are byte offsets.
+_BYTE_ENCODING = "latin-1"
+
+
+def _from_bytes_text(text):
+    """Convert a string decoded with _BYTE_ENCODING to the actual string."""
+    return text.encode(_BYTE_ENCODING).decode(ENCODING_JSON)
+
+
+class JsonTestsFileIndex(SidecarIndexMixin, ReprMixin):
+
+    """An index of the test cases in a JSON tests file.
+
+    The index dict has the following keys (besides ones for detecting
+    when the index is out of date)--
+
+      spans: a list of [start, end] byte ranges, one per test case.
+      indices: a dict mapping each test index (as a string, since JSON
+        object keys are strings) to the position of its span.
+      ids: a dict mapping each contest ID to the list of positions of
+        the spans of the test cases for that contest.
+    """
+
+    index_label = "tests file"
+
+    def __init__(self, path):
+        self.path = path
+        self._index = None
+
+    def repr_info(self):
+        return "path=%r" % (self.path, )
+
+    def index_params(self):
+        return {"version": INDEX_VERSION}
+
+    def build_index(self, stat=None):
+        """Scan the tests file, and return a new index dict."""
+        if stat is None:
+            stat = os.stat(self.path)
+        log.info("indexing tests file: %s" % self.path)
+        spans = []
+        indices = {}
+        ids = {}
+        with open(self.path, encoding=_BYTE_ENCODING) as f:
+            reader = jsonlib.JsonStreamReader(f)
+            for key in reader.iter_object():
+                if key != "test_cases":
+                    reader.read_value()
+                    continue
+                for _ in reader.iter_array():
+                    start = reader.tell()
+                    jsobj = reader.read_value()
+                    position = len(spans)
+                    spans.append([start, reader.tell()])
+                    test_index = jsobj.get("_meta", {}).get("index")
+                    if test_index is not None:
+                        indices[str(test_index)] = position
+                    contest_id = jsobj.get("input", {}).get("_meta", {}).get("id")
+                    if contest_id is not None:
+                        ids.setdefault(_from_bytes_text(contest_id), []).append(position)
+        return {
+            "version": INDEX_VERSION,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "spans": spans,
+            "indices": indices,
+            "ids": ids,
+        }
+
+    def _read_test(self, position):
+        start, end = self.get_index()["spans"][position]
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start)
+        return JsonCaseTestInstance.from_jsobj(json.loads(data.decode(ENCODING_JSON)))
+
+    def read_test(self, index):
+        """Return the test case with a test index as a JsonCaseTestInstance object.
+
+        Raises a KeyError if there is no such test case.
+        """
+        try:
+            position = self.get_index()["indices"][str(index)]
+        except KeyError:
+            raise KeyError("index {0} not found in: {1}".format(index, self.path))
+        return self._read_test(position)
+
+    def read_tests_for_contest(self, contest_id):
+        """Return the list of test cases for a contest ID, in file order."""
+        positions = self.get_index()["ids"].get(contest_id, [])
+        return [self._read_test(position) for position in positions]
@@ -22,22 +22,37 @@
 
 """Support for managing test cases in the open-rcv-tests repo."""
 
-from contextlib import contextmanager
+import collections
+import concurrent.futures
+import copy
+from contextlib import contextmanager, ExitStack
 import datetime
+import filecmp
+import hashlib
+from functools import partial
+from itertools import tee
 import logging
 import os
 import os.path
 from random import choice
+import time
 
 import openrcv
-from openrcv import contestgen, counting, jcmodels, jsonlib, models, utils
-from openrcv.formats import jscase
-from openrcv.jcmodels import (JsonCaseContestInput, JsonCaseTestInstance,
-                              JsonCaseTestOutput, JsonCaseTestsFile)
+from openrcv import (contestgen, counting, jcblobs, jcindex, jcmodels, jcstore, jsonlib,
+                     models, streams, utils)
+from openrcv.formats import internal, jscase
+from openrcv.jcmodels import (JsonCaseBallots, JsonCaseTestInstance, JsonCaseTestOutput,
+                              JsonCaseTestsFile)
 from openrcv.models import ContestInput
 
 
 PERM_ID_CHARS = "0123456789abcdef"
+# The number of test cases per worker process to submit at a time when
+# updating test outputs in parallel.
+PENDING_TESTS_PER_CPU = 4
+# The number of contests per worker process to submit at a time when
+# normalizing contests in parallel.
+PENDING_CONTESTS_PER_CPU = 2
 
 
 log = logging.getLogger(__name__)
@@ -58,8 +73,12 @@ def generate_id(ids):
 def add_contest_to_contests_file(contest, contests_path):
     """
     Arguments:
-      contests_path: a path to a JSON contests file.
+      contests_path: a path to a JSON contests file or contests store.
+        Adding to a store appends to it rather than rewriting it.
     """
+    if jcstore.is_store_path(contests_path):
+        jcstore.JsonContestsStore(contests_path).add_contest(contest)
+        return
     jc_contest = jscase.JsonCaseContestInput.from_model(contest)
     jsobj_contest = jc_contest.to_jsobj()
     data = jsonlib.read_json_path(contests_path)
@@ -68,11 +87,32 @@ def add_contest_to_contests_file(contest, contests_path):
 
 
 def _get_jc_contests_file(contests_path):
+    if jcstore.is_store_path(contests_path):
+        return jcstore.JsonContestsStore(contests_path).to_contests_file()
     js_contests_file = jsonlib.read_json_path(contests_path)
     jc_contests_file = jcmodels.JsonCaseContestsFile.from_jsobj(js_contests_file)
     return jc_contests_file
 
 
+def _save_jc_contests_file(jc_contests_file, contests_path):
+    if jcstore.is_store_path(contests_path):
+        jcstore.JsonContestsStore(contests_path).save_contests_file(jc_contests_file)
+        return
+    jsonlib.write_json(jc_contests_file, path=contests_path)
+
+
+def compact_contests_store(store_path, contests_path):
+    """Write a contests store to a JSON contests file."""
+    jcstore.JsonContestsStore(store_path).compact(contests_path)
+
+
+def _get_tests_file_names(tests_dir):
+    """Return the sorted names of the tests files in a tests directory."""
+    # Skip other files, like the index files of JsonTestsFileIndex and
+    # the ballots directory.
+    return sorted(name for name in os.listdir(tests_dir) if name.endswith(".json"))
+
+
 def _get_tests_file_path(tests_dir, rule_set):
     return os.path.join(tests_dir, "{0}.json".format(rule_set))
 
@@ -84,19 +124,91 @@ def _get_jc_tests_file(tests_dir, rule_set):
     return tests_path, jc_tests_file
 
 
-def _get_or_make_jc_tests_file_(tests_dir, rule_set):
-    tests_path = os.path.join(tests_dir, "{0}.json".format(rule_set))
+@contextmanager
+def _reading_jc_tests_file(tests_path):
+    """Return a context manager for reading a tests file one test at a time.
+
+    Entering the context manager yields a 2-tuple (jc_tests_file, tests),
+    where jc_tests_file is a JsonCaseTestsFile object without test cases,
+    and tests is an iterator over JsonCaseTestInstance objects.  The
+    ballots of each test are read into the same temporary ballots
+    resource, so each test should be finished with before reading the
+    next.  Thus, the memory used does not depend on the size of the file.
+    """
+    with internal.temp_ballots_resource() as ballots_resource:
+        hooks = {('input', 'ballots'): jcmodels.ballots_hook(ballots_resource)}
+        with jsonlib.open_json_array(tests_path, 'test_cases', hooks=hooks) as (jsdict, items):
+            jc_tests_file = JsonCaseTestsFile.from_jsobj(jsdict)
+            yield jc_tests_file, (JsonCaseTestInstance.from_jsobj(jsobj) for jsobj in items)
+
+
+@contextmanager
+def _reading_raw_jc_tests_file(tests_path):
+    """Return a context manager for reading a tests file one test at a time.
+
+    This is like _reading_jc_tests_file(), except that the test inputs
+    are read as JSON objects rather than into a shared ballots resource.
+    Thus, more than one test can be in use at a time.
+    """
+    with jsonlib.open_json_array(tests_path, 'test_cases') as (jsdict, items):
+        jc_tests_file = JsonCaseTestsFile.from_jsobj(jsdict)
+        yield jc_tests_file, map(JsonCaseTestInstance.from_jsobj, items)
+
+
+def _get_or_make_jc_tests_file(tests_dir, rule_set):
     try:
-        jc_tests_file = _get_jc_tests_file(tests_dir, rule_set)
+        return _get_jc_tests_file(tests_dir, rule_set)
     except FileNotFoundError:
-        jc_tests_file = JsonCaseTestsFile()
-    return tests_path, jc_tests_file
+        return _get_tests_file_path(tests_dir, rule_set), JsonCaseTestsFile()
+
+
+def _json_digest(obj, header=""):
+    """Return a SHA-256 hex digest of the JSON text of an object.
+
+    The JSON text is hashed in pieces, so sequences like the ballots of a
+    contest are never all in memory.
+
+    Arguments:
+      obj: a jsonable or JSON object.
+      header: text to hash before the JSON text.
+    """
+    digest = hashlib.sha256(header.encode(jsonlib.ENCODING_JSON))
+    for text in jsonlib.iter_json(obj):
+        digest.update(text.encode(jsonlib.ENCODING_JSON))
+    return digest.hexdigest()
+
+
+def _get_ballots_jsobj(jc_contest):
+    """Return the ballots of a contest without deserializing them if possible."""
+    return dict(jc_contest.iter_jsdict_items()).get('ballots', [])
+
+
+# This function is run in worker processes, so it needs to be picklable.
+def _normalize_ballots_jsobj(ballots_jsobj):
+    """Normalize the ballots of a contest.
+
+    Returns a 2-tuple (ballots_jsobj, ballots_digest) for the normalized
+    ballots.
+    """
+    ballots_resource = JsonCaseBallots.from_jsobj(ballots_jsobj).to_model()
+    ballots_resource.normalize()
+    ballots_jsobj = JsonCaseBallots.from_model(ballots_resource).to_jsobj()
+    return ballots_jsobj, _json_digest(ballots_jsobj)
 
 
 # TODO: log normalization conversions (e.g. if they are unequal), and use
 #   an equality check on the JSON object to know if there was a difference.
 # TODO: normalize the candidate names.
-def normalize_contests_file(contests_path):
+def normalize_contests_file(contests_path, processes=1):
+    """Clean and normalize a contests file, and return a summary.
+
+    The ballots of each contest are normalized unless the contest's
+    ballots_digest shows they already were.
+
+    Arguments:
+      processes: the number of worker processes with which to normalize
+        the ballots.  A value of 1 normalizes them in this process.
+    """
     jc_file = _get_jc_contests_file(contests_path)
     jc_file.version = openrcv.__version__
 
@@ -111,18 +223,37 @@ def normalize_contests_file(contests_path):
         if id_ in ids:
             raise Exception("duplicate id: {0} (lower-cased)".format(id_))
         ids.add(id_)
+    to_normalize = []
     for index, jc_contest in enumerate(jc_contests, start=1):
         jc_contest.index = index
         if not jc_contest.id:
             jc_contest.id = generate_id(ids)
-        if jc_contest.normalize_ballots:
-            contest = jc_contest.to_model()
-            contest.ballots_resource.normalize()
-            normalized = JsonCaseContestInput.from_model(contest)
-            jc_contest.ballots = normalized.ballots
         if not jc_contest.rule_sets:
             jc_contest.rule_sets = []
-    jsonlib.write_json(jc_file, path=contests_path)
+        if not jc_contest.normalize_ballots:
+            continue
+        ballots_jsobj = _get_ballots_jsobj(jc_contest)
+        if jc_contest.ballots_digest != _json_digest(ballots_jsobj):
+            to_normalize.append((jc_contest, ballots_jsobj))
+
+    ballots_jsobjs = (ballots_jsobj for jc_contest, ballots_jsobj in to_normalize)
+    with ExitStack() as stack:
+        if processes <= 1:
+            results = map(_normalize_ballots_jsobj, ballots_jsobjs)
+        else:
+            executor = stack.enter_context(
+                concurrent.futures.ProcessPoolExecutor(max_workers=processes))
+            results = utils.iter_executor_map(executor, _normalize_ballots_jsobj,
+                                              ballots_jsobjs,
+                                              max_pending=PENDING_CONTESTS_PER_CPU * processes)
+        # The results are yielded in file order.
+        for (jc_contest, _), (ballots_jsobj, digest) in zip(to_normalize, results):
+            jc_contest.ballots = JsonCaseBallots.from_jsobj(ballots_jsobj)
+            jc_contest.ballots_digest = digest
+    _save_jc_contests_file(jc_file, contests_path)
+    normalized_count = len(to_normalize)
+    return ("normalized the ballots of {0:d} of {1:d} contests\n"
+            .format(normalized_count, len(jc_contests)))
 
 
 def update_tests_file(contests_file, contest_inputs, tests_dir, rule_set):
@@ -137,7 +268,7 @@ def update_tests_file(contests_file, contest_inputs, tests_dir, rule_set):
     # Create a mapping from ID to list of JsonCaseTestInstance objects.
     id_to_tests = {}
     # Add the existing tests, while preserving their current order.
-    for test in tests_file.test_cases:
+    for test in tests_file.test_cases or ():
         jc_contest = test.input
         jc_contest_id = jc_contest.id
         seq = id_to_tests.setdefault(jc_contest_id, [])
@@ -157,7 +288,7 @@ def update_tests_file(contests_file, contest_inputs, tests_dir, rule_set):
     tests = []
     index = 1
     # Add the contests in the order they appear in the contests file.
-    for jc_contest in contests_file.contests:
+    for jc_contest in contest_inputs:
         jc_contest_id = jc_contest.id
         for test in id_to_tests[jc_contest_id]:
             test.index = index
@@ -168,9 +299,50 @@ def update_tests_file(contests_file, contest_inputs, tests_dir, rule_set):
     jsonlib.write_json(tests_file, path=tests_path)
 
 
-def update_test_inputs(contests_path, tests_dir):
+def _with_ballots_ref(jc_contest, ballots_store):
+    """Return a copy of a contest whose ballots are stored by reference."""
+    if jc_contest.ballots_ref is not None:
+        return jc_contest
+    ballots = _get_ballots_jsobj(jc_contest)
+    jc_contest = copy.copy(jc_contest)
+    jc_contest.ballots = None
+    jc_contest.ballots_ref = ballots_store.put(ballots)
+    return jc_contest
+
+
+def _get_ballots_refs(tests_dir):
+    """Return the set of ballots references in the tests files of a directory."""
+    refs = set()
+    for file_name in _get_tests_file_names(tests_dir):
+        file_path = os.path.join(tests_dir, file_name)
+        with jsonlib.open_json_array(file_path, 'test_cases') as (jsdict, items):
+            for jsobj in items:
+                ref = jsobj.get('input', {}).get('ballots_ref')
+                if ref is not None:
+                    refs.add(ref)
+    return refs
+
+
+def update_test_inputs(contests_path, tests_dir, shared_ballots=False):
+    """Update the test inputs in a tests directory from a contests file.
+
+    Afterwards, ballots in the tests directory's ballots store that no
+    tests file refers to are deleted.
+
+    Arguments:
+      shared_ballots: whether the test cases should refer to the ballots
+        of their contest in the tests directory's ballots store (see
+        openrcv.jcblobs), so the ballots of a contest in more than one
+        rule set are stored and parsed only once.  Otherwise, the
+        ballots are copied into each test case, so that each tests file
+        stands alone.
+    """
     contests_file = _get_jc_contests_file(contests_path)
     jc_contests = contests_file.contests
+    ballots_store = jcblobs.BallotBlobStore.for_tests_dir(tests_dir)
+    if shared_ballots:
+        jc_contests = [_with_ballots_ref(jc_contest, ballots_store)
+                       for jc_contest in jc_contests]
     # Create a mapping from rule set to list of JsonCaseContestInput objects.
     rule_sets = {}
     for jc_contest in jc_contests:
@@ -180,45 +352,318 @@ def update_test_inputs(contests_path, tests_dir):
     for rule_set in sorted(rule_sets.keys()):
         contest_inputs = rule_sets[rule_set]
         update_tests_file(contests_file, contest_inputs, tests_dir, rule_set)
+    if ballots_store.refs():
+        ballots_store.prune(_get_ballots_refs(tests_dir))
 
 
-def count_test_case(test):
+def count_test_case(test, ballots_store=None):
     """Count a test case, and return a JsonCaseTestOutput object.
 
     Arguments:
       test: a JsonCaseTestInstance object.
+      ballots_store: the jcblobs.BallotBlobStore object from which to
+        read ballots stored by reference.
     """
     jc_contest = test.input
-    contest = jc_contest.to_model()
+    contest = jc_contest.to_model(ballots_store=ballots_store)
     contest_results = counting.count_irv_contest(contest)
     jc_output = JsonCaseTestOutput.from_model(contest_results)
     return jc_output
 
 
 def count_json_test_case(tests_dir, rule_set, index):
-    tests_path, jc_tests_file = _get_jc_tests_file(tests_dir, rule_set)
-    for test in jc_tests_file.test_cases:
-        if test.index == index:
-            break
-    else:
-        raise Exception("index {0} not found in: {1}".format(index, tests_path))
-    jc_output = count_test_case(test)
+    tests_path = _get_tests_file_path(tests_dir, rule_set)
+    # The index lets us read only the matching test case.
+    test = jcindex.JsonTestsFileIndex(tests_path).read_test(index)
+    ballots_store = jcblobs.BallotBlobStore.for_tests_dir(tests_dir)
+    jc_output = count_test_case(test, ballots_store=ballots_store)
     return jc_output.to_json()
 
 
-def update_test_outputs_file(file_path):
-    js_tests_file = jsonlib.read_json_path(file_path)
-    jc_tests_file = JsonCaseTestsFile.from_jsobj(js_tests_file)
-    for test in jc_tests_file.test_cases:
-        try:
-            jc_output = count_test_case(test)
-        except Exception as exc:
-            raise type(exc)("during contest: {0!r}".format(test))
-        test.output = jc_output
-    jsonlib.write_json(jc_tests_file, path=file_path)
+def _update_test_output(test, ballots_store=None):
+    try:
+        jc_output = count_test_case(test, ballots_store=ballots_store)
+    except Exception as exc:
+        raise type(exc)("during contest: {0!r}".format(test))
+    test.output = jc_output
+    return test
 
 
-def update_test_outputs(tests_dir):
-    for file_name in os.listdir(tests_dir):
+# This function is run in worker processes, so it needs to be picklable.
+def _count_test_jsobj(jsobj, ballots_store=None):
+    """Count a test case JSON object, and return the output as a JSON object."""
+    test = JsonCaseTestInstance.from_jsobj(jsobj)
+    return _update_test_output(test, ballots_store=ballots_store).output.to_jsobj()
+
+
+def _input_jsobj(test):
+    """Return the JSON object of a test case, without its output."""
+    test = JsonCaseTestInstance(index=test.index, rules=test.rules, input=test.input)
+    # Since the input attribute is lazy, its JSON object is reused as is.
+    return test.to_jsobj()
+
+
+def input_digest(jc_input, rule_set):
+    """Return a digest of a test input, for detecting stale test outputs.
+
+    The digest covers the normalized JSON text of the input, the rule
+    set, and the openrcv version, since any of these can change the
+    output.
+
+    Arguments:
+      jc_input: a JsonCaseContestInput object or its JSON object.
+    """
+    header = "{0}\n{1}\n".format(openrcv.__version__, rule_set)
+    return _json_digest(jc_input, header=header)
+
+
+def _iter_updated_tests(tests, rule_set, count_tests, stats):
+    """Yield test cases with up-to-date outputs.
+
+    Only test cases whose output is missing or was computed from a
+    different input digest are counted.
+
+    Arguments:
+      tests: an iterator over JsonCaseTestInstance objects.
+      count_tests: a function that accepts an iterator over the test
+        cases to count, and returns an iterator over their new
+        JsonCaseTestOutput objects in the same order.
+      stats: an UpdateStats object to update.
+    """
+    def annotate(test):
+        digest = input_digest(test.input, rule_set)
+        output = test.output
+        return test, digest, output is not None and output.input_digest == digest
+
+    # tee() holds only the test cases between the one being yielded and
+    # the last one passed to count_tests().
+    annotated, to_check = tee(map(annotate, tests))
+    outputs = count_tests(test for test, digest, is_current in to_check if not is_current)
+    for test, digest, is_current in annotated:
+        if is_current:
+            stats.reused += 1
+        else:
+            test.output = next(outputs)
+            test.output.input_digest = digest
+            stats.recomputed += 1
+        yield test
+
+
+def _write_json_if_changed(obj, path):
+    """Write a jsonable object to a path, unless the file already has that content.
+
+    Returns whether the file was written.
+    """
+    resource = streams.FilePathResource(path, encoding=jsonlib.ENCODING_JSON)
+    temp_resource = resource.copy()
+    try:
+        jsonlib.write_json(obj, resource=temp_resource)
+        changed = not filecmp.cmp(temp_resource.path, path, shallow=False)
+        if changed:
+            temp_resource.move(resource)
+    finally:
+        temp_resource.delete()
+    return changed
+
+
+class UpdateStats(object):
+
+    """Counts of what updating test outputs did."""
+
+    def __init__(self):
+        self.files_written = 0
+        self.files = 0
+        self.recomputed = 0
+        self.reused = 0
+
+    def summary(self):
+        return ("recomputed {0:d} and reused {1:d} test outputs; "
+                "wrote {2:d} of {3:d} files\n".format(self.recomputed, self.reused,
+                                                      self.files_written, self.files))
+
+
+def update_test_outputs_file(file_path, executor=None, max_pending=None, stats=None):
+    """Count the test cases in a tests file, and update their outputs.
+
+    Test cases whose input digest matches the one stored in their output
+    are not counted, and the file is not rewritten if its content would
+    not change.  Ballots stored by reference are read from the ballots
+    store of the file's directory.
+
+    Arguments:
+      executor: a concurrent.futures.Executor object with which to count
+        the test cases.  Defaults to counting them in this process.
+      max_pending: the maximum number of test cases to submit to the
+        executor at a time.  Defaults to PENDING_TESTS_PER_CPU times
+        the number of CPUs.
+      stats: an UpdateStats object to update.
+
+    Returns the UpdateStats object.
+    """
+    if stats is None:
+        stats = UpdateStats()
+    ballots_store = jcblobs.BallotBlobStore.for_tests_dir(os.path.dirname(file_path))
+    if executor is None:
+        def count_tests(tests):
+            return (_update_test_output(test, ballots_store=ballots_store).output
+                    for test in tests)
+
+        reading = _reading_jc_tests_file(file_path)
+    else:
+        if max_pending is None:
+            max_pending = PENDING_TESTS_PER_CPU * (os.cpu_count() or 1)
+
+        def count_tests(tests):
+            jsobjs = map(_input_jsobj, tests)
+            func = partial(_count_test_jsobj, ballots_store=ballots_store)
+            outputs = utils.iter_executor_map(executor, func, jsobjs,
+                                              max_pending=max_pending)
+            return map(JsonCaseTestOutput.from_jsobj, outputs)
+
+        reading = _reading_raw_jc_tests_file(file_path)
+    with reading as (jc_tests_file, tests):
+        jc_tests_file.test_cases = _iter_updated_tests(tests, jc_tests_file.rule_set,
+                                                       count_tests, stats)
+        written = _write_json_if_changed(jc_tests_file, file_path)
+    stats.files += 1
+    stats.files_written += written
+    return stats
+
+
+def update_test_outputs(tests_dir, processes=1):
+    """Update the test outputs of the tests files in a directory.
+
+    Returns a summary of the test outputs recomputed and files written.
+
+    Arguments:
+      processes: the number of worker processes with which to count the
+        test cases.  A value of 1 counts them in this process.
+    """
+    file_paths = [os.path.join(tests_dir, file_name)
+                  for file_name in _get_tests_file_names(tests_dir)]
+    stats = UpdateStats()
+    if processes <= 1:
+        for file_path in file_paths:
+            update_test_outputs_file(file_path, stats=stats)
+        return stats.summary()
+    # Use a single pool for all files so the workers are started once.
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        for file_path in file_paths:
+            update_test_outputs_file(file_path, executor=executor,
+                                     max_pending=PENDING_TESTS_PER_CPU * processes,
+                                     stats=stats)
+    return stats.summary()
+
+
+# The result of checking a test case with a counting engine.  The error
+# is None if the test case passed.  The times are in seconds, and are None
+# for steps not reached because of an error.
+CheckResult = collections.namedtuple('CheckResult',
+    ('file_name', 'index', 'engine', 'error', 'parse_time', 'count_time', 'compare_time'))
+
+
+def _compare_output(contest_results, expected):
+    """Return None if contest results match an output JSON object, or else an error."""
+    if expected is None:
+        return "test case has no output"
+    actual = JsonCaseTestOutput.from_model(contest_results).to_jsobj()
+    # The metadata (e.g. the input digest) is not part of the results.
+    actual.pop('_meta', None)
+    expected = {key: value for key, value in expected.items() if key != '_meta'}
+    return None if actual == expected else "output differs"
+
+
+# This function is run in worker processes, so it needs to be picklable.
+def _check_test_jsobj(item, ballots_store=None):
+    """Count a test case JSON object, and compare it with the expected output.
+
+    Arguments:
+      item: a 3-tuple (file_name, jsobj, engine_label).
+      ballots_store: the jcblobs.BallotBlobStore object from which to
+        read ballots stored by reference.
+
+    Returns a CheckResult object.
+    """
+    file_name, jsobj, engine_label = item
+    engine = counting.make_engines()[engine_label]
+    index = jsobj.get('_meta', {}).get('index')
+    parse_time = count_time = compare_time = None
+    start_time = time.perf_counter()
+    try:
+        test = JsonCaseTestInstance.from_jsobj(jsobj)
+        contest = test.input.to_model(ballots_store=ballots_store)
+        parse_end = time.perf_counter()
+        parse_time = parse_end - start_time
+        contest_results = engine.func(contest)
+        count_end = time.perf_counter()
+        count_time = count_end - parse_end
+        error = _compare_output(contest_results, jsobj.get('output'))
+        compare_time = time.perf_counter() - count_end
+    except Exception as exc:
+        error = "{0}: {1}".format(type(exc).__name__, exc)
+    return CheckResult(file_name, index, engine_label, error,
+                       parse_time, count_time, compare_time)
+
+
+def _iter_check_items(tests_dir, engine_labels):
+    """Yield the items to pass to _check_test_jsobj()."""
+    for file_name in _get_tests_file_names(tests_dir):
         file_path = os.path.join(tests_dir, file_name)
-        update_test_outputs_file(file_path)
+        with jsonlib.open_json_array(file_path, 'test_cases') as (jsdict, items):
+            for jsobj in items:
+                for engine_label in engine_labels:
+                    yield file_name, jsobj, engine_label
+
+
+def _format_time(seconds):
+    return "-" if seconds is None else "{0:.4f}".format(seconds)
+
+
+def format_check_results(results):
+    """Return a report of CheckResult objects, with a timing table."""
+    header = ("file", "index", "engine", "parse (s)", "count (s)", "compare (s)", "result")
+    rows = [(r.file_name, str(r.index), r.engine, _format_time(r.parse_time),
+             _format_time(r.count_time), _format_time(r.compare_time),
+             "ok" if r.error is None else "FAIL: " + r.error) for r in results]
+    widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header) - 1)]
+    lines = []
+    for row in [header] + rows:
+        # Left-align the text columns, and right-align the numeric ones.
+        cells = [row[0].ljust(widths[0]), row[1].rjust(widths[1]), row[2].ljust(widths[2])]
+        cells.extend(cell.rjust(width) for cell, width in zip(row[3:6], widths[3:]))
+        cells.append(row[6])
+        lines.append("  ".join(cells))
+    failed_count = sum(1 for r in results if r.error is not None)
+    lines.append("checked {0:d} test cases: {1:d} passed, {2:d} failed"
+                 .format(len(results), len(results) - failed_count, failed_count))
+    return "\n".join(lines) + "\n"
+
+
+def check_tests(tests_dir, engine_labels=None, processes=1):
+    """Recount the test cases in a tests directory, and check the outputs.
+
+    Each test case is counted with each engine and compared with its
+    stored output.  The time spent parsing the input, counting, and
+    comparing is recorded for each.
+
+    Arguments:
+      engine_labels: the labels of the counting engines to use (see
+        counting.make_engines()).  Defaults to all engines.
+      processes: the number of worker processes with which to count the
+        test cases.  A value of 1 counts them in this process.
+
+    Returns a list of CheckResult objects.  See format_check_results().
+    """
+    if engine_labels is None:
+        engine_labels = sorted(counting.make_engines())
+    items = _iter_check_items(tests_dir, engine_labels)
+    ballots_store = jcblobs.BallotBlobStore.for_tests_dir(tests_dir)
+    check_test = partial(_check_test_jsobj, ballots_store=ballots_store)
+    if processes <= 1:
+        results = list(map(check_test, items))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+            results = utils.iter_executor_map(executor, check_test, items,
+                                              max_pending=PENDING_TESTS_PER_CPU * processes)
+            results = list(results)
+    return results
@@ -43,11 +43,37 @@ processed one at a time -- as opposed to having to load them into memory
 all at once.
 """
 
+from itertools import islice
+
 from openrcv import contestgen, models, streams
-from openrcv.formats.internal import parse_internal_ballot, to_internal_ballot
-from openrcv.jsonlib import (from_jsobj, Attribute, JsonableError, JsonableMixin,
-                             JsonDeserializeError)
-from openrcv.utils import StringInfo
+from openrcv.formats.common import format_ballot_lines, iter_ballot_arrays
+from openrcv.formats.internal import (parse_internal_ballot, parse_internal_ballots,
+                                      to_internal_ballot)
+from openrcv.jsonlib import (attr_slots, from_jsobj, Attribute, JsonableError, JsonableMixin,
+                             JsonArrayStream, JsonDeserializeError)
+from openrcv.models import CompactBallotsResource
+from openrcv.utils import ReprMixin, StringInfo
+
+
+# The number of ballots ballots_hook() writes at a time.
+HOOK_BATCH_SIZE = 10000
+
+
+def ballots_hook(ballots_resource):
+    """Return a hook that reads a ballots array into a ballots resource.
+
+    The return value can be passed in the hooks argument of
+    JsonStreamReader.read_value().  The hook writes the ballots to the
+    ballots resource as they are decoded, and returns a JsonArrayStream
+    that JsonCaseContestInput objects accept in place of a list of ballots.
+    """
+    def read_ballots(items):
+        with ballots_resource.writing_batches() as gen:
+            for batch in iter(lambda: list(islice(items, HOOK_BATCH_SIZE)), []):
+                gen.send([parse_internal_ballot(jsobj) for jsobj in batch])
+        return JsonArrayStream(ballots_resource, convert=to_internal_ballot)
+
+    return read_ballots
 
 
 class JsonCaseConstants(JsonableMixin):
@@ -56,6 +82,8 @@ class JsonCaseConstants(JsonableMixin):
                   Attribute('notes'), )
     data_attrs = (Attribute('candidate_names'), )
 
+    __slots__ = attr_slots(meta_attrs, data_attrs)
+
 
 class JsonCaseBallot(JsonableMixin):
 
@@ -66,6 +94,8 @@ class JsonCaseBallot(JsonableMixin):
     data_attrs = (Attribute('choices'),
                   Attribute('weight'))
 
+    __slots__ = attr_slots(data_attrs)
+
     # We need to override model_to_kwargs() since the model object is a
     # tuple rather than a class with attributes.
     @classmethod
@@ -101,20 +131,115 @@ class JsonCaseBallot(JsonableMixin):
         """
         return self.weight, self.choices
 
-    def save_from_jsobj(self, jsobj):
-        """Read a JSON object, and set attributes to match."""
+    # Test files can have many ballots, so we override from_jsobj() to
+    # initialize each ballot only once.
+    @classmethod
+    def from_jsobj(cls, jsobj):
+        """Create a JsonCaseBallot object from a JSON object."""
         try:
             weight, choices = parse_internal_ballot(jsobj)
         except ValueError:
             # Can happen with "1 2 abc", for example.
             # ValueError: invalid literal for int() with base 10: 'abc'
             raise JsonDeserializeError("error parsing: %r" % jsobj)
-        self.__init__(choices=choices, weight=weight)
+        return cls(choices, weight)
+
+    def save_from_jsobj(self, jsobj):
+        """Read a JSON object, and set attributes to match."""
+        jc_ballot = self.from_jsobj(jsobj)
+        self.__init__(choices=jc_ballot.choices, weight=jc_ballot.weight)
 
     def to_jsobj(self):
         """Return a JSON object."""
-        ballot = self.to_model()
-        return to_internal_ballot(ballot)
+        return to_internal_ballot((self.weight, self.choices))
+
+
+class JsonCaseBallots(ReprMixin):
+
+    """The ballots of a JSON test case, stored in columnar form.
+
+    The ballots are kept in a CompactBallotsResource rather than as one
+    JsonCaseBallot object per ballot.  Iterating over the object yields
+    JsonCaseBallot objects, which are created as needed, and the object
+    compares equal to a sequence of the same JsonCaseBallot objects.
+    The JSON object is an array of ballot strings (see JsonCaseBallot).
+    """
+
+    __slots__ = ('resource', )
+
+    # Tell from_jsobj() to pass the whole array.
+    jsobj_is_array = True
+
+    def __init__(self, resource=None):
+        """
+        Arguments:
+          resource: a CompactBallotsResource object.
+        """
+        if resource is None:
+            resource = CompactBallotsResource()
+        self.resource = resource
+
+    def repr_info(self):
+        return "ballots=%d" % len(self)
+
+    def __len__(self):
+        return len(self.resource)
+
+    def __iter__(self):
+        with self.resource.reading() as ballots:
+            for weight, choices in ballots:
+                yield JsonCaseBallot(choices, weight)
+
+    def __eq__(self, other):
+        if isinstance(other, JsonCaseBallots):
+            other = other.resource
+            resource = self.resource
+            return (resource.weights == other.weights and
+                    resource.choices == other.choices and resource.ends == other.ends)
+        try:
+            return len(self) == len(other) and all(map(JsonCaseBallot.__eq__, self, other))
+        except TypeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    @classmethod
+    def from_model(cls, ballots_resource):
+        """Create an instance from the ballots in a ballots resource."""
+        jc_ballots = cls()
+        for weights, choices, ends in iter_ballot_arrays(ballots_resource):
+            jc_ballots.resource.extend_ballots(weights, choices, ends)
+        return jc_ballots
+
+    def to_model(self):
+        """Return a new CompactBallotsResource containing the ballots."""
+        resource = CompactBallotsResource()
+        source = self.resource
+        resource.extend_ballots(source.weights, source.choices, source.ends)
+        return resource
+
+    @classmethod
+    def from_jsobj(cls, jsobj):
+        """Create an instance from a list of ballot strings."""
+        try:
+            weights, choices, ends = parse_internal_ballots(jsobj)
+        except Exception:
+            # Parse the ballots one at a time to report the invalid one.
+            for ballot in jsobj:
+                JsonCaseBallot.from_jsobj(ballot)
+            raise
+        jc_ballots = cls()
+        jc_ballots.resource.extend_ballots(weights, choices, ends)
+        return jc_ballots
+
+    def to_jsobj(self):
+        """Return a list of ballot strings."""
+        jsobj = []
+        for weights, choices, ends in iter_ballot_arrays(self.resource):
+            jsobj.extend(format_ballot_lines(weights, choices, ends).splitlines())
+        return jsobj
 
 
 class JsonCaseContestInput(JsonableMixin):
@@ -122,24 +247,35 @@ class JsonCaseContestInput(JsonableMixin):
     """Contest input for a JSON test case.
 
     Attributes (metadata):
+      ballots_digest: a digest of the ballots as last normalized, or
+        None.  If it matches the ballots, they need not be normalized
+        again.
       normalize_ballots: None means True.  Defaults to None.
 
     Attributes:
-      ballots: an iterable of JsonCaseBallot objects.
+      ballots: an iterable of JsonCaseBallot objects, usually a
+        JsonCaseBallots object.  None if the ballots are stored by
+        reference.
+      ballots_ref: the reference of the ballots in a ballots store
+        (see openrcv.jcblobs), or None if the ballots are inline.
       candidate_count: integer number of candidates.
     """
 
-    meta_attrs = (Attribute('id', model=False),
+    meta_attrs = (Attribute('ballots_digest', model=False),
+                  Attribute('id', model=False),
                   Attribute('index', model=False),
                   Attribute('name'),
                   Attribute('normalize_ballots', model=False),
                   Attribute('rule_sets', model=False),
                   Attribute('notes'), )
-    data_attrs = (Attribute('ballots', cls=JsonCaseBallot, model=False),
+    data_attrs = (Attribute('ballots', cls=JsonCaseBallots, model=False, lazy=True),
+                  Attribute('ballots_ref', model=False),
                   Attribute('candidate_count', model=False),
                   # TODO: make model=True.
                   Attribute('tie_elimination_order', model=False), )
 
+    __slots__ = attr_slots(meta_attrs, data_attrs)
+
     def repr_info(self):
         return "index=%s id=%s" % (self.index, self.id)
 
@@ -152,23 +288,58 @@ class JsonCaseContestInput(JsonableMixin):
         Arguments:
           contest: a ContestInput object.
         """
+        ballots = JsonCaseBallots.from_model(contest.ballots_resource)
+        self._save_from_model(contest, ballots)
+
+    def _save_from_model(self, contest, ballots):
         candidate_count = None if contest.candidates is None else len(contest.candidates)
-        with contest.ballots_resource.reading() as ballots:
-            ballots = [JsonCaseBallot.from_model(b) for b in ballots]
         kwargs = self.model_to_kwargs(contest)
         self.__init__(candidate_count=candidate_count, ballots=ballots, **kwargs)
 
+    @classmethod
+    def from_model_streamed(cls, contest):
+        """Like from_model(), but without reading the ballots into memory.
+
+        The ballots attribute of the returned object is a JsonArrayStream
+        that reads the contest's ballots resource only when written
+        (e.g. by jsonlib.write_json()).
+        """
+        jc_contest = cls()
+        ballots = JsonArrayStream(contest.ballots_resource, convert=to_internal_ballot)
+        jc_contest._save_from_model(contest, ballots)
+        return jc_contest
+
     # TODO: think about how the creation of a new ballots resource should
     # be handled, since it involves managing another resource.
     # TODO: DRY this up by making last two lines part of base class.
-    def to_model(self):
-        """Return a ContestInput object."""
+    def to_model(self, ballots_store=None):
+        """Return a ContestInput object.
+
+        Arguments:
+          ballots_store: the store from which to read the ballots if they
+            are stored by reference, e.g. a jcblobs.BallotBlobStore
+            object.
+        """
         candidates = self.make_candidate_names()
-        ballots = [b.to_model() for b in self.ballots]
-        # We use a list resource as the backing store for now because the
-        # number of ballots is small.
-        resource = streams.ListResource(ballots)
-        ballots_resource = models.BallotsResource(resource)
+        ballots = self.ballots
+        if ballots is None and self.ballots_ref is not None:
+            if ballots_store is None:
+                raise JsonableError("contest ballots are stored by reference, "
+                                    "but no ballots store was given: %r" % self)
+            # The ballots are read fresh, so we can use their resource directly.
+            ballots_resource = ballots_store.get(self.ballots_ref).resource
+        elif isinstance(ballots, JsonArrayStream):
+            # Then the ballots were read into a ballots resource (see
+            # ballots_hook()), so we use that resource directly.
+            ballots_resource = ballots.resource
+        elif isinstance(ballots, JsonCaseBallots):
+            ballots_resource = ballots.to_model()
+        else:
+            ballots = [b.to_model() for b in ballots]
+            # We use a list resource as the backing store for now because the
+            # number of ballots is small.
+            resource = streams.ListResource(ballots)
+            ballots_resource = models.BallotsResource(resource)
         kwargs = self.model_to_kwargs(self)
         contest = models.ContestInput(candidates=candidates,
                                       ballots_resource=ballots_resource, **kwargs)
@@ -192,6 +363,9 @@ class JsonCaseContestsFile(JsonableMixin):
     meta_attrs = (Attribute('version'), )
     data_attrs = (Attribute('contests', cls=JsonCaseContestInput), )
 
+    # There are no __slots__ since normalize_contests_file() sets an
+    # additional candidate_names attribute.
+
 
 class JsonCaseRoundResult(JsonableMixin):
 
@@ -208,6 +382,8 @@ class JsonCaseRoundResult(JsonableMixin):
                   Attribute('tied_last_place'),
                   Attribute('totals'), )
 
+    __slots__ = attr_slots(data_attrs)
+
     # TODO: move this functionality to the base class (and DRY up with related methods).
     def save_attrs_to_jsobj(self, jsobj, names, convert=lambda x: x):
         for name in names:
@@ -234,8 +410,16 @@ class JsonCaseRoundResult(JsonableMixin):
 
 class JsonCaseTestOutput(JsonableMixin):
 
-    meta_attrs = ()
-    data_attrs = (Attribute('rounds', cls=JsonCaseRoundResult), )
+    """The expected output of a test case.
+
+    The input_digest attribute is a digest of the input from which the
+    output was computed (see jcmanage.input_digest()).
+    """
+
+    meta_attrs = (Attribute('input_digest', model=False), )
+    data_attrs = (Attribute('rounds', cls=JsonCaseRoundResult, lazy=True), )
+
+    __slots__ = attr_slots(meta_attrs, data_attrs)
 
 
 class JsonCaseTestInstance(JsonableMixin):
@@ -244,8 +428,10 @@ class JsonCaseTestInstance(JsonableMixin):
 
     meta_attrs = (Attribute('index'),
                   Attribute('rules'), )
-    data_attrs = (Attribute('input', cls=JsonCaseContestInput),
-                  Attribute('output', cls=JsonCaseTestOutput), )
+    data_attrs = (Attribute('input', cls=JsonCaseContestInput, lazy=True),
+                  Attribute('output', cls=JsonCaseTestOutput, lazy=True), )
+
+    __slots__ = attr_slots(meta_attrs, data_attrs)
 
 
 class JsonCaseTestsFile(JsonableMixin):
@@ -254,4 +440,6 @@ class JsonCaseTestsFile(JsonableMixin):
 
     meta_attrs = (Attribute('version'),
                   Attribute('rule_set'), )
-    data_attrs = (Attribute('test_cases', cls=JsonCaseTestInstance), )
+    data_attrs = (Attribute('test_cases', cls=JsonCaseTestInstance, lazy=True), )
+
+    __slots__ = attr_slots(meta_attrs, data_attrs)
@@ -0,0 +1,245 @@
+#
+# Copyright (c) 2014 Chris Jerdonek. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+"""Supports an append-only JSON Lines store of test contests.
+
+Adding a contest to a JSON contests file requires reading and rewriting
+the whole file, so adding many contests one at a time (e.g. with
+`rcv randcontest -j`) takes time quadratic in the number of contests.
+A contests store instead keeps one contest per line of a JSON Lines
+file, so a contest can be added by appending a single line.
+
+A store at a path like "contests.jsonl" consists of--
+
+  * contests.jsonl: the contests, one compact JSON object per line,
+  * contests.jsonl.manifest: a small JSON file with the metadata of the
+    corresponding contests file (e.g. its version), and
+  * contests.jsonl.idx: the byte offsets at which the lines start, as
+    an array of 64-bit integers.
+
+The index is also appended to, so both reading a contest by position and
+adding a contest take constant time.  The index is rebuilt if it does
+not match the JSON Lines file (e.g. if the file was edited by hand).
+A store can be compacted into the usual JsonCaseContestsFile layout
+with compact().
+"""
+
+from array import array
+import json
+import logging
+import os
+
+from openrcv import jsonlib, streams
+from openrcv.jcmodels import JsonCaseContestInput, JsonCaseContestsFile
+from openrcv.utils import ReprMixin, ENCODING_JSON
+
+
+log = logging.getLogger(__name__)
+
+# The file extension identifying a contests path as a store.
+STORE_EXTENSION = ".jsonl"
+MANIFEST_SUFFIX = ".manifest"
+INDEX_SUFFIX = ".idx"
+# Increment this when the store format changes.
+STORE_VERSION = 1
+
+# The array type code for the offsets in the index.
+_OFFSET_TYPE = 'q'
+
+
+def is_store_path(path):
+    """Return whether a contests path refers to a contests store."""
+    return os.path.splitext(path)[1].lower() == STORE_EXTENSION
+
+
+def _to_line(jsobj):
+    """Serialize a JSON object as a line of a JSON Lines file."""
+    # json.dumps() escapes any newlines in strings.
+    text = json.dumps(jsobj, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    return (text + "\n").encode(ENCODING_JSON)
+
+
+class JsonContestsStore(ReprMixin):
+
+    """An append-only store of JsonCaseContestInput objects.
+
+    See the module docstring for the layout of the store on disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._offsets = None
+
+    def repr_info(self):
+        return "path=%r" % (self.path, )
+
+    @property
+    def manifest_path(self):
+        return self.path + MANIFEST_SUFFIX
+
+    @property
+    def index_path(self):
+        return self.path + INDEX_SUFFIX
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def read_meta(self):
+        """Return the metadata dict of the contests file (e.g. its version)."""
+        try:
+            manifest = jsonlib.read_json_path(self.manifest_path)
+        except FileNotFoundError:
+            return {}
+        return manifest.get("meta", {})
+
+    def write_meta(self, meta):
+        manifest = {"store_version": STORE_VERSION, "meta": meta}
+        jsonlib.write_json(manifest, path=self.manifest_path)
+
+    def _index_is_current(self, offsets):
+        """Return whether the offsets match the lines of the JSON Lines file.
+
+        Only the last line is read, so this takes constant time.
+        """
+        size = os.path.getsize(self.path)
+        if not offsets:
+            return size == 0
+        last = offsets[-1]
+        if last >= size:
+            return False
+        with open(self.path, "rb") as f:
+            if last > 0:
+                f.seek(last - 1)
+                if f.read(1) != b"\n":
+                    return False
+            line = f.readline()
+        return line.endswith(b"\n") and last + len(line) == size
+
+    def build_index(self):
+        """Scan the JSON Lines file, and return an array of line offsets."""
+        log.info("indexing contests store: %s" % self.path)
+        offsets = array(_OFFSET_TYPE)
+        position = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                offsets.append(position)
+                position += len(line)
+        return offsets
+
+    def _write_index(self, offsets):
+        resource = streams.FilePathResource(self.index_path)
+        with resource.replacement() as temp_resource:
+            with open(temp_resource.path, "wb") as f:
+                offsets.tofile(f)
+
+    def get_offsets(self):
+        """Return the array of line offsets, reading or building the index if necessary."""
+        if self._offsets is not None:
+            return self._offsets
+        offsets = array(_OFFSET_TYPE)
+        if not self.exists():
+            return offsets
+        try:
+            with open(self.index_path, "rb") as f:
+                offsets.frombytes(f.read())
+        except (OSError, ValueError):
+            offsets = array(_OFFSET_TYPE)
+        if not self._index_is_current(offsets):
+            offsets = self.build_index()
+            self._write_index(offsets)
+        self._offsets = offsets
+        return offsets
+
+    def count(self):
+        """Return the number of contests in the store."""
+        return len(self.get_offsets())
+
+    def append(self, jc_contest):
+        """Add a JsonCaseContestInput object to the end of the store."""
+        offsets = self.get_offsets()
+        if not os.path.exists(self.manifest_path):
+            self.write_meta({})
+        line = _to_line(jc_contest.to_jsobj())
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(line)
+        # Write the contest before its offset so that an interrupted
+        # append leaves an index that is detected as out of date.
+        offsets.append(offset)
+        with open(self.index_path, "ab") as f:
+            array(_OFFSET_TYPE, [offset]).tofile(f)
+        self._offsets = offsets
+
+    def add_contest(self, contest):
+        """Add a ContestInput object to the end of the store."""
+        self.append(JsonCaseContestInput.from_model(contest))
+
+    def read_contest(self, position):
+        """Return the contest at a 0-based position as a JsonCaseContestInput object."""
+        offsets = self.get_offsets()
+        with open(self.path, "rb") as f:
+            f.seek(offsets[position])
+            line = f.readline()
+        return JsonCaseContestInput.from_jsobj(json.loads(line.decode(ENCODING_JSON)))
+
+    def iter_contests(self):
+        """Yield the contests in order as JsonCaseContestInput objects."""
+        if not self.exists():
+            return
+        with open(self.path, encoding=ENCODING_JSON) as f:
+            for line in f:
+                if line.strip():
+                    yield JsonCaseContestInput.from_jsobj(json.loads(line))
+
+    def to_contests_file(self, streamed=False):
+        """Return the store as a JsonCaseContestsFile object.
+
+        Arguments:
+          streamed: whether the contests attribute should be a generator
+            rather than a list, e.g. to pass to jsonlib.write_json().
+        """
+        meta = self.read_meta()
+        contests = self.iter_contests()
+        if not streamed:
+            contests = list(contests)
+        return JsonCaseContestsFile(contests=contests, **meta)
+
+    def save_contests_file(self, jc_file):
+        """Replace the contents of the store with a JsonCaseContestsFile object."""
+        offsets = array(_OFFSET_TYPE)
+        position = 0
+        resource = streams.FilePathResource(self.path)
+        with resource.replacement() as temp_resource:
+            with open(temp_resource.path, "wb") as f:
+                for jc_contest in jc_file.contests:
+                    line = _to_line(jc_contest.to_jsobj())
+                    f.write(line)
+                    offsets.append(position)
+                    position += len(line)
+        self._write_index(offsets)
+        self._offsets = offsets
+        self.write_meta(jc_file.get_meta_dict())
+
+    def compact(self, contests_path):
+        """Write the store to a JSON contests file in the canonical layout."""
+        jc_file = self.to_contests_file(streamed=True)
+        jsonlib.write_json(jc_file, path=contests_path)
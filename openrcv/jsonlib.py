@@ -41,8 +41,12 @@ JSON should be a deliberate decision (and in the Python world, None
 is the usual default value).
 """
 
+from collections import deque
+from contextlib import contextmanager
 import json
 import logging
+from operator import itemgetter
+import re
 
 from openrcv import streams
 from openrcv import utils
@@ -53,6 +57,17 @@ log = logging.getLogger(__name__)
 
 # Sequence types, including the generator type.
 LIST_TYPES = (list, tuple, type(0 for i in ()))
+# The types that iter_json() converts with a single call to json.dumps().
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+
+# The number of spaces per indentation level when writing JSON.
+JSON_INDENT = 4
+# The number of characters JsonStreamReader reads at a time.
+READ_CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# Text that can follow the part of a number that raw_decode() accepts.
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
 
 # TODO: refactor this to be a JSON object?  This would give us things
 # like a nice repr() and the chance to reduce special-casing.
@@ -62,7 +77,7 @@ JS_NULL = JsNull()
 
 
 def call_json(json_func, *args, **kwargs):
-    return json_func(*args, indent=4, sort_keys=True, **kwargs)
+    return json_func(*args, indent=JSON_INDENT, sort_keys=True, **kwargs)
 
 
 def to_json(jsobj):
@@ -78,22 +93,133 @@ def read_json_path(path):
     return jsobj
 
 
+@contextmanager
+def open_json_array(path, key, hooks=None):
+    """Return a context manager for reading the items of an array one at a time.
+
+    The JSON file should contain an object having an array at `key`.
+    Entering the context manager yields a 2-tuple (jsdict, items), where
+    jsdict is a dict of the object's other values and items is an
+    iterator that decodes the array items one at a time.  Thus, only one
+    item need be in memory at a time.
+
+    Values appearing before the array are in jsdict immediately.  Since
+    write_json() sorts keys, this includes "_meta" for the files written
+    by this project.  Keys appearing after the array are an error when
+    the iterator reaches them.
+
+    Arguments:
+      hooks: hooks for reading each item, as in JsonStreamReader.read_value().
+    """
+    # We don't use JsonPathInfo.open() since it would also wrap exceptions
+    # raised by the caller while processing the items.
+    with open(path, encoding=ENCODING_JSON) as f:
+        reader = JsonStreamReader(f)
+        jsdict = {}
+        keys = reader.iter_object()
+        for name in keys:
+            if name == key:
+                break
+            jsdict[name] = reader.read_value()
+        else:
+            yield jsdict, iter(())
+            return
+
+        def iter_items():
+            yield from reader.iter_array_values(hooks=hooks)
+            for name in keys:
+                raise JsonDeserializeError("key %r follows the array at %r in: %s" %
+                                           (name, key, path))
+
+        yield jsdict, iter_items()
+
+
+def _iter_json_container(items, level, is_dict):
+    """Yield the JSON text for an object or array, in pieces.
+
+    Arguments:
+      items: an iterable of (key, value) pairs if is_dict, and otherwise
+        an iterable of values.
+    """
+    open_char, close_char = ("{", "}") if is_dict else ("[", "]")
+    separator = "\n" + " " * (JSON_INDENT * (level + 1))
+    dumps = json.dumps
+    prefix = open_char + separator
+    is_empty = True
+    for item in items:
+        if is_dict:
+            key, item = item
+            yield prefix + dumps(key) + ": "
+        else:
+            yield prefix
+        prefix = "," + separator
+        is_empty = False
+        if isinstance(item, _SCALAR_TYPES):
+            yield dumps(item)
+        else:
+            yield from iter_json(item, level + 1)
+    if is_empty:
+        yield open_char + close_char
+    else:
+        yield "\n" + " " * (JSON_INDENT * level) + close_char
+
+
+def iter_json(obj, level=0):
+    """Yield the JSON text for a jsonable or JSON object, in pieces.
+
+    Joining the pieces gives the same text as to_json(to_jsobj(obj)).
+    However, jsonable attribute values are converted only as they are
+    written, and sequences (e.g. generators and JsonArrayStream objects)
+    are written as their items are produced.  Thus, the converted object
+    is never in memory all at once.
+
+    Arguments:
+      level: the indentation level of the object.
+    """
+    if isinstance(obj, JsonableMixin) and type(obj).to_jsobj is JsonableMixin.to_jsobj:
+        items = obj.iter_jsdict_items()
+        yield from _iter_json_container(sorted(items, key=itemgetter(0)), level, True)
+    elif isinstance(obj, _SCALAR_TYPES):
+        yield json.dumps(obj)
+    elif isinstance(obj, dict):
+        if all(isinstance(key, str) for key in obj):
+            yield from _iter_json_container(sorted(obj.items()), level, True)
+        else:
+            # Let the json module convert the keys to strings.
+            text = call_json(json.dumps, obj)
+            yield text.replace("\n", "\n" + " " * (JSON_INDENT * level))
+    elif isinstance(obj, _ARRAY_TYPES):
+        yield from _iter_json_container(obj, level, False)
+    else:
+        yield from iter_json(obj.to_jsobj(), level)
+
+
 # TODO: remove the path argument?
 # TODO: create a write_json_path() function?
 def write_json(obj, resource=None, path=None):
-    """
+    """Write a jsonable or JSON object as JSON.
+
+    The JSON is written incrementally (see iter_json()).  When writing
+    to a path, the JSON is written to a temporary file that replaces the
+    file at the path only after writing succeeds.
+
     Arguments:
       resource: a stream resource object.
     """
-    try:
-        jsobj = obj.to_jsobj()
-    except AttributeError:
-        jsobj = obj
     if path is not None:
         assert resource is None
         resource = streams.FilePathResource(path, encoding=ENCODING_JSON)
+        with resource.replacement() as temp_resource:
+            _write_json(obj, temp_resource)
+        return
+    _write_json(obj, resource)
+
+
+def _write_json(obj, resource):
     with resource.open_write() as f:
-        return call_json(json.dump, jsobj, f)
+        write = f.write
+        for text in iter_json(obj):
+            write(text)
 
 
 def from_model(obj, cls):
@@ -114,10 +240,23 @@ def from_jsobj(jsobj, cls=None):
     """Create an instance of the given class from a JSON object.
 
     Arguments:
-      cls: a class that serves as a "type hint."
+      cls: a class that serves as a "type hint."  If the class has a
+        true jsobj_is_array attribute, it is passed whole arrays rather
+        than their items.
     """
+    if cls is not None and getattr(cls, 'jsobj_is_array', False):
+        return jsobj if isinstance(jsobj, JsonArrayStream) else cls.from_jsobj(jsobj)
     if isinstance(jsobj, LIST_TYPES):
-        return [from_jsobj(o, cls=cls) for o in jsobj]
+        if cls is None:
+            return [from_jsobj(o) for o in jsobj]
+        # Call the class directly for the common case of an array of objects.
+        convert = cls.from_jsobj
+        return [from_jsobj(o, cls=cls) if isinstance(o, LIST_TYPES) else convert(o)
+                for o in jsobj]
+    if isinstance(jsobj, JsonArrayStream):
+        # Then the array was read into a stream resource (e.g. by a hook
+        # passed to JsonStreamReader.read_value()).
+        return jsobj
 
     if cls is not None:
         return cls.from_jsobj(jsobj)
@@ -130,13 +269,199 @@ def from_jsobj(jsobj, cls=None):
 
 def to_jsobj(obj):
     """Convert a Jsonable object to a JSON object, and return it."""
-    if isinstance(obj, LIST_TYPES):
+    if isinstance(obj, _ARRAY_TYPES):
         return [to_jsobj(o) for o in obj]
     if obj.__class__.__module__ == "builtins":
         return obj
     return obj.to_jsobj()
 
 
+class JsonArrayStream(object):
+
+    """A JSON array whose items are read from a stream resource as needed.
+
+    Writing the array with write_json() reads the resource while writing,
+    so that the items are never all in memory at once.
+    """
+
+    def __init__(self, resource, convert=None):
+        """
+        Arguments:
+          resource: a stream resource.
+          convert: a function that converts each item to a JSON object.
+        """
+        self.convert = convert
+        self.resource = resource
+
+    def __iter__(self):
+        with self.resource.reading() as items:
+            if self.convert is None:
+                yield from items
+            else:
+                yield from map(self.convert, items)
+
+
+# The types that to_jsobj() and iter_json() write as JSON arrays.
+_ARRAY_TYPES = LIST_TYPES + (JsonArrayStream, )
+
+
+class JsonStreamReader(object):
+
+    """Reads a JSON stream incrementally.
+
+    The reader decodes JSON values from chunks of text using the json
+    module's raw_decode(), so that a large file can be read without
+    decoding it (or even holding its text) all at once.  Callers can
+    step into objects and arrays with iter_object() and iter_array(),
+    and decode values with read_value().  For example--
+
+        for key in reader.iter_object():
+            if key == "items":
+                for item in reader.iter_array_values():
+                    ...
+            else:
+                value = reader.read_value()
+    """
+
+    def __init__(self, f, chunk_size=None):
+        """
+        Arguments:
+          f: a text stream.
+          chunk_size: the minimum number of characters to read at a time.
+        """
+        if chunk_size is None:
+            chunk_size = READ_CHUNK_SIZE
+        self.buffer = ""
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.file = f
+        self.is_eof = False
+        self.pos = 0
+        # The stream offset of the start of the buffer.
+        self.buffer_offset = 0
+
+    def _read_more(self):
+        """Read more text into the buffer, and return whether there was any."""
+        # Reading at least as much as is buffered keeps the total time
+        # to decode a large value linear in its size.
+        remaining = self.buffer[self.pos:]
+        chunk = self.file.read(max(self.chunk_size, len(remaining)))
+        if not chunk:
+            self.is_eof = True
+            return False
+        self.buffer = remaining + chunk
+        self.buffer_offset += self.pos
+        self.pos = 0
+        return True
+
+    def tell(self):
+        """Return the offset in characters of the text not yet read.
+
+        The offset is relative to where the stream was when the reader
+        was created.  If the stream is a binary file decoded as latin-1,
+        this is a byte offset.
+        """
+        return self.buffer_offset + self.pos
+
+    def _peek(self):
+        """Skip whitespace, and return the next character or "" at the end."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read_more():
+                return ""
+
+    def _expect(self, chars):
+        """Consume and return the next character, which must be in chars."""
+        char = self._peek()
+        if not char or char not in chars:
+            raise JsonDeserializeError("expected one of %r at: %r" %
+                                       (chars, self.buffer[self.pos:self.pos + 20]))
+        self.pos += 1
+        return char
+
+    def _decode(self):
+        while True:
+            self._peek()
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError as exc:
+                if self.is_eof or not self._read_more():
+                    raise JsonDeserializeError(str(exc))
+                continue
+            # A number at the end of the buffer might continue in the next
+            # chunk, e.g. if the buffer ends with "1." or "1e".
+            if (not self.is_eof and _NUMBER_TAIL.fullmatch(self.buffer, end) and
+                    self._read_more()):
+                continue
+            self.pos = end
+            return value
+
+    def iter_object(self):
+        """Step into an object, and yield its keys.
+
+        The caller should consume each key's value before continuing.
+        """
+        self._expect("{")
+        if self._peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self._decode()
+            if not isinstance(key, str):
+                raise JsonDeserializeError("expected an object key: %r" % (key, ))
+            self._expect(":")
+            yield key
+            if self._expect(",}") == "}":
+                return
+
+    def iter_array(self):
+        """Step into an array, and yield once per item.
+
+        The caller should consume each item before continuing.
+        """
+        self._expect("[")
+        if self._peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self._expect(",]") == "]":
+                return
+
+    def iter_array_values(self, hooks=None):
+        """Step into an array, and yield its items as JSON objects."""
+        for _ in self.iter_array():
+            yield self.read_value(hooks=hooks)
+
+    def read_value(self, hooks=None):
+        """Decode and return the next value as a JSON object.
+
+        Arguments:
+          hooks: a dict mapping key paths (tuples of object keys) to
+            functions.  The array at each key path is not decoded
+            all at once.  Rather, the function is called with an
+            iterator over the array's items, and its return value is
+            used instead of the array.  For example, the key path
+            ("input", "ballots") refers to value["input"]["ballots"].
+        """
+        if not hooks or self._peek() != "{":
+            return self._decode()
+        jsdict = {}
+        for key in self.iter_object():
+            sub_hooks = {path[1:]: func for path, func in hooks.items() if path[0] == key}
+            func = sub_hooks.pop((), None)
+            if func is None:
+                jsdict[key] = self.read_value(hooks=sub_hooks)
+                continue
+            items = self.iter_array_values()
+            jsdict[key] = func(items)
+            # Consume any items the function did not.
+            deque(items, maxlen=0)
+        return jsdict
+
+
 class JsonPathInfo(PathInfo):
 
     def __init__(self, path):
@@ -152,11 +477,11 @@ class JsonDeserializeError(Exception):
     pass
 
 
-class Attribute(object):
+class Attribute(ReprMixin):
 
     """Represents a serializable attribute of a jsonable class."""
 
-    def __init__(self, name, cls=None, keyword=None, model=True):
+    def __init__(self, name, cls=None, keyword=None, model=True, lazy=False):
         """
         Arguments:
           name: the attribute name.
@@ -171,14 +496,27 @@ class Attribute(object):
             be excluded from the dict of keyword arguments.
           model: whether the attribute is also an attribute of the
             model object corresponding to the jsonable class.
+          lazy: whether to defer deserializing the attribute value until
+            the attribute is first accessed.  Until then, the JSON
+            object is kept as is, and serializing the jsonable writes
+            it back out unchanged.
         """
         if keyword is None:
             keyword = name
         self.cls = cls
         self.keyword = keyword
+        self.lazy = lazy
         self.model = model
         self.name = name
 
+    def repr_info(self):
+        return "name=%r" % (self.name, )
+
+    @property
+    def storage_name(self):
+        """The name of the instance attribute that stores the value."""
+        return "_%s_value" % self.name if self.lazy else self.name
+
     def model_value(self, model_obj):
         """Return the attribute value as a jsonable object.
 
@@ -187,6 +525,115 @@ class Attribute(object):
         """
         return from_model(getattr(model_obj, self.name), self.cls)
 
+class _RawJsobj(object):
+
+    """Holds the JSON object of a lazy attribute that was not yet deserialized."""
+
+    __slots__ = ('jsobj', )
+
+    def __init__(self, jsobj):
+        self.jsobj = jsobj
+
+
+class _LazyAttribute(object):
+
+    """A descriptor for a lazy attribute of a jsonable class.
+
+    The value is stored under Attribute.storage_name, either as a
+    _RawJsobj or as the deserialized value.
+    """
+
+    def __init__(self, attr):
+        self.cls = attr.cls
+        self.storage_name = attr.storage_name
+
+    def __get__(self, jsonable, owner=None):
+        if jsonable is None:
+            return self
+        value = getattr(jsonable, self.storage_name)
+        if value.__class__ is _RawJsobj:
+            value = from_jsobj(value.jsobj, cls=self.cls)
+            setattr(jsonable, self.storage_name, value)
+        return value
+
+    def __set__(self, jsonable, value):
+        setattr(jsonable, self.storage_name, value)
+
+
+def attr_slots(*attr_seqs):
+    """Return a __slots__ value for a jsonable class with the given attributes.
+
+    For example--
+
+        class JsonCaseFoo(JsonableMixin):
+
+            meta_attrs = (Attribute('id'), )
+            data_attrs = (Attribute('foo'), )
+
+            __slots__ = attr_slots(meta_attrs, data_attrs)
+    """
+    return tuple(attr.storage_name for attrs in attr_seqs for attr in attrs)
+
+
+def _make_to_jsdict(attrs):
+    """Return a function that writes attribute values to a JSON object dict.
+
+    The function has signature func(jsonable, jsdict).  Attribute values
+    of None are not written.
+    """
+    try:
+        fields = tuple((attr.name, attr.storage_name) for attr in attrs)
+    except AttributeError:
+        # Make troubleshooting easier by providing the attrs.
+        raise JsonableError("error processing attributes: %r" % (attrs, ))
+
+    def to_jsdict(jsonable, jsdict):
+        for name, storage_name in fields:
+            # TODO: handle and test None/JS_NULL.
+            # Lazy attributes are read without deserializing them.
+            try:
+                value = getattr(jsonable, storage_name)
+            except TypeError:
+                # Make troubleshooting easier by providing the name.
+                raise JsonableError("error getting attribute: %r" % name)
+            if value is None:
+                # Don't write None values into the JSON object.
+                continue
+            value_cls = value.__class__
+            if value_cls in _SCALAR_TYPES:
+                jsdict[name] = value
+            elif value_cls is _RawJsobj:
+                jsdict[name] = value.jsobj
+            else:
+                jsdict[name] = to_jsobj(value)
+
+    return to_jsdict
+
+
+def _make_from_jsdict(attrs):
+    """Return a function that sets attribute values from a JSON object dict.
+
+    The function has signature func(jsonable, jsdict).  Attributes missing
+    from the dict are set to None.
+    """
+    fields = tuple((attr.name, attr.storage_name, attr.cls, attr.lazy) for attr in attrs)
+
+    def from_jsdict(jsonable, jsdict):
+        for name, storage_name, cls, lazy in fields:
+            try:
+                jsobj = jsdict[name]
+            except KeyError:
+                obj = None
+            else:
+                if lazy and jsobj.__class__ in (dict, list):
+                    setattr(jsonable, storage_name, _RawJsobj(jsobj))
+                    continue
+                obj = from_jsobj(jsobj, cls=cls)
+            setattr(jsonable, name, obj)
+
+    return from_jsdict
+
+
 class JsonableMixin(ReprMixin):
 
     """A class that can be serialized to and from JSON.
@@ -205,14 +652,48 @@ class JsonableMixin(ReprMixin):
       4) jsonable_cls.from_jsobj(jsobj): convert a JSON object to a Jsonable.
     """
 
+    __slots__ = ()
+
     meta_attrs = ()
+    data_attrs = ()
+
+    def __init_subclass__(cls, **kwargs):
+        """Compute the attribute maps of a jsonable class.
+
+        The maps are computed once when the class is created rather
+        than each time an instance is created or serialized.
+        """
+        super().__init_subclass__(**kwargs)
+        attrs = tuple(cls.meta_attrs) + tuple(cls.data_attrs)
+        cls._attrs = attrs
+        cls._attr_names = frozenset(attr.name for attr in attrs) | {'_meta'}
+        for attr in attrs:
+            if attr.lazy:
+                setattr(cls, attr.name, _LazyAttribute(attr))
+        cls._keywords_to_attrs = {attr.keyword: attr for attr in attrs}
+        cls._init_items = tuple((attr.keyword, attr.name) for attr in attrs)
+        cls._jsdict_funcs = {}
+        cls._meta_to_jsdict, cls._meta_from_jsdict = cls._get_jsdict_funcs(cls.meta_attrs)
+        cls._data_to_jsdict, cls._data_from_jsdict = cls._get_jsdict_funcs(cls.data_attrs)
+
+    @classmethod
+    def _get_jsdict_funcs(cls, attrs):
+        """Return the (to_jsdict, from_jsdict) functions for the given attributes.
+
+        The functions are cached on the class, keyed by the attributes.
+        """
+        attrs = tuple(attrs)
+        try:
+            return cls._jsdict_funcs[attrs]
+        except KeyError:
+            pass
+        funcs = _make_to_jsdict(attrs), _make_from_jsdict(attrs)
+        cls._jsdict_funcs[attrs] = funcs
+        return funcs
 
-    # TODO: see if there is a reasonable way to compute this (and the related
-    #   class methods below) when the interpreter is first processing the
-    #   class definition.
     @classmethod
     def attrs(cls):
-        return list(cls.meta_attrs) + list(cls.data_attrs)
+        return cls._attrs
 
     @classmethod
     def model_attrs(cls):
@@ -221,14 +702,13 @@ class JsonableMixin(ReprMixin):
     @classmethod
     def keywords_to_attrs(cls):
         """Return a map from keyword to Attribute for this class."""
-        return {attr.keyword: attr for attr in cls.attrs()}
+        return cls._keywords_to_attrs.copy()
 
     @classmethod
     def keywords_to_init_defaults(cls):
         """Return a map from keyword to default __init__() value."""
-        mapping = cls.keywords_to_attrs()
         # For now, all keyword defaults are None.
-        return dict.fromkeys(mapping.keys())
+        return dict.fromkeys(cls._keywords_to_attrs)
 
     # TODO: review the calls to this method and mark TODO's where it needs replacement.
     @classmethod
@@ -237,21 +717,16 @@ class JsonableMixin(ReprMixin):
         return {attr.keyword: attr.model_value(model_obj) for attr in cls.model_attrs()}
 
     def __init__(self, **kwargs):
-        defaults = self.keywords_to_init_defaults()
-        # Make a copy in case defaults is a reference to a global object.
-        values = defaults.copy()
-        values.update(kwargs)
-        if len(values) != len(defaults):
+        attrs = self._keywords_to_attrs
+        if not kwargs.keys() <= attrs.keys():
             # Then there is at least one invalid keyword.
-            valid = sorted(defaults.keys())
-            invalid = sorted(set(values.keys()) - set(valid))
+            valid = sorted(attrs.keys())
+            invalid = sorted(kwargs.keys() - attrs.keys())
             raise TypeError("invalid keyword argument(s): {0} (valid are: {1})".
                             format(", ".join(repr(k) for k in invalid),
                                    ", ".join(valid)))
-        attrs = self.keywords_to_attrs()
-        for keyword, value in values.items():
-            attr = attrs[keyword]
-            setattr(self, attr.name, value)
+        for keyword, name in self._init_items:
+            setattr(self, name, kwargs.get(keyword))
 
     def repr_info(self):
         """Return additional info for __repr__()."""
@@ -308,58 +783,59 @@ class JsonableMixin(ReprMixin):
           attrs: iterable of attribute names.
           jsdict: a JSON object that is a mapping object.
         """
-        for attr in attrs:
-            name, cls = attr.name, attr.cls
-            try:
-                jsobj = jsdict[name]
-            except KeyError:
-                obj = None
-            else:
-                obj = from_jsobj(jsobj, cls=cls)
-            setattr(self, name, obj)
+        to_jsdict, from_jsdict = self._get_jsdict_funcs(attrs)
+        from_jsdict(self, jsdict)
 
     def _attrs_to_jsdict(self, attrs, jsdict):
         """Write attribute values to a JSON object dict."""
-        for attr in attrs:
-            try:
-                name, cls = attr.name, attr.cls
-            except AttributeError:
-                # Make troubleshooting easier by providing the attr.
-                raise JsonableError("error processing attribute: %r" % attr)
-            # TODO: handle and test None/JS_NULL.
-            try:
-                value = getattr(self, name)
-            except TypeError:
-                # Make troubleshooting easier by providing the name.
-                raise JsonableError("error getting attribute: %r" % name)
-            if value is None:
-                # Don't write None values into the JSON object.
-                continue
-            jsobj = to_jsobj(value)
-            jsdict[name] = jsobj
+        to_jsdict, from_jsdict = self._get_jsdict_funcs(attrs)
+        to_jsdict(self, jsdict)
 
     def save_from_jsobj(self, jsobj):
         """Read data from the given JSON object and save it to attributes."""
-        keys = set()
         try:
             meta_dict = jsobj['_meta']
         except KeyError:
             # The metadata dict is optional.
-            pass
+            extra_keys = jsobj.keys() - self._attr_names
         else:
-            keys |= set(meta_dict.keys())
-            self._attrs_from_jsdict(self.meta_attrs, meta_dict)
-        keys |= set(jsobj.keys())
-        keys -= set(('_meta', ))
-        extra_keys = keys - set((attr.name for attr in self.attrs()))
+            extra_keys = (jsobj.keys() | meta_dict.keys()) - self._attr_names
+            self._meta_from_jsdict(meta_dict)
         if extra_keys:
             log.warning("JSON object has unrecognized keys: %r (%r)" % (list(extra_keys), jsobj))
-        self._attrs_from_jsdict(self.data_attrs, jsobj)
+        self._data_from_jsdict(jsobj)
+
+    def iter_jsdict_items(self):
+        """Yield the (key, value) pairs of the object's JSON object.
+
+        Unlike with to_jsobj(), the values of the data attributes are not
+        converted to JSON objects.  See iter_json().
+        """
+        meta = self.get_meta_dict()
+        if meta:
+            yield '_meta', meta
+        for attr in self.data_attrs:
+            value = getattr(self, attr.storage_name)
+            if value is None:
+                continue
+            if value.__class__ is _RawJsobj:
+                value = value.jsobj
+            yield attr.name, value
+
+    def is_loaded(self, name):
+        """Return whether the value of an attribute has been deserialized.
+
+        This is False only for lazy attributes not yet accessed.
+        """
+        for attr in self._attrs:
+            if attr.name == name:
+                return getattr(self, attr.storage_name).__class__ is not _RawJsobj
+        raise AttributeError("no attribute named: %r" % name)
 
     def get_meta_dict(self):
         """Return a dict containing the object metadata."""
         meta = {}
-        self._attrs_to_jsdict(self.meta_attrs, meta)
+        self._meta_to_jsdict(meta)
         return meta
 
     @classmethod
@@ -389,7 +865,7 @@ class JsonableMixin(ReprMixin):
         meta = self.get_meta_dict()
         if meta:
             jsobj['_meta'] = meta
-        self._attrs_to_jsdict(self.data_attrs, jsobj)
+        self._data_to_jsdict(jsobj)
         return jsobj
 
     # This method should be thought of like __repr__() in that it is a
@@ -28,10 +28,18 @@ Ballot Model
 For now, the "Ballot" object is not represented by a class.  It is
 simply a `(weight, choices)` 2-tuple, where `weight` is a number and
 choices is a tuple of integer choice ID's.
+
+For large contests, CompactBallotsResource stores ballots in flat arrays
+of machine integers rather than as one tuple object per ballot.
 """
 
-from contextlib import contextmanager
+from array import array
+import collections
+from contextlib import contextmanager, ExitStack
+import heapq
+from itertools import groupby, repeat
 import logging
+from operator import add, itemgetter, sub
 import tempfile
 
 # The current module should not depend on any modules in openrcv.formats.
@@ -41,12 +49,79 @@ from openrcv.utils import ReprMixin
 
 log = logging.getLogger(__name__)
 
+# The default maximum number of distinct ballots that
+# external_normalize_ballots_to() tallies in memory at a time.
+MAX_TALLY_SIZE = 1000000
+# The number of ballots to write at a time when merging sorted runs.
+MERGE_BATCH_SIZE = 10000
+
+# Summary statistics for a collection of ballots.  The ballot count is the
+# number of ballot items (i.e. without taking weights into account).
+BallotStats = collections.namedtuple('BallotStats',
+                                     ('ballot_count', 'total_weight', 'undervote_weight'))
+
 
 def make_candidate_numbers(candidate_count):
     """Return an iterable of candidate numbers."""
     return range(1, candidate_count + 1)
 
 
+def get_ballot_stats(source):
+    """Return a BallotStats object for a ballots resource."""
+    ballot_count = total_weight = undervote_weight = 0
+    with source.reading() as ballots:
+        for weight, choices in ballots:
+            ballot_count += 1
+            total_weight += weight
+            if not choices:
+                undervote_weight += weight
+    return BallotStats(ballot_count, total_weight, undervote_weight)
+
+
+def merge_ballot_stats(stats_seq):
+    """Return the sum of an iterable of BallotStats objects."""
+    totals = [sum(values) for values in zip(*stats_seq)] or [0] * len(BallotStats._fields)
+    return BallotStats(*totals)
+
+
+def tally_choices(source, choices_dict=None):
+    """Return a dict mapping each tuple of choices to its cumulative weight.
+
+    Arguments:
+      source: source ballots resource.
+      choices_dict: a dict to add the weights to.  Defaults to a new dict.
+    """
+    if choices_dict is None:
+        choices_dict = {}
+    with source.reading() as ballots:
+        for weight, choices in ballots:
+            try:
+                choices_dict[choices] += weight
+            except KeyError:
+                # Then we are adding the choices for the first time.
+                choices_dict[choices] = weight
+    return choices_dict
+
+
+def merge_choice_tallies(choices_dicts):
+    """Combine dicts returned by tally_choices() into a single dict."""
+    merged = {}
+    for choices_dict in choices_dicts:
+        for choices, weight in choices_dict.items():
+            try:
+                merged[choices] += weight
+            except KeyError:
+                merged[choices] = weight
+    return merged
+
+
+def write_normalized_ballots(choices_dict, target):
+    """Write the ballots from a tally_choices() dict in normalized order."""
+    sorted_choices = sorted(choices_dict.keys())
+    with target.writing_batches() as gen:
+        gen.send([(choices_dict[choices], choices) for choices in sorted_choices])
+
+
 # TODO: allow ordering and compressing to be done separately.
 def normalize_ballots_to(source, target):
     """Normalize ballots by ordering and "compressing" them.
@@ -67,22 +142,62 @@ def normalize_ballots_to(source, target):
     lexicographically for readability by the list of choices on the ballot.
     """
     # A dict mapping tuples of choices to the cumulative weight.
-    choices_dict = {}
+    choices_dict = tally_choices(source)
+    write_normalized_ballots(choices_dict, target)
 
-    with source.reading() as ballots:
-        for weight, choices in ballots:
-            try:
-                choices_dict[choices] += weight
-            except KeyError:
-                # Then we are adding the choices for the first time.
-                choices_dict[choices] = weight
-    sorted_choices = sorted(choices_dict.keys())
 
-    with target.writing() as gen:
-        for choices in sorted_choices:
-            weight = choices_dict[choices]
-            ballot = weight, choices
-            gen.send(ballot)
+def external_normalize_ballots_to(source, target, make_temp, max_tally_size=None):
+    """Normalize ballots using sorted runs in temporary resources.
+
+    This function has the same result as normalize_ballots_to(), but
+    holds at most `max_tally_size` distinct ballots in memory at a time.
+    Whenever the tally reaches that size, it is written in normalized
+    order to a temporary ballots resource (a "run"), and the runs are
+    merged at the end.  If the ballots fit in a single tally, no
+    temporary resources are used.
+
+    Arguments:
+      source: source ballots resource.
+      target: target ballots resource.
+      make_temp: a function that returns a context manager yielding a
+        new temporary ballots resource, e.g. one backed by a file.
+      max_tally_size: defaults to MAX_TALLY_SIZE.
+    """
+    if max_tally_size is None:
+        max_tally_size = MAX_TALLY_SIZE
+    with ExitStack() as stack:
+        runs = []
+        choices_dict = {}
+        with source.reading() as ballots:
+            for weight, choices in ballots:
+                try:
+                    choices_dict[choices] += weight
+                    continue
+                except KeyError:
+                    choices_dict[choices] = weight
+                if len(choices_dict) >= max_tally_size:
+                    run = stack.enter_context(make_temp())
+                    write_normalized_ballots(choices_dict, run)
+                    runs.append(run)
+                    choices_dict = {}
+        if not runs:
+            write_normalized_ballots(choices_dict, target)
+            return
+        log.info("merging %d sorted runs of ballots" % (len(runs) + 1, ))
+        # The last tally is merged directly from memory.
+        readers = [stack.enter_context(run.reading()) for run in runs]
+        readers.append([(choices_dict[choices], choices) for
+                         choices in sorted(choices_dict.keys())])
+        merged = heapq.merge(*readers, key=itemgetter(1))
+        with target.writing_batches() as gen:
+            batch = []
+            for choices, group in groupby(merged, key=itemgetter(1)):
+                batch.append((sum(weight for weight, _ in group), choices))
+                if len(batch) >= MERGE_BATCH_SIZE:
+                    gen.send(batch)
+                    batch = []
+            if batch:
+                gen.send(batch)
 
 
 def normalize_ballots(ballots_resource):
@@ -98,17 +213,155 @@ def normalize_ballots(ballots_resource):
 class BallotsResourceMixin(object):
 
     def count_ballots(self):
-        with self.resource.reading() as gen:
+        with self.reading() as gen:
             return sum(weight for weight, choices in gen)
 
     def normalize(self):
         normalize_ballots(self)
 
+    def stats(self):
+        """Return a BallotStats object."""
+        return get_ballot_stats(self)
+
 
 class BallotsResource(streams.WrapperResource, BallotsResourceMixin):
     pass
 
 
+class CompactBallotsResource(streams.StreamResourceMixin, BallotsResourceMixin):
+
+    """An in-memory ballots resource backed by flat integer arrays.
+
+    The ballots are stored using three arrays: the weight of each ballot,
+    the choices of all ballots concatenated together, and the offsets
+    into the choices array at which each ballot's choices end.  Compared
+    with a list of (weight, choices) tuples, this uses a small fraction
+    of the memory and lets ballots be added in bulk.
+    """
+
+    # The array typecodes for weights and choices (signed 64-bit).
+    typecode = 'q'
+
+    def __init__(self):
+        self.delete()
+
+    def repr_info(self):
+        return "ballots=%d" % len(self)
+
+    def __len__(self):
+        return len(self.weights)
+
+    def copy(self):
+        """Return a new, empty resource."""
+        return self.create()
+
+    def move(self, dest):
+        """Move the arrays to another resource without copying them."""
+        dest.weights, dest.choices, dest.ends = self.weights, self.choices, self.ends
+        self.delete()
+
+    def delete(self):
+        self.weights = array(self.typecode)
+        self.choices = array(self.typecode)
+        self.ends = array(self.typecode)
+
+    @contextmanager
+    def replacement(self):
+        """See StreamResourceMixin.replacement()."""
+        temp_resource = self.copy()
+        yield temp_resource
+        temp_resource.move(dest=self)
+
+    def append_ballot(self, weight, choices):
+        self.weights.append(weight)
+        self.choices.extend(choices)
+        self.ends.append(len(self.choices))
+
+    def extend_ballots(self, weights, choices, ends):
+        """Add ballots in bulk.
+
+        Arguments:
+          weights: an iterable of ballot weights.
+          choices: an iterable of the choices of the ballots, concatenated.
+          ends: an iterable of the offsets into `choices` at which each
+            ballot's choices end.
+        """
+        offset = len(self.choices)
+        self.weights.extend(weights)
+        self.choices.extend(choices)
+        if offset:
+            ends = map(add, ends, repeat(offset))
+        self.ends.extend(ends)
+
+    def iter_batches(self, batch_size):
+        """Yield (weights, choices, ends) arrays for batches of ballots.
+
+        The values of each `ends` array are relative to the batch's
+        `choices` array, as in extend_ballots().
+        """
+        weights, choices, ends = self.weights, self.choices, self.ends
+        for start in range(0, len(weights), batch_size):
+            stop = min(start + batch_size, len(weights))
+            offset = ends[start - 1] if start else 0
+            batch_ends = ends[start:stop]
+            if offset:
+                batch_ends = array(self.typecode, map(sub, batch_ends, repeat(offset)))
+            yield weights[start:stop], choices[offset:ends[stop - 1]], batch_ends
+
+    def _iter_ballots(self):
+        choices = self.choices
+        start = 0
+        for weight, end in zip(self.weights, self.ends):
+            yield weight, tuple(choices[start:end])
+            start = end
+
+    @contextmanager
+    def reading(self):
+        gen = streams.tracked(self, self._iter_ballots())
+        try:
+            yield gen
+        except Exception as exc:
+            gen.throw(exc)
+        finally:
+            gen.close()
+
+    @utils.coroutine
+    def _sink(self):
+        while True:
+            weight, choices = yield
+            self.append_ballot(weight, choices)
+
+    @utils.coroutine
+    def _batch_sink(self):
+        while True:
+            for weight, choices in (yield):
+                self.append_ballot(weight, choices)
+
+    @contextmanager
+    def writing(self):
+        self.delete()
+        gen = self._sink()
+        try:
+            yield gen
+        finally:
+            gen.close()
+
+    @contextmanager
+    def writing_batches(self):
+        self.delete()
+        gen = self._batch_sink()
+        try:
+            yield gen
+        finally:
+            gen.close()
+
+    def count(self):
+        return len(self)
+
+    def count_ballots(self):
+        return sum(self.weights)
+
+
 class CandidatesInfo(object):
 
     """Represents the collection of candidates."""
@@ -20,16 +20,112 @@
 # DEALINGS IN THE SOFTWARE.
 #
 
+import collections
+from collections import deque
+import concurrent.futures
+from contextlib import closing, ExitStack
+import io
+from itertools import chain, compress, count, repeat
 import logging
+from operator import add, not_, sub
 import os
+import re
 
-from openrcv.formats.internal import to_internal_ballot
-from openrcv.models import ContestInput
+from openrcv.models import CompactBallotsResource, ContestInput
 from openrcv import utils
 from openrcv.utils import parse_integer_line, time_it, FILE_ENCODING
 
 log = logging.getLogger(__name__)
 
+# The number of characters BulkBLTParser reads at a time.
+BLT_BLOCK_SIZE = 1 << 20
+# The maximum number of bytes ParallelBLTParser parses in a single task.
+BLT_CHUNK_SIZE = 64 << 20
+# The number of chunks per process ParallelBLTParser submits ahead of the
+# chunk whose ballots it is adding.
+PENDING_CHUNKS_PER_CPU = 2
+
+# Matches the line ending the ballots section of a BLT file, i.e. the
+# first line whose first value is zero.  Like str.split(), these treat
+# any whitespace other than "\n" (e.g. "\f" or "\x85") as a separator,
+# and like int(), they allow underscores between digits.
+_BLT_BALLOTS_END = re.compile(r'^[^\S\n]*[-+]?0+(?:_0+)*(?=\s|$)', re.MULTILINE)
+# Matches ballot lines whose last value is zero.
+_BLT_ZERO_ENDED_LINE = re.compile(r'(?:^|[^\S\n])[-+]?0+(?:_0+)*[^\S\n]*$', re.MULTILINE)
+
+
+def count_lines(text):
+    """Return the number of lines in a string."""
+    line_count = text.count("\n")
+    if text and not text.endswith("\n"):
+        line_count += 1
+    return line_count
+
+
+def iter_text_lines(text):
+    """Return an iterator over the lines of a string.
+
+    Unlike str.splitlines(), this splits only at "\\n", which matches
+    iterating over a text file (whose other line endings have already
+    been translated) and the regular expressions in this module.
+    """
+    return iter(io.StringIO(text, newline="\n"))
+
+
+def is_withdrawn_line(line):
+    """Return whether the second line of a BLT file lists withdrawn candidates.
+
+    The line of withdrawn candidates (as negative numbers) is optional.
+    If it is absent, the second line is the first ballot line (or the
+    line ending the ballots section), whose first value is not negative.
+    A blank line is treated as a line with no withdrawn candidates.
+    The line can be bytes or str.
+    """
+    values = line.split(None, 1)
+    return not values or int(values[0]) < 0
+
+
+def split_zero_ended_ints(ints):
+    """Split a list of zero-terminated ballots into (weights, choices, ends).
+
+    The list should have the form [WEIGHT1, CHOICE, ..., 0, WEIGHT2, ...,
+    0, ...], where the weights and choices are nonzero.  The list is
+    modified.  The return value is as in
+    CompactBallotsResource.extend_ballots(), except that choices and
+    ends are iterators.
+    """
+    # Each zero ends a ballot and is followed by the next weight.  The
+    # operations below avoid looping over ballots in Python.
+    zero_indices = list(compress(count(), map(not_, ints)))
+    ballot_count = len(zero_indices)
+    weight_indices = list(chain((0, ), map(add, zero_indices[:-1], repeat(1))))
+    weights = list(map(ints.__getitem__, weight_indices))
+    # The i-th ballot's choices end after i + 1 weights and i zeros.
+    ends = map(sub, zero_indices, range(1, 2 * ballot_count, 2))
+    # Zero out the weights so that only the choices are nonzero.
+    deque(map(ints.__setitem__, weight_indices, repeat(0)), maxlen=0)
+    choices = filter(None, ints)
+    return weights, choices, ends
+
+
+def get_line_chunk_ranges(f, start, end, chunk_size):
+    """Return (start, end) byte ranges that split a binary file at line boundaries.
+
+    Arguments:
+      f: a binary file object.
+      start: the byte offset of the start of a line.
+      end: the byte offset at which to stop.
+      chunk_size: the approximate number of bytes per range.
+    """
+    ranges = []
+    while start < end:
+        f.seek(min(start + chunk_size, end))
+        f.readline()
+        chunk_end = min(f.tell(), end)
+        ranges.append((start, chunk_end))
+        start = chunk_end
+    return ranges
+
 
 # TODO: add the line number, etc. as attributes.
 class ParsingError(Exception):
@@ -45,18 +141,21 @@ class Parser(object):
     # TODO: consider moving this into StreamInfo by creating a method
     # to return an iterator object over lines -- perhaps by implementing
     # the iterator protocol.
-    def iter_lines(self, f):
+    def iter_lines(self, f, start=1):
         """
         Return an iterator over the lines of an input file.
 
         Each iteration sets self.line and self.line_no.
 
+        Arguments:
+          start: the line number of the first line.
+
         """
-        for line_no, line in enumerate(iter(f), start=1):
+        for line_no, line in enumerate(iter(f), start=start):
             self.line = line
             self.line_no = line_no
             yield line
-        log.info("parsed: %d lines" % line_no)
+        log.info("parsed: %d lines" % self.line_no)
 
     def get_parse_return_value(self):
         return None
@@ -64,6 +163,11 @@ class Parser(object):
     def parse_lines(self, lines):
         raise NotImplementedError()
 
+    def parse_stream(self, f):
+        """Parse an open file-like object."""
+        lines = self.iter_lines(f)
+        self.parse_lines(lines)
+
     def parse_file(self, f):
         """
         Arguments:
@@ -71,9 +175,10 @@ class Parser(object):
 
         """
         with time_it("parser: %s" % (self.name, )):
-            lines = self.iter_lines(f)
+            self.line_no = 0
+            self.line = None
             try:
-                self.parse_lines(lines)
+                self.parse_stream(f)
             except:
                 raise ParsingError("error while parsing line %d: %r" %
                                    (self.line_no, self.line))
@@ -93,19 +198,18 @@ class BLTParser(Parser):
 
     name = "BLT (ballot)"
 
-    def __init__(self, output_info=None):
+    def __init__(self, ballots_resource=None):
         """
         Arguments:
-          output_info: a StreamInfo object to which to write an internal
-            ballot file.
+          ballots_resource: a ballots resource to which to write the
+            ballots.  The resource becomes the ballots_resource attribute
+            of the returned ContestInput object.  Defaults to a new
+            CompactBallotsResource object.
 
         """
-        if output_info is None:
-            output_info = utils.PathInfo(os.devnull)
-        # We check the argument here to fail fast and help the user locate
-        # the source of the issue more quickly.
-        assert isinstance(output_info, utils.StreamInfo)
-        self.output_info = output_info
+        if ballots_resource is None:
+            ballots_resource = CompactBallotsResource()
+        self.ballots_resource = ballots_resource
 
     def get_parse_return_value(self):
         """Return a ContestInput object."""
@@ -117,42 +221,67 @@ class BLTParser(Parser):
     def parse_next_line_ints(self, lines):
         return parse_integer_line(next(lines))
 
-    def _parse_ballot_lines(self, lines, f=None):
+    def parse_ballot_line(self, line):
+        """Return a ballot, or None if the line ends the ballots section."""
+        ints = tuple(parse_integer_line(line))
+        weight = ints[0]
+        if weight == 0:
+            return None
+        return weight, tuple(ints[1:-1])
+
+    def _parse_ballot_lines(self, lines, add_ballot):
+        """
+        Arguments:
+          add_ballot: a function that accepts a ballot.
+
+        """
         ballot_count = 0
         for line in lines:
-            ints = tuple(parse_integer_line(line))
-            weight = ints[0]
-            if weight == 0:
+            ballot = self.parse_ballot_line(line)
+            if ballot is None:
                 break
-            ballot = weight, tuple(ints[1:-1])
             ballot_count += 1
-            new_line = to_internal_ballot(ballot)
-            f.write(new_line + "\n")
+            add_ballot(ballot)
         return ballot_count
 
     def parse_ballot_lines(self, lines):
-        with self.output_info.open("w") as f:
-            ballot_count = self._parse_ballot_lines(lines, f)
+        with self.ballots_resource.writing() as gen:
+            ballot_count = self._parse_ballot_lines(lines, gen.send)
         return ballot_count
 
-    def parse_lines(self, lines):
-        info = ContestInput()
+    def parse_header(self, lines):
+        """Parse the header, and return (candidate_count, line).
+
+        The header is the first line and the optional line of withdrawn
+        candidates.  If the second line is not a line of withdrawn
+        candidates, it is returned as `line` so that the caller can parse
+        it as a ballot line.  Otherwise, `line` is None.
+        """
+        info = ContestInput(ballots_resource=self.ballots_resource)
         self.info = info
 
         # First line.
         candidate_count, seat_count = self.parse_next_line_ints(lines)
         info.seat_count = seat_count
+        info.withdrawn = []
 
         # Withdrawn candidates.
-        withdraw_numbers = self.parse_next_line_ints(lines)
+        line = next(lines, None)
+        if line is None:
+            return candidate_count, None
+        if not is_withdrawn_line(line):
+            return candidate_count, line
         withdrawn = []
-        for number in withdraw_numbers:
+        for number in parse_integer_line(line):
             assert number < 0
             withdrawn.append(-1 * number)
         info.withdrawn = withdrawn
 
-        ballot_count = self.parse_ballot_lines(lines)
-        info.ballot_count = ballot_count
+        return candidate_count, None
+
+    def parse_footer(self, lines, candidate_count):
+        """Parse the lines after the ballots section."""
+        info = self.info
 
         # Read candidate list.
         candidates = []
@@ -167,3 +296,284 @@ class BLTParser(Parser):
         for line in lines:
             if line.strip():
                 raise ValueError("the BLT has non-empty lines at the end")
+
+    def parse_lines(self, lines):
+        candidate_count, line = self.parse_header(lines)
+        if line is not None:
+            lines = chain((line, ), lines)
+        self.info.ballot_count = self.parse_ballot_lines(lines)
+        self.parse_footer(lines, candidate_count)
+
+
+class BulkBLTParser(BLTParser):
+
+    """A BLT parser that parses the ballots section in large blocks.
+
+    Rather than parsing each ballot line individually, this parser reads
+    the ballots section in blocks of characters, converts all of the
+    integers in a block with a single split(), and adds the ballots to a
+    CompactBallotsResource in bulk.
+
+    If a block is not well-formed (e.g. it contains a blank line or a
+    line not ending in zero), the block is parsed line by line instead.
+    Thus, errors are reported with the same line information, and the
+    resulting ballots are the same, as with BLTParser.
+    """
+
+    name = "BLT (ballot, bulk)"
+
+    def __init__(self, ballots_resource=None, block_size=None):
+        """
+        Arguments:
+          ballots_resource: a CompactBallotsResource object to which to
+            add the ballots.  Defaults to a new one.
+          block_size: the number of characters to read at a time.
+
+        """
+        super().__init__(ballots_resource=ballots_resource)
+        if block_size is None:
+            block_size = BLT_BLOCK_SIZE
+        self.block_size = block_size
+
+    def _add_ballot(self, ballot):
+        self.ballots_resource.append_ballot(*ballot)
+
+    def parse_ballot_block(self, text, line_no):
+        """Parse a block of complete ballot lines, and return the ballot count.
+
+        Arguments:
+          text: the block of lines.
+          line_no: the line number of the first line in the block.
+
+        """
+        line_count = count_lines(text)
+        try:
+            ints = list(map(int, text.split()))
+        except ValueError:
+            ints = None
+        is_valid = ints is not None and ints.count(0) == line_count
+        if is_valid:
+            # Check the common formatting first since it is much faster.
+            zero_ended_count = text.count(" 0\n") + text.endswith(" 0")
+            if zero_ended_count != line_count:
+                zero_ended_count = len(_BLT_ZERO_ENDED_LINE.findall(text))
+            is_valid = zero_ended_count == line_count
+        if not is_valid:
+            lines = self.iter_lines(iter_text_lines(text), start=line_no)
+            return self._parse_ballot_lines(lines, self._add_ballot)
+
+        # Each line has exactly one zero and it is the last value.
+        weights, choices, ends = split_zero_ended_ints(ints)
+        self.ballots_resource.extend_ballots(weights, choices, ends)
+        return len(weights)
+
+    def parse_ballots_section(self, f, pending=""):
+        """Parse ballot lines up to the line ending the ballots section.
+
+        Returns (ballot_count, rest), where rest is the text read starting
+        with the line ending the ballots section, or None if the stream
+        ended first.  The stream may have more text after `rest`.
+
+        Arguments:
+          f: a text stream positioned at the start of a ballot line.
+            Lines are numbered starting after self.line_no.
+          pending: text already read to parse before the stream, which
+            should start at the start of a ballot line.
+
+        """
+        line_no = self.line_no
+        ballot_count = 0
+        while True:
+            block = f.read(self.block_size)
+            text = pending + block
+            if block:
+                # Only parse complete lines.
+                cut = text.rfind("\n") + 1
+                text, pending = text[:cut], text[cut:]
+            match = _BLT_BALLOTS_END.search(text)
+            ballots_text = text[:match.start()] if match else text
+            if ballots_text:
+                ballot_count += self.parse_ballot_block(ballots_text, line_no + 1)
+                line_no += count_lines(ballots_text)
+                self.line_no = line_no
+                self.line = ballots_text[ballots_text.rfind("\n", 0, -1) + 1:]
+            if match:
+                return ballot_count, text[match.start():] + pending
+            if not block:
+                return ballot_count, None
+
+    def parse_end(self, rest, candidate_count):
+        """Parse the text starting with the line ending the ballots section."""
+        if rest is None:
+            lines = iter(())
+        else:
+            lines = self.iter_lines(iter_text_lines(rest), start=self.line_no + 1)
+            # Parse the line ending the ballots section.
+            self.parse_ballot_line(next(lines))
+        self.parse_footer(lines, candidate_count)
+
+    def start_ballots(self):
+        """Prepare the ballots resource for parsing the ballots section."""
+        self.ballots_resource.delete()
+
+    def parse_stream(self, f):
+        # Read the header with readline() so that block reads start
+        # at the beginning of the ballots section.
+        lines = self.iter_lines(iter(f.readline, ""))
+        candidate_count, line = self.parse_header(lines)
+        self.start_ballots()
+        if line is None:
+            line = ""
+        else:
+            # Then the second line is a ballot line.
+            self.line_no -= 1
+        ballot_count, rest = self.parse_ballots_section(f, pending=line)
+        self.info.ballot_count = ballot_count
+        if rest is not None:
+            rest += f.read()
+        self.parse_end(rest, candidate_count)
+
+
+# The result of parsing part of a BLT ballots section in a worker process.
+# The line number and line are relative to the chunk, and error is whether
+# parsing failed on that line.
+_BLTChunkResult = collections.namedtuple('_BLTChunkResult',
+    ('weights', 'choices', 'ends', 'line_no', 'line', 'rest', 'error'))
+
+
+def _parse_blt_chunk(args):
+    """Parse a byte range of a BLT ballots section in a worker process."""
+    path, encoding, start, end, block_size = args
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    # Use universal newlines to match the line parsing of text files.
+    stream = io.StringIO(data.decode(encoding), newline=None)
+    parser = BulkBLTParser(block_size=block_size)
+    parser.line_no = 0
+    parser.line = None
+    try:
+        ballot_count, rest = parser.parse_ballots_section(stream)
+    except Exception:
+        return _BLTChunkResult(None, None, None, parser.line_no, parser.line, None, True)
+    if rest is not None:
+        rest += stream.read()
+    ballots = parser.ballots_resource
+    return _BLTChunkResult(ballots.weights, ballots.choices, ballots.ends,
+                           parser.line_no, parser.line, rest, False)
+
+
+def _decode_line(line, encoding):
+    """Decode a line read from a binary file, like a text file would.
+
+    Like universal newlines mode, this converts CRLF line endings to LF,
+    so the lines (e.g. in error messages) match those of BLTParser.
+    """
+    text = line.decode(encoding)
+    if text.endswith("\r\n"):
+        text = text[:-2] + "\n"
+    return text
+
+
+class ParallelBLTParser(BulkBLTParser):
+
+    """A BLT parser that parses the ballots section in a process pool.
+
+    The ballots section is split into chunks at line boundaries, and
+    each chunk is parsed by BulkBLTParser in a worker process.  The
+    chunks are then added to the ballots resource in order.  Errors are
+    reported with the same line information as BLTParser.
+
+    Only streams backed by a file on disk can be split into chunks.
+    Other streams (e.g. in-memory streams) are parsed by BulkBLTParser.
+    """
+
+    name = "BLT (ballot, parallel)"
+
+    def __init__(self, ballots_resource=None, block_size=None, processes=None,
+                 chunk_size=None):
+        """
+        Arguments:
+          processes: the maximum number of worker processes.  Defaults
+            to the number of CPUs.
+          chunk_size: the approximate number of bytes per chunk.  Defaults
+            to dividing the ballots section into several chunks per
+            process, up to a maximum of BLT_CHUNK_SIZE bytes.
+
+        """
+        super().__init__(ballots_resource=ballots_resource, block_size=block_size)
+        if processes is None:
+            processes = os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.processes = processes
+
+    def get_chunk_size(self, section_size):
+        if self.chunk_size is not None:
+            return self.chunk_size
+        chunk_size = -(-section_size // (4 * self.processes))
+        return max(self.block_size, min(chunk_size, BLT_CHUNK_SIZE))
+
+    def get_chunk_ranges(self, f, start, end):
+        """Return (start, end) byte ranges that split a binary file at line boundaries."""
+        return get_line_chunk_ranges(f, start, end, self.get_chunk_size(end - start))
+
+    def _add_chunk_results(self, binary, encoding, ranges, results):
+        """Add the ballots of each chunk to the ballots resource, in order.
+
+        Returns (ballot_count, rest) as in parse_ballots_section().
+        """
+        ballots_resource = self.ballots_resource
+        ballot_count = 0
+        for (chunk_start, chunk_end), result in zip(ranges, results):
+            # Convert the chunk's line information to the file's.
+            if result.line_no:
+                self.line_no += result.line_no
+                self.line = result.line
+            if result.error:
+                raise ValueError("error parsing ballot line")
+            ballots_resource.extend_ballots(result.weights, result.choices, result.ends)
+            ballot_count += len(result.weights)
+            if result.rest is not None:
+                binary.seek(chunk_end)
+                remainder = io.StringIO(binary.read().decode(encoding), newline=None)
+                return ballot_count, result.rest + remainder.read()
+        return ballot_count, None
+
+    def parse_stream(self, f):
+        path = getattr(f, 'name', None)
+        if not isinstance(path, str) or not os.path.isfile(path):
+            return super().parse_stream(f)
+        encoding = f.encoding
+        with open(path, 'rb') as binary:
+            lines = self.iter_lines(_decode_line(line, encoding)
+                                    for line in iter(binary.readline, b""))
+            candidate_count, line = self.parse_header(lines)
+            self.start_ballots()
+            if line is not None:
+                # Then the second line is a ballot line, so start after the first.
+                binary.seek(0)
+                binary.readline()
+                self.line_no = 1
+            start = binary.tell()
+            end = os.fstat(binary.fileno()).st_size
+            ranges = self.get_chunk_ranges(binary, start, end)
+
+            args = ((path, encoding, chunk_start, chunk_end, self.block_size) for
+                    chunk_start, chunk_end in ranges)
+            processes = min(self.processes, len(ranges))
+            with ExitStack() as stack:
+                if processes <= 1:
+                    results = map(_parse_blt_chunk, args)
+                else:
+                    executor = stack.enter_context(
+                        concurrent.futures.ProcessPoolExecutor(max_workers=processes))
+                    # Submitting only a few chunks ahead bounds the memory
+                    # used by the results, and the number of chunks parsed
+                    # past the end of the ballots section.  Closing the
+                    # generator cancels the chunks not yet started.
+                    results = stack.enter_context(closing(utils.iter_executor_map(
+                        executor, _parse_blt_chunk, args,
+                        max_pending=PENDING_CHUNKS_PER_CPU * processes)))
+                ballot_count, rest = self._add_chunk_results(binary, encoding, ranges, results)
+        self.info.ballot_count = ballot_count
+        self.parse_end(rest, candidate_count)
@@ -22,49 +22,116 @@
 
 """Contains the functions for each rcv command-line command."""
 
-from contextlib import contextmanager
+from contextlib import ExitStack
 import logging
 import os
 from textwrap import dedent
 import sys
+import time
 
 import yaml
 
-from openrcv import (contestgen, counting, jcmanage, jcmodels, jsonlib, models, streams)
+from openrcv import (cache, contestgen, counting, jcmanage, jcmodels, jsonlib, models,
+                     streams)
 from openrcv.formats import internal, jscase
+from openrcv.formats.cvr import CVRParser
 from openrcv.models import ContestInput
+from openrcv.parsing import BLTParser
 from openrcv.utils import logged_open, PathInfo, StringInfo
 
 
 log = logging.getLogger(__name__)
 
 
-# TODO: is this necessary as its own function?
-@contextmanager
-def temp_ballots_resource():
-    with streams.TempFileResource.create_temp() as backing_resource:
-        ballots_resource = internal.internal_ballots_resource(backing_resource)
-        yield ballots_resource
-
-
 # TODO: finish removing references to ns in this module.
 #  This will decouple the argparse definitions from these functions.
 # TODO: unit-test this.
 def count(ns, stdout=None):
     input_path = ns.input_path
     with logged_open(input_path) as f:
-        config = yaml.load(f)
+        config = yaml.safe_load(f)
     # TODO: use a common pattern for accessing config values.
     base_dir = os.path.dirname(input_path)
     config = config['openrcv']
     contests = config['contests']
     contest = contests[0]
-    blt_path = os.path.join(base_dir, contest['file'])
-    results = counting.count_irv(blt_path)
-    json_results = jcmodels.JsonTestCaseOutput.from_contest_results(results)
+    input_path = os.path.join(base_dir, contest['file'])
+    is_cvr = os.path.splitext(input_path)[1].lower() == ".csv"
+    if ns.no_cache or cache.cache_disabled():
+        parser_class = CVRParser if is_cvr else BLTParser
+        with internal.temp_ballots_resource() as ballots_resource:
+            contest = parser_class(ballots_resource).parse(PathInfo(input_path))
+            results = counting.count_irv_contest(contest)
+    else:
+        # Use the cache so that repeated counts of the same file skip parsing.
+        with cache.ConversionCache(cache_dir=ns.cache_dir) as conversion_cache:
+            if is_cvr:
+                contest = conversion_cache.load_cvr(input_path)
+            else:
+                contest = conversion_cache.load_blt(input_path)
+            results = counting.count_irv_contest(contest)
+    json_results = jcmodels.JsonCaseTestOutput.from_model(results)
     print(json_results.to_json())
 
 
+def manage_cache(cache_dir=None, max_size=None, purge=False):
+    """Inspect or purge the conversion cache, and return a summary.
+
+    Arguments:
+      max_size: if provided, evict least-recently-used entries until
+        the cache is at most this many bytes.
+      purge: whether to remove all entries.
+    """
+    conversion_cache = cache.ConversionCache(cache_dir=cache_dir)
+    if purge:
+        conversion_cache.purge()
+    elif max_size is not None:
+        conversion_cache.shrink(max_size)
+    entries = conversion_cache.entries()
+    lines = ["cache directory: {0}".format(conversion_cache.cache_dir)]
+    for entry in entries:
+        parser = "?" if entry.parser is None else entry.parser.rsplit(".", 1)[-1]
+        lines.append("{0}  {1:>12,d} bytes  {2}  {3}".format(entry.digest[:12], entry.size,
+                                                             parser, ", ".join(entry.paths)))
+    total = sum(entry.size for entry in entries)
+    lines.append("entries: {0:d}, total: {1:,d} bytes".format(len(entries), total))
+    return "\n".join(lines) + "\n"
+
+
+def convert(input_path, output_path, parser_class, format_cls, normalize=False):
+    """Convert a contest file from one format to another, and return a summary.
+
+    The ballots are spooled through temporary files rather than held in
+    memory, and normalizing merges sorted runs when there are too many
+    distinct ballots to tally in memory.
+
+    Arguments:
+      parser_class: the Parser class for the input format.  It is passed
+        the ballots resource to write to.
+      format_cls: the Format class for the output format.
+      normalize: whether to normalize the ballots.
+    """
+    start_time = time.perf_counter()
+    with ExitStack() as stack:
+        ballots_resource = stack.enter_context(internal.temp_ballots_resource())
+        parser = parser_class(ballots_resource)
+        contest = parser.parse(PathInfo(input_path))
+        if contest.name is None:
+            contest.name = os.path.splitext(os.path.basename(input_path))[0]
+        if normalize:
+            normalized = stack.enter_context(internal.temp_ballots_resource())
+            models.external_normalize_ballots_to(ballots_resource, normalized,
+                                                 make_temp=internal.temp_ballots_resource)
+            contest.ballots_resource = normalized
+        format_cls().write_contest_path(contest, output_path)
+    seconds = max(time.perf_counter() - start_time, 1e-9)
+    ballot_count = contest.ballot_count
+    megabytes = os.path.getsize(input_path) / 1024 ** 2
+    return ("converted {0:,d} ballots in {1:.2f} seconds ({2:,.0f} ballots/s, "
+            "{3:.1f} MB/s)\n".format(ballot_count, seconds, ballot_count / seconds,
+                                     megabytes / seconds))
+
+
 def make_random_contest(ballot_count, candidate_count, format_cls,
                         json_contests_path, output_dir,
                         normalize=True, stdout=None):
@@ -75,7 +142,7 @@ def make_random_contest(ballot_count, candidate_count, format_cls,
     format = format_cls()
     creator = contestgen.ContestCreator()
 
-    with temp_ballots_resource() as ballots_resource:
+    with internal.temp_ballots_resource() as ballots_resource:
         contest = creator.create_random(ballots_resource, ballot_count=ballot_count,
                                         candidate_count=candidate_count)
         if normalize:
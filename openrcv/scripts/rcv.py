@@ -29,9 +29,12 @@ import logging
 import os
 import textwrap
 
+from openrcv import cache, counting
 from openrcv.formats.blt import BLTFormat
+from openrcv.formats.cvr import CVRFormat, CVRParser
 from openrcv.formats.internal import InternalFormat
 from openrcv import jcmanage
+from openrcv.parsing import BLTParser
 from openrcv.formats.jscase import JsonCaseFormat
 from openrcv.scripts.argparse import (parse_log_level, ArgParser, HelpAction,
                                       HelpRequested, Option, UsageException)
@@ -72,13 +75,24 @@ OPTION_JSON_LOCATION = Option(('-j', '--json-location'),
                               JsonLocationMetavar("CONTESTS_PATH", "TESTS_DIR"))
 OPTION_OUTPUT_DIR = Option(('-o', '--output-dir'), "OUTPUT_DIR")
 OPTION_OUTPUT_FORMAT = Option(('-f', '--output-format'), "OUTPUT_FORMAT")
+OPTION_FROM_FORMAT = Option(('--from', ), "INPUT_FORMAT")
+OPTION_TO_FORMAT = Option(('--to', ), "OUTPUT_FORMAT")
 
 OUTPUT_FORMAT_BLT = 'blt'
+OUTPUT_FORMAT_CVR = 'cvr'
 OUTPUT_FORMAT_INTERNAL = 'internal'
 OUTPUT_FORMAT_TEST = 'jscase'
 # TODO: default to OpenRCV format.
 OUTPUT_FORMAT_DEFAULT = OUTPUT_FORMAT_BLT
 
+# The format labels to assume for file extensions.
+FORMAT_EXTENSIONS = {
+    '.blt': OUTPUT_FORMAT_BLT,
+    '.csv': OUTPUT_FORMAT_CVR,
+    '.json': OUTPUT_FORMAT_TEST,
+    '.txt': OUTPUT_FORMAT_INTERNAL,
+}
+
 
 HELP_DEFAULT_JSON_LOCATION = """\
 Using the default requires running this command from a source checkout with
@@ -98,6 +112,8 @@ def make_output_formats():
     formats = (
         OutputFormat(OUTPUT_FORMAT_BLT, cls=BLTFormat,
                      desc="BLT format"),
+        OutputFormat(OUTPUT_FORMAT_CVR, cls=CVRFormat,
+                     desc="CSV cast vote records"),
         OutputFormat(OUTPUT_FORMAT_INTERNAL, cls=InternalFormat,
                      desc="internal OpenRCV format"),
         OutputFormat(OUTPUT_FORMAT_TEST, cls=JsonCaseFormat,
@@ -107,6 +123,17 @@ def make_output_formats():
     return mapping
 
 
+def make_input_formats():
+    formats = (
+        InputFormat(OUTPUT_FORMAT_BLT, cls=BLTParser,
+                    desc="BLT format"),
+        InputFormat(OUTPUT_FORMAT_CVR, cls=CVRParser,
+                    desc="CSV cast vote records"),
+    )
+    mapping = {format.label: format for format in formats}
+    return mapping
+
+
 def add_help(parser):
     # The add_argument() call for help is modeled after how argparse
     # does it internally.
@@ -146,14 +173,18 @@ def create_argparser(prog="rcv"):
     builder = ArgBuilder(formats)
 
     builder.add_command(subparsers, CountCommand)
+    builder.add_command(subparsers, ConvertCommand)
+    builder.add_command(subparsers, CacheCommand)
 
     group = subparsers.add_parser_group("Test-case management")
     classes = (
         RandContestCommand,
         CleanContestsCommand,
+        CompactContestsCommand,
         UpdateTestInputsCommand,
         CountJcTestCommand,
         UpdateOutputsCommand,
+        CheckTestsCommand,
     )
     builder.add_commands(group, classes)
 
@@ -194,6 +225,10 @@ class OutputFormat(object):
         return '"{!s}" ({!s})'.format(self.label, self.desc)
 
 
+class InputFormat(OutputFormat):
+    pass
+
+
 class RcvArgumentParser(ArgParser):
 
     option_help = OPTION_HELP
@@ -338,18 +373,120 @@ class CountCommand(CommandBase):
 
     help_details = """\
     Tally the contests specified by the contests file at INPUT_PATH.
-    """
+    Each contest's input file can be a BLT file, or a CSV file of cast
+    vote records (*.csv).  Parsed input files are cached (see the `cache`
+    command) unless --no-cache is passed or the {env_var} environment
+    variable is set.
+    """.format(env_var=cache.NO_CACHE_ENV_VAR)
 
     def add_arguments(self, parser):
         parser.add_argument('input_path', metavar='INPUT_PATH',
             help=("path to a contests configuration file. Supported file "
                   "formats are JSON (*.json) and YAML (*.yaml or *.yml)."))
+        parser.add_argument('--cache-dir', metavar='DIR',
+            help="the cache directory to use instead of the default.")
+        parser.add_argument('--no-cache', action='store_true',
+            help="parse the input files without reading or writing the cache.")
 
     @property
     def func(self):
         return commands.count
 
 
+class ConvertCommand(CommandBase):
+
+    name = "convert"
+
+    help = "Convert a contest file to another format."
+
+    @property
+    def help_details(self):
+        return """\
+            This command converts the contest file at INPUT_PATH and writes
+            the result to OUTPUT_PATH.  The ballots are passed through
+            temporary files rather than held in memory, so files of any size
+            can be converted.  If {from_format} or {to_format} is not
+            provided, the format is inferred from the file extension
+            ({extensions}).  The number of ballots converted and the
+            throughput are written to stdout.
+            """.format(from_format=OPTION_FROM_FORMAT.long, to_format=OPTION_TO_FORMAT.long,
+                       extensions=", ".join("{0}: {1}".format(ext, label) for ext, label in
+                                            sorted(FORMAT_EXTENSIONS.items())))
+
+    def add_arguments(self, parser):
+        # For reporting usage errors when inferring formats.
+        self.parser = parser
+        parser.add_argument('input_path', metavar='INPUT_PATH',
+            help="path to the contest file to convert.")
+        parser.add_argument('output_path', metavar='OUTPUT_PATH',
+            help="path to the file to write.")
+        input_formats = make_input_formats()
+        labels = sorted(input_formats)
+        parser.add_argument(*OPTION_FROM_FORMAT.flags, dest='from_format',
+            metavar=OPTION_FROM_FORMAT.metavar, choices=labels,
+            help=('the input format.  Choose from: {!s}.'
+                  .format(", ".join(str(input_formats[label]) for label in labels))))
+        labels = sorted(self.formats)
+        parser.add_argument(*OPTION_TO_FORMAT.flags, dest='to_format',
+            metavar=OPTION_TO_FORMAT.metavar, choices=labels,
+            help=('the output format.  Choose from: {!s}.'
+                  .format(", ".join(str(self.formats[label]) for label in labels))))
+        parser.add_argument('-n', '--normalize', action='store_true',
+            help=("normalize the ballots, i.e. order them lexicographically and "
+                  "group identical choices using the weight."))
+
+    def get_format(self, formats, label, path):
+        """Return the format for a label, inferring it from the path if needed."""
+        if label is None:
+            ext = os.path.splitext(path)[1].lower()
+            try:
+                label = FORMAT_EXTENSIONS[ext]
+            except KeyError:
+                raise UsageException("cannot infer the format of: %s" % path,
+                                     parser=self.parser)
+        try:
+            return formats[label]
+        except KeyError:
+            raise UsageException("unsupported format for: %s (%s)" % (path, label),
+                                 parser=self.parser)
+
+    def func(self, ns, stdout):
+        input_format = self.get_format(make_input_formats(), ns.from_format, ns.input_path)
+        output_format = self.get_format(self.formats, ns.to_format, ns.output_path)
+        return commands.convert(ns.input_path, ns.output_path,
+                                parser_class=input_format.cls,
+                                format_cls=output_format.cls,
+                                normalize=ns.normalize)
+
+
+class CacheCommand(CommandBase):
+
+    name = "cache"
+
+    help = "Inspect or purge the cache of parsed input files."
+
+    help_details = """\
+    Commands like `count` cache the result of parsing an input file, keyed
+    by a hash of the file's contents.  This command lists the cache
+    entries, and can also evict or remove them.  The cache directory
+    defaults to the value of the {env_var} environment variable, or
+    else to "openrcv" inside $XDG_CACHE_HOME (or "~/.cache").
+    """.format(env_var=cache.CACHE_DIR_ENV_VAR)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cache-dir', metavar='DIR',
+            help="the cache directory to use instead of the default.")
+        parser.add_argument('--max-size', metavar='BYTES', type=int,
+            help=("evict least-recently-used entries until the cache is "
+                  "at most this many bytes."))
+        parser.add_argument('--purge', action='store_true',
+            help="remove all entries from the cache.")
+
+    def func(self, ns, stdout):
+        return commands.manage_cache(cache_dir=ns.cache_dir, max_size=ns.max_size,
+                                     purge=ns.purge)
+
+
 class RandContestCommand(CommandBase):
 
     name = "randcontest"
@@ -425,14 +562,42 @@ class CleanContestsCommand(CommandBase):
     Normalizations include setting the file version number, setting
     the standard candidate names, updating the integer indices,
     setting the permanent IDs, and normalizing the ballots if needed.
+    Contests whose ballots have not changed since they were last
+    normalized are skipped.
     """
 
     def add_arguments(self, parser):
         self.add_required_contests_path(parser)
+        parser.add_argument('--jobs', metavar='N', type=int, default=1,
+            help=("the number of worker processes with which to normalize the "
+                  "ballots.  Defaults to 1, which normalizes them in the current "
+                  "process."))
 
     def func(self, ns, stdout):
         contests_path = ns.json_location
-        return jcmanage.normalize_contests_file(contests_path)
+        return jcmanage.normalize_contests_file(contests_path, processes=ns.jobs)
+
+
+class CompactContestsCommand(CommandBase):
+
+    name = "compactcontests"
+
+    help = "Write a JSON Lines contests store to a JSON contests file."
+
+    help_details = """\
+    Contests paths ending in ".jsonl" refer to an append-only contests
+    store, which commands like `randcontest` can add to without
+    rewriting.  This command writes the contests in such a store to a
+    JSON contests file in the usual layout.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('store_path', metavar='STORE_PATH',
+            help='the path to the contests store (e.g. "contests.jsonl").')
+        self.add_required_contests_path(parser)
+
+    def func(self, ns, stdout):
+        return jcmanage.compact_contests_store(ns.store_path, ns.json_location)
 
 
 class UpdateTestInputsCommand(CommandBase):
@@ -441,12 +606,24 @@ class UpdateTestInputsCommand(CommandBase):
 
     help = "Update all test data except for test outputs."
 
+    help_details = """\
+    By default, each test case contains the ballots of its contest, so
+    that each tests file stands alone.  With --shared-ballots, the test
+    cases instead refer to the ballots by reference, and each distinct
+    set of ballots is stored once in the "ballots" directory of the
+    tests directory.  Ballots no tests file refers to are deleted.
+    """
+
     def add_arguments(self, parser):
         self.add_required_contests_path_and_tests_dir(parser)
+        parser.add_argument('--shared-ballots', action='store_true',
+            help=("store each distinct set of ballots once, and refer to it from "
+                  "the test cases."))
 
     def func(self, ns, stdout):
         contests_path, tests_dir = ns.json_location
-        return jcmanage.update_test_inputs(contests_path, tests_dir)
+        return jcmanage.update_test_inputs(contests_path, tests_dir,
+                                           shared_ballots=ns.shared_ballots)
 
 
 class CountJcTestCommand(CommandBase):
@@ -471,6 +648,37 @@ class CountJcTestCommand(CommandBase):
                                              rule_set=rule_set, index=index)
 
 
+class CheckTestsCommand(CommandBase):
+
+    name = "checktests"
+
+    help = "Recount the test cases in a tests directory, and check the outputs."
+
+    help_details = """\
+    Each test case is counted with each counting engine and compared with
+    its expected output.  The report has a row per test case and engine
+    with the time spent parsing the input, counting, and comparing.
+    """
+
+    def add_arguments(self, parser):
+        self.add_required_tests_dir(parser)
+        engines = counting.make_engines()
+        parser.add_argument('--engine', metavar='LABEL', dest='engines', action='append',
+            choices=sorted(engines),
+            help=("a counting engine with which to count the test cases.  Can be "
+                  "given more than once.  Defaults to all engines.  Choose from: %s." %
+                  ", ".join(str(engine) for label, engine in sorted(engines.items()))))
+        parser.add_argument('--jobs', metavar='N', type=int, default=1,
+            help=("the number of worker processes with which to count the test "
+                  "cases.  Defaults to 1, which counts them in the current process."))
+
+    def func(self, ns, stdout):
+        tests_dir = ns.json_location
+        results = jcmanage.check_tests(tests_dir, engine_labels=ns.engines,
+                                       processes=ns.jobs)
+        return jcmanage.format_check_results(results)
+
+
 class UpdateOutputsCommand(CommandBase):
 
     name = "updateoutputs"
@@ -479,7 +687,10 @@ class UpdateOutputsCommand(CommandBase):
 
     def add_arguments(self, parser):
         self.add_required_tests_dir(parser)
+        parser.add_argument('--jobs', metavar='N', type=int, default=1,
+            help=("the number of worker processes with which to count the test "
+                  "cases.  Defaults to 1, which counts them in the current process."))
 
     def func(self, ns, stdout):
         tests_dir = ns.json_location
-        return jcmanage.update_test_outputs(tests_dir)
+        return jcmanage.update_test_outputs(tests_dir, processes=ns.jobs)
@@ -0,0 +1,114 @@
+#
+# Copyright (c) 2014 Chris Jerdonek. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+"""Supports small JSON index files stored next to the files they index.
+
+An index is a dict describing the byte layout of a large file (e.g. the
+offsets of the records in it), so that the file can be read by seeking
+rather than scanning.  The index is stored at the file's path plus a
+suffix, and is rebuilt if the file's size or modification time changes.
+"""
+
+import json
+import logging
+import os
+
+from openrcv import streams
+from openrcv.utils import ENCODING_JSON
+
+
+log = logging.getLogger(__name__)
+
+# The default suffix appended to a file's path to get its index path.
+INDEX_SUFFIX = ".idx"
+
+
+class SidecarIndexMixin(object):
+
+    """A mixin for classes that read a file using a sidecar index.
+
+    Classes using this mixin should set the path attribute to the path
+    of the indexed file and the _index attribute to None, and should
+    implement build_index().  The dict returned by build_index() should
+    include the items returned by index_params().
+    """
+
+    index_suffix = INDEX_SUFFIX
+
+    # A description of the indexed file for log messages.
+    index_label = "file"
+
+    @property
+    def index_path(self):
+        return self.path + self.index_suffix
+
+    def index_params(self):
+        """Return a dict of the items an index must have to be current.
+
+        Subclasses should include a version number in the dict, and
+        increment it when the index format changes.
+        """
+        raise NotImplementedError()
+
+    def build_index(self, stat):
+        """Scan the indexed file, and return a new index dict.
+
+        Arguments:
+          stat: the os.stat_result of the indexed file.
+        """
+        raise NotImplementedError()
+
+    def _is_current(self, index, stat):
+        if index.get("size") != stat.st_size or index.get("mtime") != stat.st_mtime:
+            return False
+        return all(index.get(key) == value for key, value in self.index_params().items())
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, encoding=ENCODING_JSON) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_index(self, index):
+        # Write to a uniquely named temp file that replaces the index on
+        # success, so concurrent writers do not clobber each other.
+        resource = streams.FilePathResource(self.index_path, encoding=ENCODING_JSON)
+        try:
+            with resource.replacement() as temp_resource:
+                with temp_resource.open_write() as f:
+                    json.dump(index, f)
+        except OSError as err:
+            # The index is only an optimization, e.g. if the directory is read-only.
+            log.warning("error writing %s index: %s" % (self.index_label, err))
+
+    def get_index(self):
+        """Return the index dict, reading or building it if necessary."""
+        stat = os.stat(self.path)
+        index = self._index
+        if index is None or not self._is_current(index, stat):
+            index = self._read_index()
+            if index is None or not self._is_current(index, stat):
+                index = self.build_index(stat)
+                self._write_index(index)
+            self._index = index
+        return index
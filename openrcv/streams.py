@@ -69,6 +69,14 @@ example of writing to a stream resource:
 The semantics of the reading() and writing() methods closely resemble those
 of the built-in function open() (with modes "r" and "w", respectively).
 
+Stream resources also provide a writing_batches() method.  It is like
+writing(), except that the yielded generator accepts lists of items
+rather than individual items.  This lets high-volume writers (e.g. when
+writing millions of ballots) avoid per-item overhead.  File-backed
+resources also buffer the items sent to the writing() generator and
+write them in batches.  The buffer is flushed each time it reaches the
+resource's write_batch_size, and when the writing() context manager exits.
+
 
 Advantages
 ----------
@@ -105,7 +113,11 @@ import contextlib
 from contextlib import contextmanager
 from io import StringIO
 import logging
+import os
+import queue
+import shutil
 import tempfile
+import threading
 
 from openrcv import utils
 from openrcv.utils import logged_open, NoImplementation, ReprMixin
@@ -113,6 +125,20 @@ from openrcv.utils import logged_open, NoImplementation, ReprMixin
 
 log = logging.getLogger(__name__)
 
+# The default number of items to buffer before writing to a file.
+WRITE_BATCH_SIZE = 1000
+
+# The defaults for ReadAheadResource.
+READ_AHEAD_BATCH_SIZE = 1000
+READ_AHEAD_MAX_BATCHES = 8
+# How often (in seconds) a blocked read-ahead thread checks whether to stop.
+_READ_AHEAD_POLL_INTERVAL = 0.05
+
+
+def make_read_error(exc, source, number, item):
+    """Return a copy of an exception, annotated with the last item read."""
+    return type(exc)("last read item from %r (number=%d): %r" % (source, number, item))
+
 
 def tracked(source, iterable):
     """Return a "tracking" generator over the items in the given stream.
@@ -130,7 +156,7 @@ def tracked(source, iterable):
         try:
             yield item
         except Exception as exc:
-            raise type(exc)("last read item from %r (number=%d): %r" % (source, i, item))
+            raise make_read_error(exc, source, i, item)
 
 
 @utils.coroutine
@@ -141,6 +167,45 @@ def _sink(write, target):
         write(target, item)
 
 
+@utils.coroutine
+def _batch_sink(write_many, target):
+    """Return a generator that writes lists of items to the given target."""
+    while True:
+        items = yield
+        write_many(target, items)
+
+
+@utils.coroutine
+def buffering_pipe(target, batch_size):
+    """Return a generator that sends items to the target in lists.
+
+    Items are sent to the target coroutine in lists of length batch_size.
+    Any remaining items are sent when the generator is closed.
+
+    Arguments:
+      target: a coroutine that accepts lists of items.
+    """
+    items = []
+    try:
+        while True:
+            items.append((yield))
+            if len(items) >= batch_size:
+                target.send(items)
+                items = []
+    except GeneratorExit:
+        if items:
+            target.send(items)
+
+
+@utils.coroutine
+def unbatching_pipe(target):
+    """Return a generator that sends the items in each list to the target."""
+    while True:
+        items = (yield)
+        for item in items:
+            target.send(item)
+
+
 @utils.coroutine
 def converting_pipe(convert, target):
     """
@@ -154,12 +219,58 @@ def converting_pipe(convert, target):
         target.send(item)
 
 
+@utils.coroutine
+def converting_batch_pipe(convert, target):
+    """Like converting_pipe(), but for a generator accepting lists of items."""
+    while True:
+        items = (yield)
+        target.send([convert(item) for item in items])
+
+
+@contextmanager
+def _closing_all(*gens):
+    """Yield the first generator, and close all of them in order on exit."""
+    try:
+        yield gens[0]
+    finally:
+        for gen in gens:
+            gen.close()
+
+
 class StreamResourceMixin(ReprMixin):
 
     @classmethod
     def create(cls, *args, **kwargs):
         return cls(*args, **kwargs)
 
+    @contextmanager
+    def writing_batches(self):
+        """Return a context manager that yields a generator accepting lists.
+
+        This default implementation sends the items in each list to the
+        generator returned by writing().
+        """
+        with self.writing() as gen:
+            with _closing_all(unbatching_pipe(gen)) as batch_gen:
+                yield batch_gen
+
+    def areading(self, executor=None, batch_size=None):
+        """Return an async context manager that yields an async iterator.
+
+        See the openrcv.aiostreams module for details.
+        """
+        # Import lazily since aiostreams depends on the current module.
+        from openrcv import aiostreams
+        return aiostreams.AsyncReading(self, executor=executor, batch_size=batch_size)
+
+    def awriting(self, executor=None, batch_size=None):
+        """Return an async context manager that yields an AsyncWriter object.
+
+        See the openrcv.aiostreams module for details.
+        """
+        from openrcv import aiostreams
+        return aiostreams.AsyncWriting(self, executor=executor, batch_size=batch_size)
+
     def copy(self):
         raise NoImplementation(self)
 
@@ -262,9 +373,17 @@ class StreamResourceBase(StreamResourceMixin):
         """Return an iterator object."""
         raise NoImplementation(self)
 
+    # The number of items to buffer when writing.  None means that each
+    # item is written as soon as it is sent.
+    write_batch_size = None
+
     def write(self, f, item):
         raise NoImplementation(self)
 
+    def write_many(self, f, items):
+        for item in items:
+            self.write(f, item)
+
     @contextmanager
     def open_write(self):
         raise NoImplementation(self)
@@ -305,12 +424,41 @@ class StreamResourceBase(StreamResourceMixin):
         before returning a stream that writes to the store.
         """
         log.debug("opening for writing: %r" % self)
+        batch_size = self.write_batch_size
         with self.open_write() as stream:
-            gen = _sink(self.write, stream)
-            try:
+            if batch_size is None:
+                gens = (_sink(self.write, stream), )
+            else:
+                sink = _batch_sink(self.write_many, stream)
+                gens = (buffering_pipe(sink, batch_size), sink)
+            # Closing the buffering pipe first flushes any remaining items.
+            with _closing_all(*gens) as gen:
                 yield gen
-            finally:
-                gen.close()
+
+    @contextmanager
+    def writing_batches(self):
+        """Return a context manager that yields a generator accepting lists.
+
+        Calling this method clears the contents of the backing store.
+        Each list sent to the generator is written before send() returns.
+        """
+        log.debug("opening for writing batches: %r" % self)
+        with self.open_write() as stream:
+            with _closing_all(_batch_sink(self.write_many, stream)) as gen:
+                yield gen
+
+
+class FileResourceMixin(object):
+
+    """Mixin for stream resources backed by a text file object."""
+
+    write_batch_size = WRITE_BATCH_SIZE
+
+    def write(self, f, item):
+        f.write(item)
+
+    def write_many(self, f, items):
+        f.writelines(items)
 
 
 # TODO: add more to the repr and test.
@@ -328,13 +476,18 @@ class ListResource(StreamResourceBase):
         self._seq = seq
 
     def copy(self):
-        new_seq = self._seq.copy()
-        return self.create(seq=new_seq)
+        """Return a new, empty resource."""
+        return self.create()
 
-    # TODO: think about whether to move the items to the list instead
-    #   of simply setting the attribute, and add a test for this.
     def move(self, dest):
+        """Move the contents to another resource without copying items.
+
+        The destination takes ownership of the backing list, and the
+        current resource is left with a new empty list.  The destination's
+        previous list is left as is, since others may hold references to it.
+        """
         dest._seq = self._seq
+        self._seq = []
 
     def delete(self):
         self._seq.clear()
@@ -354,13 +507,10 @@ class ListResource(StreamResourceBase):
 
     @contextmanager
     def replacement(self):
-        """See StreamResourceBase.replacement()."""
+        """See StreamResourceMixin.replacement()."""
         with self.temp() as temp_resource:
-            try:
-                yield temp_resource
-            finally:
-                # Replace the current resource with contents of the temporary.
-                self._seq[:] = temp_resource._seq
+            yield temp_resource
+            temp_resource.move(dest=self)
 
     @contextmanager
     def open_read(self):
@@ -369,6 +519,9 @@ class ListResource(StreamResourceBase):
     def write(self, target, item):
         target.append(item)
 
+    def write_many(self, target, items):
+        target.extend(items)
+
     @contextmanager
     def open_write(self):
         # Delete the contents of the list (analogous to deleting a file).
@@ -376,8 +529,26 @@ class ListResource(StreamResourceBase):
         yield self._seq
 
 
+def _make_temp_file(dir_name, prefix, suffix):
+    """Create a new, empty file with a unique name, and return its path.
+
+    Unlike tempfile.mkstemp(), which uses mode 0o600, the file gets the
+    mode of a newly created file (i.e. 0o666 as modified by the umask).
+    The umask is applied by the OS rather than read, since reading it
+    means setting it, which is not thread-safe.
+    """
+    while True:
+        path = os.path.join(dir_name, "%s%s%s" % (prefix, os.urandom(6).hex(), suffix))
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        except FileExistsError:
+            continue
+        os.close(fd)
+        return path
+
+
 # TODO: add more to the repr and test.
-class FilePathResource(StreamResourceBase):
+class FilePathResource(FileResourceMixin, StreamResourceBase):
 
     """A stream resource backed by a file."""
 
@@ -388,9 +559,44 @@ class FilePathResource(StreamResourceBase):
         self.encoding = encoding
         self.kwargs = kwargs
 
-    @classmethod
-    def make_temp(cls):
-        return tempfile.SpooledTemporaryFile(encoding=self.encoding)
+    def copy(self):
+        """Return a resource backed by a new, empty temporary file.
+
+        The file is created in the same directory as the current file so
+        that move() can replace the current file atomically.
+        """
+        dir_name, base_name = os.path.split(os.path.abspath(self.path))
+        temp_path = _make_temp_file(dir_name, prefix=".%s." % base_name, suffix=".tmp")
+        if os.path.exists(self.path):
+            shutil.copymode(self.path, temp_path)
+        return self.create(temp_path, encoding=self.encoding, **self.kwargs)
+
+    def move(self, dest):
+        """Move the file to the destination's path using a rename."""
+        os.replace(self.path, dest.path)
+
+    def delete(self):
+        """Delete the file if it exists."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def replacement(self):
+        """See StreamResourceMixin.replacement().
+
+        The temporary resource is a sibling file that is renamed over
+        the current file on success and deleted otherwise, so the contents
+        are never copied.
+        """
+        temp_resource = self.copy()
+        try:
+            yield temp_resource
+            temp_resource.move(dest=self)
+        finally:
+            # This is a no-op if the move succeeded.
+            temp_resource.delete()
 
     @contextmanager
     def _open(self, mode):
@@ -400,14 +606,11 @@ class FilePathResource(StreamResourceBase):
     def open_read(self):
         return self._open("r")
 
-    def write(self, f, item):
-        f.write(item)
-
     def open_write(self):
         return self._open("w")
 
 
-class _ReadWriteFileBase(StreamResourceBase):
+class _ReadWriteFileBase(FileResourceMixin, StreamResourceBase):
 
     """A stream resource backed by a readable-writeable file.
 
@@ -434,9 +637,6 @@ class _ReadWriteFileBase(StreamResourceBase):
         self._open()
         yield self.file
 
-    def write(self, f, item):
-        f.write(item)
-
     @contextmanager
     def open_write(self):
         self._open()
@@ -508,7 +708,10 @@ class TempFileResource(_ReadWriteFileBase):
         return self.create(encoding=self.encoding)
 
     def move(self, dest):
+        if dest.file is not self.file:
+            dest.close()
         dest.file = self.file
+        self.file = None
 
     def _open(self):
         f = self.file
@@ -524,7 +727,7 @@ class TempFileResource(_ReadWriteFileBase):
 
 # TODO: add more to the repr and test.
 # TODO: give a better name and test edge cases.
-class StandardResource(StreamResourceBase):
+class StandardResource(FileResourceMixin, StreamResourceBase):
 
     """A stream resource backed by a file."""
 
@@ -541,16 +744,12 @@ class StandardResource(StreamResourceBase):
     def open_read(self):
         return self._open()
 
-    # TODO: move this method to a FileResourceMixin.
-    def write(self, f, item):
-        f.write(item)
-
     def open_write(self):
         return self._open()
 
 
 # TODO: add more to the repr and test.
-class StringResource(StreamResourceBase):
+class StringResource(FileResourceMixin, StreamResourceBase):
 
     """A stream resource backed by an in-memory text stream.
 
@@ -585,9 +784,6 @@ class StringResource(StreamResourceBase):
     def open_read(self):
         yield StringIO(self.contents)
 
-    def write(self, f, item):
-        f.write(item)
-
     @contextmanager
     def open_write(self):
         # TODO: confirm that the contents get deleted.
@@ -601,9 +797,26 @@ class WrappedResourceMixin(StreamResourceMixin):
     def repr_info(self):
         return "resource=%r" % self.resource
 
+    def wrap(self, resource):
+        """Return a resource like the current one, but wrapping the given one."""
+        raise NoImplementation(self)
+
+    def copy(self):
+        return self.wrap(self.resource.copy())
+
     def move(self, dest):
         self.resource.move(dest.resource)
 
+    @contextmanager
+    def replacement(self):
+        """See StreamResourceMixin.replacement().
+
+        This delegates to the wrapped resource so that the wrapped
+        resource's replacement strategy is used (e.g. renaming files).
+        """
+        with self.resource.replacement() as temp_resource:
+            yield self.wrap(temp_resource)
+
 
 # TODO: unit test this.
 class WrapperResource(WrappedResourceMixin):
@@ -621,9 +834,8 @@ class WrapperResource(WrappedResourceMixin):
         """
         self.resource = resource
 
-    def copy(self):
-        new_resource = self.resource.copy()
-        return self.create(resource=new_resource)
+    def wrap(self, resource):
+        return self.create(resource=resource)
 
     def make_temp(self):
         temp_resource = self.resource.make_temp()
@@ -635,6 +847,173 @@ class WrapperResource(WrappedResourceMixin):
     def writing(self):
         return self.resource.writing()
 
+    def writing_batches(self):
+        return self.resource.writing_batches()
+
+
+class ReadAheadStats(ReprMixin):
+
+    """Statistics about a read-ahead stream, for tuning purposes.
+
+    Attributes:
+      batches: the number of batches read by the consumer.
+      items: the number of items read by the consumer.
+      max_depth: the largest number of batches that were in the queue.
+      consumer_waits: the number of times the consumer found the queue
+        empty (i.e. reading was the bottleneck).
+      producer_waits: the number of times the background thread found the
+        queue full (i.e. the consumer was the bottleneck).
+    """
+
+    def __init__(self):
+        self.batches = 0
+        self.consumer_waits = 0
+        self.items = 0
+        self.max_depth = 0
+        self.producer_waits = 0
+
+    def repr_info(self):
+        return ("batches=%d items=%d max_depth=%d consumer_waits=%d producer_waits=%d" %
+                (self.batches, self.items, self.max_depth, self.consumer_waits,
+                 self.producer_waits))
+
+
+class _ReadAheadEnd(object):
+    pass
+
+_READ_AHEAD_END = _ReadAheadEnd()
+
+
+class _ReadAheadError(object):
+
+    def __init__(self, exc):
+        self.exc = exc
+
+
+class ReadAheadResource(WrapperResource):
+
+    """A stream resource that reads its wrapped resource on a background thread.
+
+    While reading, a background thread reads items from the wrapped
+    resource and puts them in batches onto a bounded queue, from which
+    the consumer takes them.  This lets file I/O and decoding (and any
+    conversion done by the wrapped resource, e.g. ballot parsing) overlap
+    with the consumer's processing of earlier items.
+
+    Exceptions raised by the background thread are re-raised in the
+    consumer.  Exiting the reading() context manager early stops the
+    background thread and waits for it to finish.  Writing is done
+    directly by the wrapped resource.
+    """
+
+    def __init__(self, resource, batch_size=None, max_batches=None):
+        """
+        Arguments:
+          resource: a stream resource.
+          batch_size: the number of items per batch.
+          max_batches: the maximum number of batches in the queue.
+        """
+        if batch_size is None:
+            batch_size = READ_AHEAD_BATCH_SIZE
+        if max_batches is None:
+            max_batches = READ_AHEAD_MAX_BATCHES
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.resource = resource
+        # The statistics for the most recent read.
+        self.stats = None
+
+    def wrap(self, resource):
+        return self.create(resource=resource, batch_size=self.batch_size,
+                           max_batches=self.max_batches)
+
+    def _put(self, batches, item, stop, stats):
+        """Put an item on the queue, and return whether it was added."""
+        if batches.full():
+            stats.producer_waits += 1
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=_READ_AHEAD_POLL_INTERVAL)
+            except queue.Full:
+                continue
+            return True
+        return False
+
+    def _produce(self, batches, stop, stats):
+        batch_size = self.batch_size
+        try:
+            with self.resource.reading() as items:
+                batch = []
+                for item in items:
+                    batch.append(item)
+                    if len(batch) >= batch_size:
+                        if not self._put(batches, batch, stop, stats):
+                            return
+                        batch = []
+            if batch and not self._put(batches, batch, stop, stats):
+                return
+            self._put(batches, _READ_AHEAD_END, stop, stats)
+        except BaseException as exc:
+            # Pass on any exception (e.g. KeyboardInterrupt or GeneratorExit
+            # raised by the wrapped reader) so the consumer does not wait
+            # for items that will never come.
+            self._put(batches, _ReadAheadError(exc), stop, stats)
+
+    def _get(self, batches, thread):
+        """Take the next batch from the queue.
+
+        Raises RuntimeError if the background thread exits without
+        putting the end marker or an error on the queue.
+        """
+        while True:
+            try:
+                return batches.get(timeout=_READ_AHEAD_POLL_INTERVAL)
+            except queue.Empty:
+                pass
+            if not thread.is_alive():
+                # The thread may have put an item before exiting.
+                try:
+                    return batches.get_nowait()
+                except queue.Empty:
+                    raise RuntimeError("read-ahead thread exited before finishing: %r" %
+                                       thread.name)
+
+    def _consume(self, batches, thread, stats):
+        while True:
+            if batches.empty():
+                stats.consumer_waits += 1
+            batch = self._get(batches, thread)
+            stats.max_depth = max(stats.max_depth, batches.qsize() + 1)
+            if batch is _READ_AHEAD_END:
+                return
+            if isinstance(batch, _ReadAheadError):
+                raise batch.exc
+            stats.batches += 1
+            stats.items += len(batch)
+            yield from batch
+
+    @contextmanager
+    def reading(self):
+        stats = ReadAheadStats()
+        self.stats = stats
+        batches = queue.Queue(maxsize=self.max_batches)
+        stop = threading.Event()
+        thread = threading.Thread(target=self._produce, args=(batches, stop, stats),
+                                  name="read-ahead: %r" % self.resource, daemon=True)
+        log.debug("starting read-ahead thread: %r" % self)
+        thread.start()
+        gen = tracked(self, self._consume(batches, thread, stats))
+        try:
+            try:
+                yield gen
+            except Exception as exc:
+                gen.throw(exc)
+        finally:
+            gen.close()
+            stop.set()
+            thread.join()
+            log.debug("read-ahead finished: %r" % stats)
+
 
 class Converter(object):
 
@@ -657,9 +1036,8 @@ class ConvertingResource(WrappedResourceMixin):
         self.converter = converter
         self.resource = resource
 
-    def copy(self):
-        new_resource = self.resource.copy()
-        return self.create(resource=new_resource, converter=self.converter)
+    def wrap(self, resource):
+        return self.create(resource=resource, converter=self.converter)
 
     @contextmanager
     def reading(self):
@@ -669,11 +1047,19 @@ class ConvertingResource(WrappedResourceMixin):
 
     @contextmanager
     def writing(self):
+        # Convert each item as it is sent so that a conversion error is
+        # raised by the send() of the offending item rather than by a later
+        # flush, and then buffer to write whole batches at a time.
+        convert = self.converter.to_resource
+        with self.resource.writing_batches() as gen:
+            batch_gen = buffering_pipe(gen, WRITE_BATCH_SIZE)
+            with _closing_all(converting_pipe(convert, target=batch_gen), batch_gen) as new_gen:
+                yield new_gen
+
+    @contextmanager
+    def writing_batches(self):
         # TODO: test this so that from_resource would fail here.
         convert = self.converter.to_resource
-        with self.resource.writing() as gen:
-            new_gen = converting_pipe(convert, target=gen)
-            try:
+        with self.resource.writing_batches() as gen:
+            with _closing_all(converting_batch_pipe(convert, target=gen)) as new_gen:
                 yield new_gen
-            finally:
-                new_gen.close()
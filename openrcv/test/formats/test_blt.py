@@ -20,11 +20,15 @@
 # DEALINGS IN THE SOFTWARE.
 #
 
+import os
+from tempfile import TemporaryDirectory
 from textwrap import dedent
 
-from openrcv.formats.blt import BLTFileWriter
-from openrcv.models import ContestInput
+from openrcv.formats.blt import parse_blt_ballot, BLTBallotsResource, BLTFileWriter
+from openrcv.models import CompactBallotsResource, ContestInput
+from openrcv.parsing import BLTParser
 from openrcv.streams import ListResource, StringResource
+from openrcv.utils import PathInfo, StringInfo
 from openrcv.utiltest.helpers import UnitCase
 
 
@@ -54,3 +58,139 @@ class BLTFileWriterTest(UnitCase):
         "Foo\"
         """)
         self.assertEqual(resource.contents, expected)
+
+    def test__compact_ballots(self):
+        contest = ContestInput(name="Foo", candidates=['A', 'B'])
+        contest.ballots_resource = CompactBallotsResource()
+        contest.ballots_resource.extend_ballots([2, 1], [2, 1, 2], [2, 3])
+        resource = StringResource()
+        BLTFileWriter(resource).write_contest(contest)
+        self.assertEqual(resource.contents, '2 1\n2 2 1 0\n1 2 0\n0\n"A"\n"B"\n"Foo"\n')
+
+    def test_round_trip(self):
+        """Check that a written contest parses back, with or without withdrawn candidates.
+
+        The withdrawn line is optional, so it is written only if there
+        are withdrawn candidates.
+        """
+        for withdrawn in ([], [2]):
+            with self.subTest(withdrawn=withdrawn):
+                contest = ContestInput(name="Foo", candidates=['A', 'B'], seat_count=1)
+                contest.withdrawn = withdrawn
+                contest.ballots_resource = ListResource([(2, (2, 1)), (1, (1, ))])
+                resource = StringResource()
+                BLTFileWriter(resource).write_contest(contest)
+                parsed_resource = ListResource()
+                parser = BLTParser(ballots_resource=parsed_resource)
+                parsed = parser.parse(StringInfo(resource.contents))
+                self.assertEqual(parsed.withdrawn, withdrawn)
+                self.assertEqual(parsed.seat_count, 1)
+                self.assertResourceContents(parsed_resource, [(2, (2, 1)), (1, (1, ))])
+
+
+class ParseBLTBallotTest(UnitCase):
+
+    def test(self):
+        self.assertEqual(parse_blt_ballot("2 3 1 0\n"), (2, (3, 1)))
+        self.assertEqual(parse_blt_ballot(b"1 0"), (1, ()))
+
+
+class BLTBallotsResourceTest(UnitCase):
+
+    BLT_STRING = dedent("""\
+    4 2
+    -3
+    2 2 0
+    1 2 4 3 1 0
+    3 1 0
+    1 4 0
+    0
+    "Jen"
+    "Alice"
+    "Steve"
+    "Bill"
+    "My Election"
+    """)
+
+    BALLOTS = [(2, (2, )), (1, (2, 4, 3, 1)), (3, (1, )), (1, (4, ))]
+
+    def make_resource(self, dir_path, blt_string=None, **kwargs):
+        if blt_string is None:
+            blt_string = self.BLT_STRING
+        path = os.path.join(dir_path, "test.blt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(blt_string)
+        return BLTBallotsResource(path, **kwargs)
+
+    def test_reading(self):
+        with TemporaryDirectory() as dir_path:
+            resource = self.make_resource(dir_path)
+            self.assertResourceContents(resource, self.BALLOTS)
+            self.assertTrue(os.path.exists(resource.index_path))
+            self.assertEqual(resource.count(), 4)
+            self.assertEqual(resource.count_ballots(), 7)
+
+    def test_reading_slice(self):
+        with TemporaryDirectory() as dir_path:
+            resource = self.make_resource(dir_path, index_interval=2)
+            for start, stop in ((0, None), (1, 3), (2, 4), (3, 10), (4, None)):
+                with self.subTest(start=start, stop=stop):
+                    with resource.reading_slice(start, stop) as gen:
+                        ballots = list(gen)
+                    self.assertEqual(ballots, self.BALLOTS[start:stop])
+
+    def test_read_contest(self):
+        with TemporaryDirectory() as dir_path:
+            resource = self.make_resource(dir_path)
+            contest = resource.read_contest()
+            self.assertAttrs(contest, [
+                ("ballot_count", 4),
+                ("candidates", ['"Jen"', '"Alice"', '"Steve"', '"Bill"']),
+                ("name", '"My Election"'),
+                ("seat_count", 2),
+                ("withdrawn", [3]),
+            ])
+            self.assertIs(contest.ballots_resource, resource)
+
+    def test_read_contest__no_withdrawn_line(self):
+        with TemporaryDirectory() as dir_path:
+            resource = self.make_resource(dir_path, self.BLT_STRING.replace("-3\n", ""))
+            contest = resource.read_contest()
+            self.assertEqual(contest.withdrawn, [])
+            self.assertEqual(contest.ballot_count, 4)
+            self.assertResourceContents(resource, self.BALLOTS)
+
+    def test_read_contest__line_separators(self):
+        """Check that only "\\n" separates lines, as with BLTParser."""
+        blt_string = self.BLT_STRING.replace('"Alice"', '"A\u2028B"').replace(
+            '"My Election"', '"My\x85Election"')
+        with TemporaryDirectory() as dir_path:
+            resource = self.make_resource(dir_path, blt_string)
+            contest = resource.read_contest()
+            expected = BLTParser().parse(PathInfo(resource.path, encoding="utf-8"))
+        self.assertEqual(contest.candidates, expected.candidates)
+        self.assertEqual(contest.candidates[1], '"A\u2028B"')
+        self.assertEqual(contest.name, '"My\x85Election"')
+
+    def test_index__reused(self):
+        with TemporaryDirectory() as dir_path:
+            resource = self.make_resource(dir_path)
+            index = resource.get_index()
+            # Check that a new resource reads the index rather than scanning.
+            resource = BLTBallotsResource(resource.path)
+            resource.build_index = None
+            self.assertEqual(resource.get_index(), index)
+
+    def test_index__rebuilt(self):
+        """Check that the index is rebuilt when the file changes."""
+        with TemporaryDirectory() as dir_path:
+            resource = self.make_resource(dir_path)
+            resource.get_index()
+            self.make_resource(dir_path, self.BLT_STRING.replace("1 4 0\n", ""))
+            self.assertResourceContents(resource, self.BALLOTS[:3])
+
+    def test_writing(self):
+        with TemporaryDirectory() as dir_path:
+            resource = self.make_resource(dir_path)
+            with self.assertRaises(TypeError):
+                resource.writing()
@@ -0,0 +1,73 @@
+#
+# Copyright (c) 2014 Chris Jerdonek. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+from openrcv.formats.common import format_ballot_lines, iter_ballot_arrays, iter_ballot_text
+from openrcv.models import CompactBallotsResource
+from openrcv.streams import ListResource
+from openrcv.utiltest.helpers import UnitCase
+
+
+BALLOTS = [
+    (2, (1, 2)),
+    (3, ()),
+    (1, (3, 1, 2)),
+]
+
+
+def compact_resource(ballots):
+    resource = CompactBallotsResource()
+    for weight, choices in ballots:
+        resource.append_ballot(weight, choices)
+    return resource
+
+
+class ModuleTest(UnitCase):
+
+    def test_format_ballot_lines(self):
+        cases = [
+            (([], [], []), "\n", ""),
+            (([2, 3, 1], [1, 2, 3, 1, 2], [2, 2, 5]), "\n", "2 1 2\n3\n1 3 1 2\n"),
+            (([2, 3], [1, 2], [2, 2]), " 0\n", "2 1 2 0\n3 0\n"),
+            # Values that are not looked up in a table.
+            (([10], [-1, 100], [2]), "\n", "10 -1 100\n"),
+        ]
+        for args, line_end, expected in cases:
+            with self.subTest(args=args, line_end=line_end):
+                self.assertEqual(format_ballot_lines(*args, line_end=line_end), expected)
+
+    def test_iter_ballot_arrays(self):
+        expected = [
+            ([2, 3], [1, 2], [2, 2]),
+            ([1], [3, 1, 2], [3]),
+        ]
+        for resource in (ListResource(BALLOTS), compact_resource(BALLOTS)):
+            with self.subTest(resource=resource):
+                batches = iter_ballot_arrays(resource, batch_size=2)
+                actual = [tuple(map(list, batch)) for batch in batches]
+                self.assertEqual(actual, expected)
+
+    def test_iter_ballot_text(self):
+        for resource in (ListResource(BALLOTS), compact_resource(BALLOTS)):
+            for batch_size in (1, 2, 10):
+                with self.subTest(resource=resource, batch_size=batch_size):
+                    text = "".join(iter_ballot_text(resource, batch_size=batch_size))
+                    self.assertEqual(text, "2 1 2\n3\n1 3 1 2\n")
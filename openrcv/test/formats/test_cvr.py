@@ -0,0 +1,205 @@
+#
+# Copyright (c) 2014 Chris Jerdonek. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+import os
+from tempfile import TemporaryDirectory
+from textwrap import dedent
+
+from openrcv.formats.cvr import (get_rank_indices, make_choices, CellCodes, CVRFileWriter,
+                                 CVRParser, ParallelCVRParser)
+from openrcv.models import CompactBallotsResource, ContestInput
+from openrcv.parsing import ParsingError
+from openrcv.streams import ListResource, StringResource
+from openrcv.utils import PathInfo, StringInfo
+from openrcv.utiltest.helpers import UnitCase
+
+
+CVR_STRING = dedent("""\
+Ballot ID,Rank 2,Precinct,Rank 1,Rank 3
+1,Bob,P1,Alice,
+2,overvote,P1,Bob,Alice
+
+3,Carol,P2,Undervote,Alice
+4,Alice,P2,Alice,Bob
+""")
+
+CVR_BALLOTS = [
+    (1, (1, 2)),
+    (1, (2, )),
+    (1, (3, 1)),
+    (1, (1, 2)),
+]
+
+
+class ModuleTest(UnitCase):
+
+    def test_get_rank_indices(self):
+        header = ["ID", "Rank 2", "choice1", "Weight", "RANK 3 "]
+        self.assertEqual(get_rank_indices(header), [2, 1, 4])
+
+    def test_make_choices(self):
+        cases = [
+            ([1, 2], (1, 2)),
+            ([0, 2, 0, 1], (2, 1)),
+            ([2, -1, 1], (2, )),
+            ([-1, 1], ()),
+            # A repeated candidate counts only at its first rank.
+            ([2, 1, 2], (2, 1)),
+            ([1, 0, 1, -1, 2], (1, )),
+        ]
+        for codes, expected in cases:
+            with self.subTest(codes=codes):
+                self.assertEqual(make_choices(codes), expected)
+
+
+class CellCodesTest(UnitCase):
+
+    def test_getitem(self):
+        codes = CellCodes()
+        actual = [codes[value] for value in ("Bob", " ", "Alice", "Bob ", "OverVote")]
+        self.assertEqual(actual, [1, 0, 2, 1, -1])
+        self.assertEqual(codes.candidates, ["Bob", "Alice"])
+
+    def test_getitem__fixed(self):
+        codes = CellCodes(["Alice", "Bob"])
+        self.assertEqual(codes["Bob"], 2)
+        with self.assertRaises(ValueError):
+            codes["Carol"]
+
+
+class CVRParserTest(UnitCase):
+
+    def test_parse(self):
+        info = CVRParser().parse(StringInfo(CVR_STRING))
+        self.assertEqual(type(info), ContestInput)
+        self.assertEqual(info.candidates, ["Alice", "Bob", "Carol"])
+        self.assertEqual(info.ballot_count, 4)
+        self.assertIs(type(info.ballots_resource), CompactBallotsResource)
+        self.assertResourceContents(info.ballots_resource, CVR_BALLOTS)
+
+    def test_parse__batches(self):
+        ballots_resource = ListResource()
+        parser = CVRParser(ballots_resource, batch_size=1)
+        info = parser.parse(StringInfo(CVR_STRING))
+        self.assertIs(info.ballots_resource, ballots_resource)
+        self.assertResourceContents(ballots_resource, CVR_BALLOTS)
+
+    def test_parse__candidates(self):
+        parser = CVRParser(candidates=["Carol", "Bob", "Alice"])
+        info = parser.parse(StringInfo(CVR_STRING))
+        self.assertEqual(info.candidates, ["Carol", "Bob", "Alice"])
+        self.assertResourceContents(info.ballots_resource,
+                                    [(1, (3, 2)), (1, (2, )), (1, (1, 3)), (1, (3, 2))])
+
+    def test_parse__weight(self):
+        cvr_string = "Rank 1,weight\nAlice,3\nBob,1\n"
+        info = CVRParser().parse(StringInfo(cvr_string))
+        self.assertResourceContents(info.ballots_resource, [(3, (1, )), (1, (2, ))])
+
+    def test_parse__error(self):
+        parser = CVRParser(candidates=["Alice", "Bob"])
+        with self.assertRaises(ParsingError) as cm:
+            parser.parse(StringInfo(CVR_STRING))
+        self.assertEqual(str(cm.exception.__context__),
+                         "error while parsing line 5: ['3', 'Carol', 'P2', 'Undervote', 'Alice']")
+
+    def test_parse__path(self):
+        """Check that line breaks in quoted cells are read unchanged."""
+        parser = CVRParser()
+        with TemporaryDirectory() as dirname:
+            path = os.path.join(dirname, "cvr.csv")
+            with open(path, "wb") as f:
+                f.write(b'Rank 1,Rank 2\r\n"Bob\r\nSmith",Alice\r\n')
+            info = parser.parse(PathInfo(path, encoding="utf-8"))
+        self.assertEqual(info.candidates, ["Bob\r\nSmith", "Alice"])
+        self.assertResourceContents(info.ballots_resource, [(1, (1, 2))])
+
+    def test_parse__no_rank_columns(self):
+        with self.assertRaises(ParsingError):
+            CVRParser().parse(StringInfo("Ballot ID\n1\n"))
+
+
+class ParallelCVRParserTest(UnitCase):
+
+    def parse_cvr(self, cvr_string, **kwargs):
+        parser = ParallelCVRParser(processes=2, chunk_size=1, **kwargs)
+        with TemporaryDirectory() as dirname:
+            path = os.path.join(dirname, "cvr.csv")
+            with open(path, "w") as f:
+                f.write(cvr_string)
+            return parser.parse(PathInfo(path, encoding="utf-8"))
+
+    def test_parse(self):
+        info = self.parse_cvr(CVR_STRING)
+        self.assertEqual(info.candidates, ["Alice", "Bob", "Carol"])
+        self.assertEqual(info.ballot_count, 4)
+        self.assertResourceContents(info.ballots_resource, CVR_BALLOTS)
+
+    def test_parse__list_resource(self):
+        info = self.parse_cvr(CVR_STRING, ballots_resource=ListResource())
+        self.assertResourceContents(info.ballots_resource, CVR_BALLOTS)
+
+    def test_parse__in_memory(self):
+        parser = ParallelCVRParser(processes=2, chunk_size=1)
+        info = parser.parse(StringInfo(CVR_STRING))
+        self.assertResourceContents(info.ballots_resource, CVR_BALLOTS)
+
+    def test_parse__error(self):
+        with self.assertRaises(ParsingError) as cm:
+            self.parse_cvr(CVR_STRING, candidates=["Alice", "Bob"])
+        self.assertEqual(str(cm.exception.__context__),
+                         "error while parsing line 5: ['3', 'Carol', 'P2', 'Undervote', 'Alice']")
+
+
+class CVRFileWriterTest(UnitCase):
+
+    def test_write_contest(self):
+        contest = ContestInput(name="Foo", candidates=["A", "B, Jr.", "C"])
+        contest.ballots_resource = ListResource([(2, (2, 1)), (1, ())])
+        resource = StringResource()
+        CVRFileWriter(resource).write_contest(contest)
+        expected = dedent("""\
+        Weight,Rank 1,Rank 2,Rank 3
+        2,"B, Jr.",A,
+        1,,,
+        """)
+        self.assertEqual(resource.contents, expected)
+
+    def test_write_contest__blt_names(self):
+        """Check writing names with the quotes left by BLTParser."""
+        contest = ContestInput(name='"Foo"', candidates=['"A"', '"B, Jr."'])
+        contest.ballots_resource = ListResource([(1, (2, 1))])
+        resource = StringResource()
+        CVRFileWriter(resource).write_contest(contest)
+        expected = dedent("""\
+        Weight,Rank 1,Rank 2
+        1,"B, Jr.",A
+        """)
+        self.assertEqual(resource.contents, expected)
+
+    def test_write_contest__round_trip(self):
+        contest = ContestInput(candidates=["A", "B", "C"])
+        contest.ballots_resource = ListResource([(2, (2, 1)), (1, (3, ))])
+        resource = StringResource()
+        CVRFileWriter(resource).write_contest(contest)
+        info = CVRParser(candidates=contest.candidates).parse(StringInfo(resource.contents))
+        self.assertResourceContents(info.ballots_resource, [(2, (2, 1)), (1, (3, ))])
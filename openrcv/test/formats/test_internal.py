@@ -20,7 +20,8 @@
 # DEALINGS IN THE SOFTWARE.
 #
 
-from openrcv.formats.internal import internal_ballots_resource, parse_internal_ballot, to_internal_ballot
+from openrcv.formats.internal import (internal_ballots_resource, parse_internal_ballot,
+                                      parse_internal_ballots, to_internal_ballot)
 from openrcv.streams import StringResource
 from openrcv.utiltest.helpers import UnitCase
 
@@ -44,6 +45,33 @@ class ModuleTest(UnitCase):
             parse_internal_ballot("f 2 \n")
 
 
+    def test_parse_internal_ballots(self):
+        cases = [
+            ([], ([], [], [])),
+            (["2 1 3", "1", " 3 2 \n"], ([2, 1, 3], [1, 3, 2], [2, 2, 3])),
+            # Zeros and blank lines are parsed one line at a time.
+            (["0 1 2", "1 0"], ([0, 1], [1, 2, 0], [2, 3])),
+            (["2 1", "1 2\n3"], ([2, 1], [1, 2, 3], [1, 3])),
+        ]
+        for lines, expected in cases:
+            with self.subTest(lines=lines):
+                self.assertEqual(parse_internal_ballots(lines), expected)
+
+    def test_parse_internal_ballots__same_as_parse_internal_ballot(self):
+        lines = ["2 1 3", "1", "-1 +2"]
+        weights, choices, ends = parse_internal_ballots(lines)
+        starts = [0] + ends[:-1]
+        actual = [(weight, tuple(choices[start:end]))
+                  for weight, start, end in zip(weights, starts, ends)]
+        self.assertEqual(actual, [parse_internal_ballot(line) for line in lines])
+
+    def test_parse_internal_ballots__error(self):
+        for lines in (["1 2", "1 a"], ["1", " "]):
+            with self.subTest(lines=lines):
+                with self.assertRaises((ValueError, StopIteration)):
+                    parse_internal_ballots(lines)
+
+
 class InternalBallotsResourceTest(UnitCase):
 
     def test_reading(self):
@@ -0,0 +1,141 @@
+#
+# Copyright (c) 2014 Chris Jerdonek. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+import os
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from openrcv.formats import multifile
+from openrcv.formats.multifile import make_path_resource, MultiFileBallotsResource
+from openrcv.models import BallotStats
+from openrcv.streams import ListResource
+from openrcv.utiltest.helpers import UnitCase
+
+
+FILE_CONTENTS = [
+    ("precinct1.txt", "1 2\n2 1 3\n"),
+    ("precinct2.txt", "1\n"),
+    ("precinct3.txt", "3 2\n1 1 3\n"),
+]
+
+
+class MultiFileBallotsResourceTest(UnitCase):
+
+    def write_files(self, dir_path):
+        for name, contents in FILE_CONTENTS:
+            with open(os.path.join(dir_path, name), "w") as f:
+                f.write(contents)
+
+    def make_resource(self, dir_path, **kwargs):
+        self.write_files(dir_path)
+        return MultiFileBallotsResource.from_dir(dir_path, **kwargs)
+
+    def test_from_glob(self):
+        with TemporaryDirectory() as dir_path:
+            self.write_files(dir_path)
+            resource = MultiFileBallotsResource.from_glob(os.path.join(dir_path, "*[13].txt"))
+            self.assertEqual([os.path.basename(p) for p in resource.paths],
+                             ["precinct1.txt", "precinct3.txt"])
+
+    def test_reading(self):
+        expected = [(1, (2, )), (2, (1, 3)), (1, ()), (3, (2, )), (1, (1, 3))]
+        for prefetch in (True, False):
+            with self.subTest(prefetch=prefetch):
+                with TemporaryDirectory() as dir_path:
+                    resource = self.make_resource(dir_path, prefetch=prefetch)
+                    self.assertResourceContents(resource, expected)
+
+    def test_reading__closes(self):
+        """Check that stopping early closes the generator."""
+        with TemporaryDirectory() as dir_path:
+            resource = self.make_resource(dir_path)
+            with resource.reading() as gen:
+                next(gen)
+            self.assertGeneratorClosed(gen)
+
+    def test_reading__prefetch_bounded(self):
+        """Check that prefetching reads ahead in batches rather than files."""
+        opened = []
+
+        def make_resource(path):
+            opened.append(os.path.basename(path))
+            return make_path_resource(path)
+
+        with TemporaryDirectory() as dir_path:
+            with open(os.path.join(dir_path, "a.txt"), "w") as f:
+                f.write("1 2\n" * 100)
+            with open(os.path.join(dir_path, "b.txt"), "w") as f:
+                f.write("1 1\n")
+            resource = MultiFileBallotsResource.from_dir(dir_path)
+            with patch.object(multifile, "make_path_resource", make_resource), \
+                    patch("openrcv.streams.READ_AHEAD_BATCH_SIZE", 1), \
+                    patch("openrcv.streams.READ_AHEAD_MAX_BATCHES", 1):
+                with resource.reading() as gen:
+                    self.assertEqual(next(gen), (1, (2, )))
+                self.assertGeneratorClosed(gen)
+        self.assertEqual(opened, ["a.txt"])
+
+    def test_reading__error(self):
+        with TemporaryDirectory() as dir_path:
+            resource = self.make_resource(dir_path)
+            with open(resource.paths[1], "w") as f:
+                f.write("1 a\n")
+            with self.assertRaises(ValueError):
+                with resource.reading() as gen:
+                    list(gen)
+
+    def test_count_ballots(self):
+        for processes in (1, 2):
+            with self.subTest(processes=processes):
+                with TemporaryDirectory() as dir_path:
+                    resource = self.make_resource(dir_path, processes=processes)
+                    self.assertEqual(resource.count_ballots(), 8)
+
+    def test_stats(self):
+        with TemporaryDirectory() as dir_path:
+            resource = self.make_resource(dir_path, processes=2)
+            self.assertEqual(resource.stats(), BallotStats(5, 8, 1))
+
+    def test_normalize_to(self):
+        with TemporaryDirectory() as dir_path:
+            resource = self.make_resource(dir_path, processes=2)
+            target = ListResource()
+            resource.normalize_to(target)
+            self.assertResourceContents(target, [(1, ()), (3, (1, 3)), (4, (2, ))])
+
+    def test_normalize(self):
+        with TemporaryDirectory() as dir_path:
+            resource = self.make_resource(dir_path)
+            with self.assertRaises(TypeError):
+                resource.normalize()
+
+    def test_make_path_resource__bad_extension(self):
+        with self.assertRaises(ValueError):
+            make_path_resource("ballots.foo")
+
+    def test_reading__blt(self):
+        with TemporaryDirectory() as dir_path:
+            self.write_files(dir_path)
+            with open(os.path.join(dir_path, "precinct4.blt"), "w") as f:
+                f.write('2 1\n-1\n2 1 2 0\n0\n"A"\n"B"\n"Title"\n')
+            resource = MultiFileBallotsResource.from_glob(os.path.join(dir_path, "*[34].*"))
+            self.assertResourceContents(resource, [(3, (2, )), (1, (1, 3)), (2, (1, 2))])
@@ -21,10 +21,16 @@
 #
 
 from argparse2 import ArgumentParser
+from contextlib import redirect_stdout
+from io import StringIO
 import os
+from tempfile import TemporaryDirectory
+from textwrap import dedent
 
+from openrcv import cache
 from openrcv.scripts.argparse import HelpRequested, UsageException
 from openrcv.scripts.rcv import create_argparser, RcvArgumentParser
+from openrcv.scripts.run import non_exiting_main
 from openrcv.utiltest.helpers import UnitCase
 
 
@@ -162,3 +168,103 @@ class ArgumentParserTest(UnitCase):
         # Test invalid value.
         with self.assertRaises(UsageException):
             self.parse_log_level(['--log-level', 'foo'])
+
+
+class ConvertCommandTest(UnitCase):
+
+    BLT_STRING = dedent("""\
+    3 1
+    -2
+    1 3 0
+    2 1 0
+    1 3 0
+    0
+    "A"
+    "B"
+    "C"
+    "Contest"
+    """)
+
+    def convert(self, *args):
+        """Run the convert command, and return the exit status and stdout."""
+        stdout = StringIO()
+        with open(os.devnull, "w") as log_file:
+            status = non_exiting_main(create_argparser(), ["rcv", "--log-level", "ERROR",
+                                      "convert"] + list(args), stdout=stdout,
+                                      log_file=log_file)
+        return status, stdout.getvalue()
+
+    def write_blt(self, dir_path):
+        path = os.path.join(dir_path, "input.blt")
+        with open(path, "w") as f:
+            f.write(self.BLT_STRING)
+        return path
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def test_convert(self):
+        with TemporaryDirectory() as dir_path:
+            input_path = self.write_blt(dir_path)
+            output_path = os.path.join(dir_path, "output.txt")
+            status, stdout = self.convert(input_path, output_path)
+            self.assertEqual(status, 0)
+            self.assertStartsWith(stdout, "converted 3 ballots in ")
+            self.assertEqual(self.read(output_path), "1 3\n2 1\n1 3\n")
+
+    def test_convert__normalize(self):
+        with TemporaryDirectory() as dir_path:
+            input_path = self.write_blt(dir_path)
+            output_path = os.path.join(dir_path, "output")
+            status, stdout = self.convert(input_path, output_path,
+                                          "--to", "blt", "--normalize")
+            self.assertEqual(status, 0)
+            self.assertEqual(self.read(output_path),
+                             self.BLT_STRING.replace("1 3 0\n2 1 0\n1 3 0", "2 1 0\n2 3 0"))
+
+    def test_convert__round_trip(self):
+        """Check converting to a CVR file and back."""
+        with TemporaryDirectory() as dir_path:
+            input_path = self.write_blt(dir_path)
+            cvr_path = os.path.join(dir_path, "cvr.csv")
+            output_path = os.path.join(dir_path, "output.txt")
+            self.convert(input_path, cvr_path)
+            status, stdout = self.convert(cvr_path, output_path)
+            self.assertEqual(status, 0)
+            # The CVR numbers candidates in order of appearance.
+            self.assertEqual(self.read(output_path), "1 1\n2 2\n1 1\n")
+
+    def test_convert__unknown_extension(self):
+        with TemporaryDirectory() as dir_path:
+            input_path = self.write_blt(dir_path)
+            status, stdout = self.convert(input_path,
+                                          os.path.join(dir_path, "output.foo"))
+            self.assertEqual(status, 2)
+
+
+class CountCommandTest(UnitCase):
+
+    def count(self, dir_path, *args):
+        """Run the count command on a BLT file, and return the exit status."""
+        with open(os.path.join(dir_path, "input.blt"), "w") as f:
+            f.write(ConvertCommandTest.BLT_STRING)
+        config_path = os.path.join(dir_path, "contests.yaml")
+        with open(config_path, "w") as f:
+            f.write("openrcv:\n  contests:\n    - file: input.blt\n")
+        with open(os.devnull, "w") as log_file, redirect_stdout(StringIO()):
+            return non_exiting_main(create_argparser(), ["rcv", "--log-level", "ERROR",
+                                    "count", config_path] + list(args), stdout=StringIO(),
+                                    log_file=log_file)
+
+    def test_count__cache_dir(self):
+        with TemporaryDirectory() as dir_path:
+            cache_dir = os.path.join(dir_path, "cache")
+            self.assertEqual(self.count(dir_path, "--cache-dir", cache_dir), 0)
+            self.assertIn(cache.INDEX_FILE_NAME, os.listdir(cache_dir))
+
+    def test_count__no_cache(self):
+        with TemporaryDirectory() as dir_path:
+            cache_dir = os.path.join(dir_path, "cache")
+            self.assertEqual(self.count(dir_path, "--cache-dir", cache_dir, "--no-cache"), 0)
+            self.assertFalse(os.path.exists(cache_dir))
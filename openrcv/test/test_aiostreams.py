@@ -0,0 +1,181 @@
+#
+# Copyright (c) 2014 Chris Jerdonek. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+import asyncio
+import os
+from tempfile import TemporaryDirectory
+
+from openrcv.aiostreams import SyncResource
+from openrcv.formats.multifile import MultiFileBallotsResource
+from openrcv.streams import FilePathResource, ListResource
+from openrcv.utiltest.helpers import UnitCase
+
+
+class _Exception(Exception):
+    pass
+
+
+async def _read_all(resource, **kwargs):
+    async with resource.areading(**kwargs) as agen:
+        return [item async for item in agen]
+
+
+async def _write_all(resource, items, **kwargs):
+    async with resource.awriting(**kwargs) as writer:
+        for item in items:
+            await writer.send(item)
+
+
+class AsyncReadingTest(UnitCase):
+
+    def test_list(self):
+        resource = ListResource(list(range(5)))
+        items = asyncio.run(_read_all(resource, batch_size=2))
+        self.assertEqual(items, [0, 1, 2, 3, 4])
+
+    def test_list__batch_multiple(self):
+        resource = ListResource(list(range(4)))
+        items = asyncio.run(_read_all(resource, batch_size=2))
+        self.assertEqual(items, [0, 1, 2, 3])
+
+    def test_file(self):
+        with TemporaryDirectory() as dirname:
+            path = os.path.join(dirname, "temp.txt")
+            with open(path, "w") as f:
+                f.write("a\nb\n")
+            resource = FilePathResource(path)
+            items = asyncio.run(_read_all(resource))
+        self.assertEqual(items, ["a\n", "b\n"])
+
+    def test_multifile(self):
+        with TemporaryDirectory() as dirname:
+            paths = []
+            for name, text in (("a.txt", "1 2\n"), ("b.txt", "3 1 2\n")):
+                path = os.path.join(dirname, name)
+                with open(path, "w") as f:
+                    f.write(text)
+                paths.append(path)
+            resource = MultiFileBallotsResource(paths, processes=1)
+            items = asyncio.run(_read_all(resource))
+        self.assertEqual(items, [(1, (2, )), (3, (1, 2))])
+
+    def test_concurrent(self):
+        resources = [ListResource([i] * 3) for i in range(3)]
+
+        async def read_all():
+            return await asyncio.gather(*(_read_all(r, batch_size=1) for r in resources))
+
+        results = asyncio.run(read_all())
+        self.assertEqual(results, [[0, 0, 0], [1, 1, 1], [2, 2, 2]])
+
+    def test_exception(self):
+        """Check that exceptions are annotated as in the sync API."""
+        resource = ListResource(["a", "b"])
+
+        async def read():
+            async with resource.areading() as agen:
+                async for item in agen:
+                    raise _Exception()
+
+        with self.assertRaises(_Exception) as cm:
+            asyncio.run(read())
+        self.assertEndsWith(str(cm.exception), "(number=1): 'a'")
+
+
+class AsyncWritingTest(UnitCase):
+
+    def test_list(self):
+        resource = ListResource()
+        asyncio.run(_write_all(resource, range(5), batch_size=2))
+        self.assertResourceContents(resource, [0, 1, 2, 3, 4])
+
+    def test_file(self):
+        with TemporaryDirectory() as dirname:
+            path = os.path.join(dirname, "temp.txt")
+            resource = FilePathResource(path)
+            asyncio.run(_write_all(resource, ["a\n", "b\n"]))
+            with open(path) as f:
+                self.assertEqual(f.read(), "a\nb\n")
+
+    def test_send_batch(self):
+        resource = ListResource()
+
+        async def write():
+            async with resource.awriting() as writer:
+                await writer.send(0)
+                await writer.send_batch([1, 2])
+
+        asyncio.run(write())
+        self.assertResourceContents(resource, [0, 1, 2])
+
+
+    def test_write_error(self):
+        """Check that an error writing the buffered items propagates."""
+        class FailingResource(ListResource):
+            def write_many(self, stream, items):
+                raise _Exception("write failed")
+
+        resource = FailingResource()
+        with self.assertRaises(_Exception) as cm:
+            asyncio.run(_write_all(resource, ["a", "b"], batch_size=5))
+        self.assertEqual(str(cm.exception), "write failed")
+
+    def test_body_error(self):
+        """Check that an error in the body propagates after flushing."""
+        resource = ListResource()
+
+        async def write():
+            async with resource.awriting(batch_size=5) as writer:
+                await writer.send("a")
+                raise _Exception("body failed")
+
+        with self.assertRaises(_Exception) as cm:
+            asyncio.run(write())
+        self.assertEqual(str(cm.exception), "body failed")
+
+
+class SyncResourceTest(UnitCase):
+
+    def test_reading(self):
+        resource = SyncResource(ListResource(["a", "b"]))
+        with resource.reading() as gen:
+            items = list(gen)
+        self.assertEqual(items, ["a", "b"])
+
+    def test_reading__exception(self):
+        resource = SyncResource(ListResource(["a", "b"]))
+        with self.assertRaises(_Exception):
+            with resource.reading() as gen:
+                next(gen)
+                raise _Exception()
+
+    def test_writing(self):
+        backing = ListResource()
+        resource = SyncResource(backing)
+        with resource.writing() as gen:
+            gen.send("a")
+            gen.send("b")
+        self.assertResourceContents(backing, ["a", "b"])
+
+    def test_count(self):
+        resource = SyncResource(ListResource(["a", "b", "c"]))
+        self.assertEqual(resource.count(), 3)
@@ -0,0 +1,242 @@
+#
+# Copyright (c) 2014 Chris Jerdonek. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+from concurrent.futures import ProcessPoolExecutor
+import fcntl
+from functools import partial
+import os
+from tempfile import TemporaryDirectory
+from textwrap import dedent
+from unittest.mock import patch
+
+from openrcv import cache
+from openrcv.cache import ConversionCache
+from openrcv.utiltest.helpers import UnitCase
+
+
+BLT_STRING = dedent("""\
+4 2
+-3
+2 2 0
+1 2 4 3 1 0
+1 3 0
+0
+"Jen"
+"Alice"
+"Steve"
+"Bill"
+"My Election"
+""")
+
+
+def _load_blt(cache_dir, path):
+    ConversionCache(cache_dir).load_blt(path)
+
+
+class ConversionCacheTest(UnitCase):
+
+    def write_blt(self, dir_path, name="input.blt", text=BLT_STRING):
+        path = os.path.join(dir_path, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def test_load_blt(self):
+        with TemporaryDirectory() as dir_path:
+            blt_path = self.write_blt(dir_path)
+            conversion_cache = ConversionCache(os.path.join(dir_path, "cache"))
+            contest = conversion_cache.load_blt(blt_path)
+            self.assertAttrs(contest, [
+                ("ballot_count", 3),
+                ("candidates", ['"Jen"', '"Alice"', '"Steve"', '"Bill"']),
+                ("name", '"My Election"'),
+                ("seat_count", 2),
+                ("withdrawn", [3]),
+            ])
+            self.assertResourceContents(contest.ballots_resource,
+                                        [(2, (2, )), (1, (2, 4, 3, 1)), (1, (3, ))])
+
+    def test_load_blt__skips_parsing(self):
+        """Check that a second load uses the cache rather than parsing."""
+        with TemporaryDirectory() as dir_path:
+            blt_path = self.write_blt(dir_path)
+            conversion_cache = ConversionCache(os.path.join(dir_path, "cache"))
+            conversion_cache.load_blt(blt_path)
+            with patch('openrcv.cache.BLTParser.parse') as mock_parse:
+                with patch('openrcv.cache.hash_file') as mock_hash:
+                    contest = conversion_cache.load_blt(blt_path)
+            self.assertFalse(mock_parse.called)
+            # The mtime and size precheck means the file isn't rehashed.
+            self.assertFalse(mock_hash.called)
+            self.assertEqual(contest.ballot_count, 3)
+
+    def test_load_blt__content_addressed(self):
+        """Check that files with the same contents share an entry."""
+        with TemporaryDirectory() as dir_path:
+            path1 = self.write_blt(dir_path, name="input1.blt")
+            path2 = self.write_blt(dir_path, name="input2.blt")
+            conversion_cache = ConversionCache(os.path.join(dir_path, "cache"))
+            conversion_cache.load_blt(path1)
+            conversion_cache.load_blt(path2)
+            entries = conversion_cache.entries()
+            self.assertEqual(len(entries), 1)
+            self.assertEqual(len(entries[0].paths), 2)
+
+    def test_load_blt__normalize(self):
+        with TemporaryDirectory() as dir_path:
+            blt_path = self.write_blt(dir_path)
+            conversion_cache = ConversionCache(os.path.join(dir_path, "cache"))
+            conversion_cache.load_blt(blt_path)
+            contest = conversion_cache.load_blt(blt_path, normalize=True)
+            self.assertResourceContents(contest.ballots_resource,
+                                        [(2, (2, )), (1, (2, 4, 3, 1)), (1, (3, ))])
+
+    def test_load_blt__parses_unlocked(self):
+        """Check that the index lock is not held while parsing."""
+        with TemporaryDirectory() as dir_path:
+            blt_path = self.write_blt(dir_path)
+            conversion_cache = ConversionCache(os.path.join(dir_path, "cache"))
+            os.makedirs(conversion_cache.cache_dir)
+            write_entry = conversion_cache._write_entry
+            def _write_entry(*args, **kwargs):
+                # Check that another process could take the lock.
+                with open(conversion_cache.lock_path, "a") as f:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return write_entry(*args, **kwargs)
+            with patch.object(conversion_cache, "_write_entry", _write_entry):
+                contest = conversion_cache.load_blt(blt_path)
+            self.assertEqual(contest.ballot_count, 3)
+
+    def test_load_blt__version(self):
+        """Check that entries from another openrcv version are not used."""
+        with TemporaryDirectory() as dir_path:
+            blt_path = self.write_blt(dir_path)
+            conversion_cache = ConversionCache(os.path.join(dir_path, "cache"))
+            conversion_cache.load_blt(blt_path)
+            with patch("openrcv.__version__", "0.0.0"):
+                conversion_cache.load_blt(blt_path)
+            entries = conversion_cache.entries()
+            self.assertEqual(len(entries), 2)
+            self.assertEqual(entries[0].digest, entries[1].digest)
+            self.assertNotEqual(entries[0].key, entries[1].key)
+
+    def test_load_cvr(self):
+        with TemporaryDirectory() as dir_path:
+            cvr_path = self.write_blt(dir_path, name="input.csv",
+                                      text="Rank 1,Rank 2\nBob,Alice\nAlice,\n")
+            conversion_cache = ConversionCache(os.path.join(dir_path, "cache"))
+            conversion_cache.load_cvr(cvr_path)
+            contest = conversion_cache.load_cvr(cvr_path)
+            self.assertEqual(conversion_cache.entries()[0].parser, "openrcv.formats.cvr.CVRParser")
+            self.assertEqual(contest.candidates, ["Bob", "Alice"])
+            self.assertResourceContents(contest.ballots_resource, [(1, (1, 2)), (1, (2, ))])
+
+    def test_shrink(self):
+        """Check that least-recently-used entries are evicted first."""
+        with TemporaryDirectory() as dir_path:
+            path1 = self.write_blt(dir_path, name="input1.blt")
+            path2 = self.write_blt(dir_path, name="input2.blt",
+                                   text=BLT_STRING.replace("1 3 0", "2 3 0"))
+            with ConversionCache(os.path.join(dir_path, "cache")) as conversion_cache:
+                conversion_cache.load_blt(path1)
+                conversion_cache.load_blt(path2)
+            oldest, newest = reversed(conversion_cache.entries())
+            conversion_cache.shrink(newest.size)
+            entries = conversion_cache.entries()
+            self.assertEqual([e.digest for e in entries], [newest.digest])
+            self.assertEqual(oldest.digest, cache.hash_file(path1))
+            self.assertFalse(os.path.exists(conversion_cache.entry_dir(oldest.key)))
+
+    def test_shrink__pinned(self):
+        """Check that entries in use are not evicted."""
+        with TemporaryDirectory() as dir_path:
+            path1 = self.write_blt(dir_path, name="input1.blt")
+            path2 = self.write_blt(dir_path, name="input2.blt",
+                                   text=BLT_STRING.replace("1 3 0", "2 3 0"))
+            cache_dir = os.path.join(dir_path, "cache")
+            with ConversionCache(cache_dir) as cache1:
+                contest = cache1.load_blt(path1)
+                # Loading with a maximum size of zero would evict the first entry.
+                with ConversionCache(cache_dir, max_size=0) as cache2:
+                    cache2.load_blt(path2)
+                    self.assertEqual(len(cache2.entries()), 2)
+                self.assertResourceContents(contest.ballots_resource,
+                                            [(2, (2, )), (1, (2, 4, 3, 1)), (1, (3, ))])
+            ConversionCache(cache_dir).shrink(0)
+            self.assertEqual(ConversionCache(cache_dir).entries(), [])
+
+    def test_purge(self):
+        with TemporaryDirectory() as dir_path:
+            blt_path = self.write_blt(dir_path)
+            with ConversionCache(os.path.join(dir_path, "cache")) as conversion_cache:
+                conversion_cache.load_blt(blt_path)
+            conversion_cache.purge()
+            self.assertEqual(conversion_cache.entries(), [])
+            self.assertEqual(sorted(os.listdir(conversion_cache.cache_dir)),
+                             [cache.INDEX_FILE_NAME, cache.LOCK_FILE_NAME])
+
+    def test_load_blt__concurrent(self):
+        """Check that concurrent processes do not lose each other's entries."""
+        with TemporaryDirectory() as dir_path:
+            paths = [self.write_blt(dir_path, name="input%d.blt" % i,
+                                    text=BLT_STRING.replace("1 3 0", "%d 3 0" % i))
+                     for i in range(1, 9)]
+            cache_dir = os.path.join(dir_path, "cache")
+            with ProcessPoolExecutor(max_workers=4) as executor:
+                list(executor.map(partial(_load_blt, cache_dir), paths))
+            entries = ConversionCache(cache_dir).entries()
+            self.assertEqual(sorted(e.digest for e in entries),
+                             sorted(cache.hash_file(path) for path in paths))
+
+
+class DefaultCacheDirTest(UnitCase):
+
+    def test_env_var(self):
+        with patch.dict(os.environ, {cache.CACHE_DIR_ENV_VAR: "/foo",
+                                     "XDG_CACHE_HOME": "/bar"}):
+            self.assertEqual(cache.default_cache_dir(), "/foo")
+
+    def test_xdg_cache_home(self):
+        with patch.dict(os.environ, {"XDG_CACHE_HOME": "/bar"}):
+            os.environ.pop(cache.CACHE_DIR_ENV_VAR, None)
+            self.assertEqual(cache.default_cache_dir(), os.path.join("/bar", "openrcv"))
+
+    def test_home(self):
+        with patch.dict(os.environ, {"HOME": "/baz"}):
+            os.environ.pop(cache.CACHE_DIR_ENV_VAR, None)
+            os.environ.pop("XDG_CACHE_HOME", None)
+            self.assertEqual(cache.default_cache_dir(),
+                             os.path.join("/baz", ".cache", "openrcv"))
+
+
+class CacheDisabledTest(UnitCase):
+
+    def test_cache_disabled(self):
+        cases = [({}, False),
+                 ({cache.NO_CACHE_ENV_VAR: ""}, False),
+                 ({cache.NO_CACHE_ENV_VAR: "1"}, True)]
+        for env, expected in cases:
+            with self.subTest(env=env):
+                with patch.dict(os.environ, env):
+                    if not env:
+                        os.environ.pop(cache.NO_CACHE_ENV_VAR, None)
+                    self.assertIs(cache.cache_disabled(), expected)
@@ -23,7 +23,8 @@
 from textwrap import dedent
 import unittest
 
-from openrcv.counting import get_lowest, get_majority, get_winner
+from openrcv.counting import (count_irv_contest, get_lowest, get_majority, get_winner,
+                              make_engines)
 from openrcv.models import RoundResults
 from openrcv.utils import StringInfo
 from openrcv.utiltest.helpers import UnitCase
@@ -70,6 +71,11 @@ class ModuleTest(UnitCase):
             with self.subTest(totals=totals, winner=winner):
                 self.assertEqual(get_winner(totals), winner)
 
+    def test_make_engines(self):
+        engines = make_engines()
+        self.assertIs(engines["irv"].func, count_irv_contest)
+        self.assertEqual(str(engines["irv"]), '"irv" (instant-runoff voting)')
+
     def test_get_lowest__no_totals(self):
         """Test passing an empty totals dict."""
         with self.assertRaises(ValueError):
@@ -0,0 +1,66 @@
+#
+# Copyright (c) 2014 Chris Jerdonek. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+import os
+from tempfile import TemporaryDirectory
+
+from openrcv.jcblobs import BallotBlobStore
+from openrcv.jcmodels import JsonCaseBallots
+from openrcv.utiltest.helpers import UnitCase
+
+
+class BallotBlobStoreTest(UnitCase):
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.store = BallotBlobStore.for_tests_dir(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_put_and_get(self):
+        ref = self.store.put(["2 1 2", "1 2"])
+        self.assertEqual(len(ref), 64)
+        with open(self.store.blob_path(ref)) as f:
+            self.assertEqual(f.read(), "2 1 2\n1 2\n")
+        self.assertEqual(self.store.get(ref).to_jsobj(), ["2 1 2", "1 2"])
+
+    def test_put__same_ballots(self):
+        """Check that equal ballots are stored once."""
+        ref = self.store.put(["2 1 2", "1 2"])
+        self.assertEqual(self.store.put(JsonCaseBallots.from_jsobj(["2 1 2", "1 2"])), ref)
+        # The ballot strings are parsed, so spacing does not matter.
+        self.assertEqual(self.store.put(["2  1 2", "1 2"]), ref)
+        self.assertNotEqual(self.store.put(["1 2", "2 1 2"]), ref)
+        self.assertEqual(len(os.listdir(self.store.dir_path)), 2)
+
+    def test_put__empty(self):
+        ref = self.store.put([])
+        self.assertEqual(len(self.store.get(ref)), 0)
+
+    def test_prune(self):
+        self.assertEqual(self.store.refs(), set())
+        ref1 = self.store.put(["1 1"])
+        ref2 = self.store.put(["1 2"])
+        self.assertEqual(self.store.refs(), {ref1, ref2})
+        self.store.prune([ref2])
+        self.assertEqual(self.store.refs(), {ref2})
@@ -0,0 +1,94 @@
+#
+# Copyright (c) 2014 Chris Jerdonek. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+import json
+import os
+from tempfile import TemporaryDirectory
+
+from openrcv import jsonlib
+from openrcv.jcindex import JsonTestsFileIndex
+from openrcv.utiltest.helpers import UnitCase
+
+
+def make_test(index, contest_id, ballots):
+    return {"_meta": {"index": index},
+            "input": {"_meta": {"id": contest_id, "name": "Café"},
+                      "ballots": ballots, "candidate_count": 2}}
+
+
+class JsonTestsFileIndexTest(UnitCase):
+
+    TESTS_FILE = {
+        "_meta": {"rule_set": "test", "version": "0.1"},
+        "test_cases": [
+            make_test(1, "aaaa", ["1 1"]),
+            make_test(2, "bbbb", ["2 1 2", "1 2"]),
+            make_test(3, "aaaa", ["3 2"]),
+        ]
+    }
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "test.json")
+        jsonlib.write_json(self.TESTS_FILE, path=self.path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_read_test(self):
+        tests_index = JsonTestsFileIndex(self.path)
+        for index in (3, 1, 2):
+            with self.subTest(index=index):
+                test = tests_index.read_test(index)
+                self.assertEqual(test.to_jsobj(), self.TESTS_FILE["test_cases"][index - 1])
+        self.assertTrue(os.path.exists(tests_index.index_path))
+
+    def test_read_test__missing(self):
+        with self.assertRaises(KeyError):
+            JsonTestsFileIndex(self.path).read_test(4)
+
+    def test_read_tests_for_contest(self):
+        tests = JsonTestsFileIndex(self.path).read_tests_for_contest("aaaa")
+        self.assertEqual([test.index for test in tests], [1, 3])
+        self.assertEqual(JsonTestsFileIndex(self.path).read_tests_for_contest("cccc"), [])
+
+    def test_non_ascii(self):
+        """Check that the ranges are byte ranges if the file is not ASCII."""
+        test = make_test(1, "é", ["1 1"])
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(jsonlib.call_json(json.dumps, {"test_cases": [test, test]},
+                                      ensure_ascii=False))
+        tests = JsonTestsFileIndex(self.path).read_tests_for_contest("é")
+        self.assertEqual([test.to_jsobj() for test in tests], [test, test])
+
+    def test_get_index__file_changed(self):
+        tests_index = JsonTestsFileIndex(self.path)
+        tests_index.get_index()
+        tests_file = dict(self.TESTS_FILE, test_cases=[make_test(5, "cccc", ["1 2"])])
+        jsonlib.write_json(tests_file, path=self.path)
+        # Make sure the modification time differs.
+        stat = os.stat(self.path)
+        os.utime(self.path, (stat.st_atime, stat.st_mtime + 1))
+        self.assertEqual(tests_index.read_test(5).input.id, "cccc")
+        # A new object reads the rebuilt index from disk.
+        with self.assertRaises(KeyError):
+            JsonTestsFileIndex(self.path).read_test(1)
@@ -21,9 +21,14 @@
 #
 
 from contextlib import contextmanager
+import json
+import os
+from tempfile import TemporaryDirectory
 from unittest.mock import patch, MagicMock
 
-from openrcv import jcmanage, models, streams
+from openrcv import jcmanage, jsonlib, models, streams
+from openrcv.jcblobs import BallotBlobStore
+from openrcv.jcmodels import JsonCaseContestInput
 from openrcv.utiltest.helpers import UnitCase
 
 
@@ -43,3 +48,294 @@ class ModuleTest(UnitCase):
         randint = self.make_randint(randint_vals)
         return patch('openrcv.jcmanage.randint', randint)
 
+
+
+class ContestsFileTest(UnitCase):
+
+    CONTESTS_FILE = {
+        "_meta": {"version": "0.1"},
+        "contests": [
+            {"_meta": {"id": "aaaa", "normalize_ballots": True},
+             "ballots": ["1 2", "1 1", "2 2"], "candidate_count": 2},
+            {"_meta": {"id": "bbbb"},
+             "ballots": ["1 2", "1 2"], "candidate_count": 2},
+            {"_meta": {"id": "cccc", "normalize_ballots": True},
+             "ballots": ["1 1 2", "1 1 2"], "candidate_count": 2},
+        ]
+    }
+
+    @contextmanager
+    def make_contests_path(self):
+        with TemporaryDirectory() as dir_path:
+            path = os.path.join(dir_path, "contests.json")
+            jsonlib.write_json(self.CONTESTS_FILE, path=path)
+            yield path
+
+    def test_normalize_contests_file(self):
+        for processes in (1, 2):
+            with self.subTest(processes=processes):
+                with self.make_contests_path() as path:
+                    summary = jcmanage.normalize_contests_file(path, processes=processes)
+                    jsobj = jsonlib.read_json_path(path)
+                self.assertEqual(summary, "normalized the ballots of 2 of 3 contests\n")
+                contests = jsobj["contests"]
+                self.assertEqual([c["ballots"] for c in contests],
+                                 [["1 1", "3 2"], ["1 2", "1 2"], ["2 1 2"]])
+                self.assertEqual([c["_meta"].get("ballots_digest") is None for c in contests],
+                                 [False, True, False])
+
+    def test_normalize_contests_file__unchanged(self):
+        """Check that contests are not normalized again unless their ballots change."""
+        with self.make_contests_path() as path:
+            jcmanage.normalize_contests_file(path)
+            summary = jcmanage.normalize_contests_file(path)
+            self.assertEqual(summary, "normalized the ballots of 0 of 3 contests\n")
+            jsobj = jsonlib.read_json_path(path)
+            jsobj["contests"][2]["ballots"].append("1 2")
+            jsonlib.write_json(jsobj, path=path)
+            summary = jcmanage.normalize_contests_file(path)
+            jsobj = jsonlib.read_json_path(path)
+        self.assertEqual(summary, "normalized the ballots of 1 of 3 contests\n")
+        self.assertEqual(jsobj["contests"][2]["ballots"], ["2 1 2", "1 2"])
+
+
+class UpdateTestInputsTest(UnitCase):
+
+    CONTESTS_FILE = {
+        "_meta": {"version": "0.1"},
+        "contests": [
+            {"_meta": {"id": "aaaa", "rule_sets": ["one", "two"]},
+             "ballots": ["2 1 2", "1 2"], "candidate_count": 2},
+            {"_meta": {"id": "bbbb", "rule_sets": ["two"]},
+             "ballots": ["1 1", "3 2"], "candidate_count": 2},
+        ]
+    }
+
+    @contextmanager
+    def make_paths(self):
+        with TemporaryDirectory() as dir_path:
+            contests_path = os.path.join(dir_path, "contests.json")
+            jsonlib.write_json(self.CONTESTS_FILE, path=contests_path)
+            tests_dir = os.path.join(dir_path, "tests")
+            os.mkdir(tests_dir)
+            yield contests_path, tests_dir
+
+    def read_inputs(self, tests_dir, rule_set):
+        jsobj = jsonlib.read_json_path(os.path.join(tests_dir, rule_set + ".json"))
+        return [test["input"] for test in jsobj["test_cases"]]
+
+    def test_update_test_inputs(self):
+        """Check that ballots in more than one tests file are stored once."""
+        with self.make_paths() as (contests_path, tests_dir):
+            jcmanage.update_test_inputs(contests_path, tests_dir, shared_ballots=True)
+            inputs_one = self.read_inputs(tests_dir, "one")
+            inputs_two = self.read_inputs(tests_dir, "two")
+            ballots_store = BallotBlobStore.for_tests_dir(tests_dir)
+            blob_count = len(os.listdir(ballots_store.dir_path))
+            self.assertEqual(ballots_store.get(inputs_two[1]["ballots_ref"]).to_jsobj(),
+                             ["1 1", "3 2"])
+            # Counting reads the ballots from the store.
+            jcmanage.update_test_outputs(tests_dir)
+            actual = json.loads(jcmanage.count_json_test_case(tests_dir, "two", 2))
+            results = jcmanage.check_tests(tests_dir, processes=2)
+        self.assertEqual([jc_input["_meta"]["id"] for jc_input in inputs_two],
+                         ["aaaa", "bbbb"])
+        self.assertEqual(inputs_one[0], inputs_two[0])
+        self.assertNotIn("ballots", inputs_one[0])
+        self.assertEqual(blob_count, 2)
+        self.assertEqual(actual["rounds"][0]["totals"], {'Ann': 1, 'Bob': 3})
+        self.assertEqual([r.error for r in results], [None, None, None])
+
+    def test_update_test_inputs__inline_ballots(self):
+        """Check that the ballots are inline by default."""
+        with self.make_paths() as (contests_path, tests_dir):
+            jcmanage.update_test_inputs(contests_path, tests_dir)
+            inputs_two = self.read_inputs(tests_dir, "two")
+            self.assertEqual(sorted(os.listdir(tests_dir)), ["one.json", "two.json"])
+        self.assertEqual([jc_input["ballots"] for jc_input in inputs_two],
+                         [["2 1 2", "1 2"], ["1 1", "3 2"]])
+        self.assertNotIn("ballots_ref", inputs_two[0])
+
+    def test_update_test_inputs__prune(self):
+        """Check that ballots no longer referred to are deleted."""
+        with self.make_paths() as (contests_path, tests_dir):
+            jcmanage.update_test_inputs(contests_path, tests_dir, shared_ballots=True)
+            ballots_store = BallotBlobStore.for_tests_dir(tests_dir)
+            old_refs = ballots_store.refs()
+            jsobj = jsonlib.read_json_path(contests_path)
+            jsobj["contests"][1]["ballots"] = ["5 1"]
+            jsonlib.write_json(jsobj, path=contests_path)
+            jcmanage.update_test_inputs(contests_path, tests_dir, shared_ballots=True)
+            new_refs = ballots_store.refs()
+            jcmanage.update_test_inputs(contests_path, tests_dir)
+            inline_refs = ballots_store.refs()
+        self.assertEqual(len(old_refs), 2)
+        self.assertEqual(len(new_refs), 2)
+        self.assertEqual(len(old_refs & new_refs), 1)
+        self.assertEqual(inline_refs, set())
+
+
+class TestsFileTest(UnitCase):
+
+    TESTS_FILE = {
+        "_meta": {"rule_set": "test", "version": "0.1"},
+        "test_cases": [
+            {"_meta": {"index": 1},
+             "input": {"ballots": ["2 1 2", "1 2"], "candidate_count": 2}},
+            {"_meta": {"index": 2},
+             "input": {"ballots": ["1 1", "3 2"], "candidate_count": 2}},
+        ]
+    }
+
+    @contextmanager
+    def make_tests_dir(self):
+        with TemporaryDirectory() as dir_path:
+            path = os.path.join(dir_path, "test.json")
+            jsonlib.write_json(self.TESTS_FILE, path=path)
+            yield dir_path, path
+
+    def test_count_json_test_case(self):
+        with self.make_tests_dir() as (dir_path, path):
+            actual = json.loads(jcmanage.count_json_test_case(dir_path, "test", 2))
+        self.assertEqual(actual["rounds"][0]["totals"], {'Ann': 1, 'Bob': 3})
+
+    def test_count_json_test_case__missing_index(self):
+        with self.make_tests_dir() as (dir_path, path):
+            with self.assertRaises(Exception):
+                jcmanage.count_json_test_case(dir_path, "test", 3)
+
+    def test_update_test_outputs_file(self):
+        with self.make_tests_dir() as (dir_path, path):
+            jcmanage.update_test_outputs_file(path)
+            jsobj = jsonlib.read_json_path(path)
+        self.assertEqual(jsobj["_meta"], self.TESTS_FILE["_meta"])
+        test_cases = jsobj["test_cases"]
+        self.assertEqual([test["input"]["ballots"] for test in test_cases],
+                         [["2 1 2", "1 2"], ["1 1", "3 2"]])
+        self.assertEqual([test["output"]["rounds"][0]["totals"] for test in test_cases],
+                         [{'Ann': 2, 'Bob': 1}, {'Ann': 1, 'Bob': 3}])
+        self.assertEqual([test["output"]["_meta"]["input_digest"] for test in test_cases],
+                         [jcmanage.input_digest(test["input"], "test")
+                          for test in self.TESTS_FILE["test_cases"]])
+
+    def test_input_digest(self):
+        jsobj = self.TESTS_FILE["test_cases"][0]["input"]
+        jc_input = JsonCaseContestInput.from_jsobj(jsobj)
+        digest = jcmanage.input_digest(jsobj, "test")
+        self.assertEqual(jcmanage.input_digest(jc_input, "test"), digest)
+        self.assertNotEqual(jcmanage.input_digest(jsobj, "other"), digest)
+        with patch("openrcv.__version__", "0.0.0"):
+            self.assertNotEqual(jcmanage.input_digest(jsobj, "test"), digest)
+
+    def test_update_test_outputs__processes(self):
+        """Check that counting in worker processes gives the same file."""
+        with self.make_tests_dir() as (dir_path, path):
+            jcmanage.update_test_outputs(dir_path)
+            with open(path) as f:
+                expected = f.read()
+            jsonlib.write_json(self.TESTS_FILE, path=path)
+            jcmanage.update_test_outputs(dir_path, processes=2)
+            with open(path) as f:
+                actual = f.read()
+        self.assertEqual(actual, expected)
+
+    def test_update_test_outputs__unchanged(self):
+        """Check that up-to-date outputs are reused, and the file is not rewritten."""
+        for processes in (1, 2):
+            with self.subTest(processes=processes):
+                with self.make_tests_dir() as (dir_path, path):
+                    summary = jcmanage.update_test_outputs(dir_path, processes=processes)
+                    self.assertEqual(summary, "recomputed 2 and reused 0 test outputs; "
+                                              "wrote 1 of 1 files\n")
+                    stat = os.stat(path)
+                    summary = jcmanage.update_test_outputs(dir_path, processes=processes)
+                    self.assertEqual(summary, "recomputed 0 and reused 2 test outputs; "
+                                              "wrote 0 of 1 files\n")
+                    self.assertEqual(os.stat(path).st_ino, stat.st_ino)
+                    self.assertEqual(os.listdir(dir_path), ["test.json"])
+
+    def test_update_test_outputs__changed_input(self):
+        """Check that only test cases with a changed input are recounted."""
+        for processes in (1, 2):
+            with self.subTest(processes=processes):
+                with self.make_tests_dir() as (dir_path, path):
+                    jcmanage.update_test_outputs(dir_path, processes=processes)
+                    jsobj = jsonlib.read_json_path(path)
+                    jsobj["test_cases"][1]["input"]["ballots"] = ["4 1", "3 2"]
+                    jsonlib.write_json(jsobj, path=path)
+                    summary = jcmanage.update_test_outputs(dir_path, processes=processes)
+                    jsobj = jsonlib.read_json_path(path)
+                self.assertEqual(summary, "recomputed 1 and reused 1 test outputs; "
+                                          "wrote 1 of 1 files\n")
+                self.assertEqual([test["output"]["rounds"][0]["totals"]
+                                  for test in jsobj["test_cases"]],
+                                 [{'Ann': 2, 'Bob': 1}, {'Ann': 4, 'Bob': 3}])
+
+    def test_update_test_outputs__error(self):
+        """Check that errors name the contest, and that the file is unchanged."""
+        tests_file = dict(self.TESTS_FILE)
+        tests_file["test_cases"] = tests_file["test_cases"] + [
+            {"_meta": {"index": 3}, "input": {"ballots": ["1 1"], "candidate_count": 0}}]
+        for processes in (1, 2):
+            with self.subTest(processes=processes):
+                with self.make_tests_dir() as (dir_path, path):
+                    jsonlib.write_json(tests_file, path=path)
+                    with self.assertRaises(Exception) as cm:
+                        jcmanage.update_test_outputs(dir_path, processes=processes)
+                    self.assertEqual(jsonlib.read_json_path(path), tests_file)
+                    self.assertEqual(os.listdir(dir_path), ["test.json"])
+                self.assertStartsWith(str(cm.exception),
+                                      "during contest: <JsonCaseTestInstance: [index=3 ")
+
+
+class CheckTestsTest(UnitCase):
+
+    TESTS_FILE = TestsFileTest.TESTS_FILE
+
+    @contextmanager
+    def make_tests_dir(self):
+        with TemporaryDirectory() as dir_path:
+            path = os.path.join(dir_path, "test.json")
+            jsonlib.write_json(self.TESTS_FILE, path=path)
+            jcmanage.update_test_outputs(dir_path)
+            yield dir_path, path
+
+    def test_check_tests(self):
+        for processes in (1, 2):
+            with self.subTest(processes=processes):
+                with self.make_tests_dir() as (dir_path, path):
+                    results = jcmanage.check_tests(dir_path, processes=processes)
+                self.assertEqual([(r.file_name, r.index, r.engine, r.error) for r in results],
+                                 [("test.json", 1, "irv", None), ("test.json", 2, "irv", None)])
+                for result in results:
+                    self.assertGreaterEqual(result.count_time, 0)
+
+    def test_check_tests__mismatch(self):
+        with self.make_tests_dir() as (dir_path, path):
+            jsobj = jsonlib.read_json_path(path)
+            jsobj["test_cases"][0]["output"]["rounds"][0]["totals"]["Ann"] = 3
+            del jsobj["test_cases"][1]["output"]
+            jsobj["test_cases"].append(
+                {"_meta": {"index": 3}, "input": {"ballots": ["1 1"], "candidate_count": 0}})
+            jsonlib.write_json(jsobj, path=path)
+            results = jcmanage.check_tests(dir_path, engine_labels=["irv"])
+        self.assertEqual([r.error for r in results],
+                         ["output differs", "test case has no output",
+                          "ValueError: dict has no values"])
+        self.assertIsNone(results[2].compare_time)
+
+    def test_format_check_results(self):
+        results = [
+            jcmanage.CheckResult("test.json", 1, "irv", None, 0.5, 1.25, 0.001),
+            jcmanage.CheckResult("test.json", 10, "irv", "output differs", 0.5, 12, 0.001),
+            jcmanage.CheckResult("test.json", 11, "irv", "ValueError: x", 0.5, None, None),
+        ]
+        expected = """\
+file       index  engine  parse (s)  count (s)  compare (s)  result
+test.json      1  irv        0.5000     1.2500       0.0010  ok
+test.json     10  irv        0.5000    12.0000       0.0010  FAIL: output differs
+test.json     11  irv        0.5000          -            -  FAIL: ValueError: x
+checked 3 test cases: 1 passed, 2 failed
+"""
+        self.assertEqual(jcmanage.format_check_results(results), expected)
+
@@ -23,9 +23,10 @@
 from textwrap import dedent
 
 from openrcv import models
-from openrcv.jsonlib import JsonableError, JsonDeserializeError, JS_NULL
-from openrcv.jcmodels import (from_jsobj, JsonCaseBallot, JsonCaseContestInput,
-                              JsonCaseRoundResult, JsonCaseTestOutput)
+from openrcv.jsonlib import iter_json, to_json, JsonableError, JsonDeserializeError, JS_NULL
+from openrcv.jcmodels import (from_jsobj, JsonCaseBallot, JsonCaseBallots, JsonCaseConstants,
+                              JsonCaseContestInput, JsonCaseRoundResult, JsonCaseTestInstance,
+                              JsonCaseTestOutput, JsonCaseTestsFile)
 from openrcv.models import ContestInput
 from openrcv.streams import ListResource
 from openrcv.utils import StreamInfo, StringInfo
@@ -63,6 +64,10 @@ class JsonCaseBallotTest(UnitCase):
         ballot = JsonCaseBallot(choices=[1, 2])
         self.assertEqual(ballot.choices, (1, 2))
 
+    def test_slots(self):
+        ballot = JsonCaseBallot(choices=(1, 2), weight=3)
+        self.assertFalse(hasattr(ballot, "__dict__"))
+
     def test_repr_info(self):
         cases = [
             (3, (1, 2), "weight=3 choices=(1, 2)"),
@@ -131,6 +136,48 @@ class JsonCaseBallotTest(UnitCase):
                 self.assertEqual(jc_ballot.to_jsobj(), expected)
 
 
+class JsonCaseBallotsTest(UnitCase):
+
+    JSOBJ = ["2 1 3", "1", "3 2"]
+
+    def test_from_jsobj(self):
+        jc_ballots = JsonCaseBallots.from_jsobj(self.JSOBJ)
+        self.assertEqual(len(jc_ballots), 3)
+        self.assertResourceContents(jc_ballots.resource, [(2, (1, 3)), (1, ()), (3, (2, ))])
+
+    def test_from_jsobj__bad_format(self):
+        with self.assertRaises(JsonDeserializeError):
+            JsonCaseBallots.from_jsobj(["1 2", "2 a 4"])
+
+    def test_to_jsobj(self):
+        jc_ballots = JsonCaseBallots.from_jsobj(self.JSOBJ)
+        self.assertEqual(jc_ballots.to_jsobj(), self.JSOBJ)
+        self.assertEqual(JsonCaseBallots().to_jsobj(), [])
+
+    def test_eq(self):
+        jc_ballots = JsonCaseBallots.from_jsobj(self.JSOBJ)
+        self.assertEqual(jc_ballots, JsonCaseBallots.from_jsobj(self.JSOBJ))
+        self.assertNotEqual(jc_ballots, JsonCaseBallots.from_jsobj(self.JSOBJ[:2]))
+        expected = make_jc_ballots([(2, (1, 3)), (1, ()), (3, (2, ))])
+        self.assertEqual(jc_ballots, expected)
+        self.assertEqual(expected, jc_ballots)
+        expected[2].weight = 4
+        self.assertNotEqual(jc_ballots, expected)
+        self.assertNotEqual(jc_ballots, 3)
+
+    def test_from_model(self):
+        jc_ballots = JsonCaseBallots.from_model(ListResource([(2, (1, 3)), (1, ())]))
+        self.assertEqual(jc_ballots.to_jsobj(), ["2 1 3", "1"])
+
+    def test_to_model(self):
+        """Check that the returned resource is a copy."""
+        jc_ballots = JsonCaseBallots.from_jsobj(self.JSOBJ)
+        resource = jc_ballots.to_model()
+        resource.append_ballot(1, (1, ))
+        self.assertEqual(len(jc_ballots), 3)
+        self.assertResourceContents(resource, [(2, (1, 3)), (1, ()), (3, (2, )), (1, (1, ))])
+
+
 class JsonCaseContestInputTest(UnitCase):
 
     cls = JsonCaseContestInput
@@ -187,6 +234,15 @@ class JsonCaseContestInputTest(UnitCase):
         expected.ballots = [JsonCaseBallot(weight=2, choices=(3, 1))]
         jc_contest.assert_equal(expected)
 
+    def test_from_model_streamed(self):
+        contest = ContestInput(name="Foo")
+        contest.candidates = ['Ann', 'Bob']
+        contest.ballots_resource = ListResource([(2, (2, 1)), (1, ())])
+        jc_contest = JsonCaseContestInput.from_model_streamed(contest)
+        expected = JsonCaseContestInput.from_model(contest)
+        self.assertEqual("".join(iter_json(jc_contest)), to_json(expected.to_jsobj()))
+        self.assertEqual(jc_contest.to_jsobj(), expected.to_jsobj())
+
     def test_to_model(self):
         cls = self.cls
         ballots = make_jc_ballots([(3, (2, 1))])
@@ -200,6 +256,15 @@ class JsonCaseContestInputTest(UnitCase):
         ]
         self.assertAttrs(contest, expected_attrs)
 
+    def test_to_model__ballots_ref(self):
+        jc_contest = self.cls.from_jsobj({"ballots_ref": "abc", "candidate_count": 2})
+        with self.assertRaises(JsonableError):
+            jc_contest.to_model()
+        ballots_store = {"abc": JsonCaseBallots.from_jsobj(["3 2 1"])}
+        contest = jc_contest.to_model(ballots_store=ballots_store)
+        with contest.ballots_resource.reading() as ballots:
+            self.assertEqual(list(ballots), [(3, (2, 1))])
+
 
     def test_from_jsobj__ballots(self):
         """Check that ballots deserialize okay."""
@@ -308,3 +373,41 @@ class JsonCaseTestOutputTest(UnitCase):
         results = JsonCaseTestOutput(rounds=rounds)
         self.assertEqual(results.to_jsobj(),
                          {'rounds': [{'totals': {'Ann': 2}}, {'totals': {'Carl': 4}}]})
+
+
+class JsonCaseTestInstanceTest(UnitCase):
+
+    def test_from_jsobj__lazy(self):
+        """Check that the input and output are deserialized only when accessed."""
+        jsobj = {"_meta": {"index": 1},
+                 "input": {"ballots": ["2 1"], "candidate_count": 2},
+                 "output": {"rounds": [{"totals": {"A": 2}}]}}
+        jc_test = JsonCaseTestInstance.from_jsobj(jsobj)
+        self.assertEqual(jc_test.index, 1)
+        self.assertFalse(jc_test.is_loaded("input"))
+        self.assertFalse(jc_test.is_loaded("output"))
+        jc_contest = jc_test.input
+        self.assertFalse(jc_contest.is_loaded("ballots"))
+        self.assertEqual(jc_contest.ballots, make_jc_ballots([(2, (1, ))]))
+        self.assertFalse(jc_test.is_loaded("output"))
+        self.assertEqual(jc_test.to_jsobj(), jsobj)
+
+
+class JsonCaseConstantsTest(UnitCase):
+
+    def test_slots(self):
+        constants = JsonCaseConstants(name="foo", candidate_names=["A"])
+        self.assertFalse(hasattr(constants, "__dict__"))
+        self.assertEqual(constants.to_jsobj(),
+                         {"_meta": {"name": "foo"}, "candidate_names": ["A"]})
+
+
+class JsonCaseTestsFileTest(UnitCase):
+
+    def test_slots(self):
+        jsobj = {"_meta": {"rule_set": "foo"},
+                 "test_cases": [{"_meta": {"index": 1}}]}
+        jc_file = JsonCaseTestsFile.from_jsobj(jsobj)
+        self.assertFalse(hasattr(jc_file, "__dict__"))
+        self.assertFalse(jc_file.is_loaded("test_cases"))
+        self.assertEqual(jc_file.to_jsobj(), jsobj)
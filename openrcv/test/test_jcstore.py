@@ -0,0 +1,121 @@
+#
+# Copyright (c) 2014 Chris Jerdonek. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+import json
+import os
+from tempfile import TemporaryDirectory
+
+from openrcv import jcmanage, jcstore, jsonlib
+from openrcv.jcmodels import JsonCaseContestInput, JsonCaseContestsFile
+from openrcv.jcstore import JsonContestsStore
+from openrcv.models import ContestInput
+from openrcv.streams import ListResource
+from openrcv.utiltest.helpers import UnitCase
+
+
+def make_contest(name, ballots):
+    return ContestInput(name=name, candidates=["A", "B"],
+                        ballots_resource=ListResource(ballots))
+
+
+class ModuleTest(UnitCase):
+
+    def test_is_store_path(self):
+        self.assertTrue(jcstore.is_store_path("foo/contests.jsonl"))
+        self.assertFalse(jcstore.is_store_path("foo/contests.json"))
+
+
+class JsonContestsStoreTest(UnitCase):
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "contests.jsonl")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def add_contests(self, store):
+        store.add_contest(make_contest("one", [(1, (1, 2))]))
+        store.add_contest(make_contest("two", [(2, (2, )), (1, ())]))
+
+    def test_empty(self):
+        store = JsonContestsStore(self.path)
+        self.assertEqual(store.count(), 0)
+        self.assertEqual(list(store.iter_contests()), [])
+
+    def test_add_contest(self):
+        store = JsonContestsStore(self.path)
+        self.add_contests(store)
+        self.assertEqual(store.count(), 2)
+        with open(self.path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[1])["ballots"], ["2 2", "1"])
+        # Check that a new instance reads the index written by append().
+        store = JsonContestsStore(self.path)
+        self.assertEqual(store.read_contest(1).name, "two")
+        self.assertEqual([c.name for c in store.iter_contests()], ["one", "two"])
+
+    def test_get_offsets__rebuild(self):
+        """Check that an index that is out of date is rebuilt."""
+        store = JsonContestsStore(self.path)
+        self.add_contests(store)
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"_meta": {"name": "three"}}) + "\n")
+        store = JsonContestsStore(self.path)
+        self.assertEqual(store.count(), 3)
+        self.assertEqual(store.read_contest(2).name, "three")
+        with open(store.index_path, "rb") as f:
+            self.assertEqual(len(f.read()), 3 * 8)
+
+    def test_save_contests_file(self):
+        store = JsonContestsStore(self.path)
+        self.add_contests(store)
+        jc_file = store.to_contests_file()
+        jc_file.version = "1.0"
+        jc_file.contests = jc_file.contests[1:]
+        store.save_contests_file(jc_file)
+        store = JsonContestsStore(self.path)
+        self.assertEqual(store.read_meta(), {"version": "1.0"})
+        self.assertEqual(store.count(), 1)
+        self.assertEqual(store.read_contest(0).name, "two")
+
+    def test_compact(self):
+        store = JsonContestsStore(self.path)
+        self.add_contests(store)
+        store.write_meta({"version": "1.0"})
+        contests_path = os.path.join(self.temp_dir.name, "contests.json")
+        store.compact(contests_path)
+        jsobj = jsonlib.read_json_path(contests_path)
+        jc_file = JsonCaseContestsFile.from_jsobj(jsobj)
+        self.assertEqual(jc_file.version, "1.0")
+        self.assertEqual([c.name for c in jc_file.contests], ["one", "two"])
+        self.assertEqual(jc_file.contests[1], store.read_contest(1))
+
+    def test_jcmanage(self):
+        """Check that jcmanage functions accept store paths."""
+        contest = make_contest("one", [(1, (2, )), (1, (1, 2)), (1, (2, ))])
+        jcmanage.add_contest_to_contests_file(contest, self.path)
+        jcmanage.normalize_contests_file(self.path)
+        jc_contest, = JsonContestsStore(self.path).iter_contests()
+        self.assertEqual(jc_contest.index, 1)
+        self.assertTrue(jc_contest.id)
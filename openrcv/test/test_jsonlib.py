@@ -25,7 +25,16 @@ Tests of jsonlib.
 
 """
 
-from openrcv.jsonlib import from_jsobj, Attribute, JsonableMixin, JS_NULL
+from io import StringIO
+import json
+import os
+from tempfile import TemporaryDirectory
+
+from openrcv.jsonlib import (attr_slots, from_jsobj, iter_json, open_json_array,
+                             read_json_path, to_json, to_jsobj, write_json, Attribute,
+                             JsonableError, JsonableMixin, JsonArrayStream, JsonDeserializeError,
+                             JsonStreamReader, JS_NULL)
+from openrcv.streams import ListResource, StringResource
 from openrcv.utiltest.helpers import UnitCase
 
 
@@ -52,6 +61,15 @@ class _SampleParentJsonable(JsonableMixin):
         return "simple=%r" % self.simple
 
 
+class _SampleLazyJsonable(JsonableMixin):
+
+    meta_attrs = (Attribute('id'), )
+    data_attrs = (Attribute('simple', _SampleJsonable, lazy=True),
+                  Attribute('items', _SampleJsonable, lazy=True), )
+
+    __slots__ = attr_slots(meta_attrs, data_attrs)
+
+
 class ModuleTest(UnitCase):
 
     def test_from_jsobj(self):
@@ -72,6 +90,222 @@ class ModuleTest(UnitCase):
         self.assertEqual(from_jsobj({'simple': {'bar': 'bar_value'}}, cls=_SampleParentJsonable), expected_sample)
 
 
+class IterJsonTest(UnitCase):
+
+    def assert_iter_json(self, obj, jsobj=None):
+        """Check that iter_json() matches to_json()."""
+        if jsobj is None:
+            jsobj = to_jsobj(obj)
+        self.assertEqual("".join(iter_json(obj)), to_json(jsobj))
+
+    def test_jsobj(self):
+        cases = [
+            1,
+            "a\nb",
+            None,
+            [],
+            {},
+            [1, [2, {}], {"b": [], "a": [None, 1.5, True]}],
+            {"x": {"y": {"z": ["\u00e9"]}}},
+            # Non-string keys.
+            {"a": {2: "b", 1: "c"}},
+        ]
+        for jsobj in cases:
+            with self.subTest(jsobj=jsobj):
+                self.assert_iter_json(jsobj)
+
+    def test_jsonable(self):
+        child = _SampleJsonable(bar=[1, 2], fizz={"b": 1, "a": 2})
+        obj = _SampleParentJsonable(simple=child)
+        self.assert_iter_json(obj)
+        self.assert_iter_json([obj, _SampleJsonable()])
+
+    def test_generator(self):
+        obj = _SampleJsonable(bar=(n for n in range(3)))
+        self.assert_iter_json(obj, jsobj={"bar": [0, 1, 2]})
+
+    def test_json_array_stream(self):
+        array = JsonArrayStream(ListResource([1, 2]), convert=str)
+        self.assertEqual(to_jsobj(array), ["1", "2"])
+        self.assert_iter_json(_SampleJsonable(bar=array), jsobj={"bar": ["1", "2"]})
+
+
+class WriteJsonTest(UnitCase):
+
+    def test_resource(self):
+        resource = StringResource()
+        write_json(_SampleJsonable(bar=[1, 2]), resource=resource)
+        self.assertEqual(resource.contents, '{\n    "bar": [\n        1,\n        2\n    ]\n}')
+
+    def test_path(self):
+        with TemporaryDirectory() as dir_path:
+            path = os.path.join(dir_path, "test.json")
+            write_json({"a": 1}, path=path)
+            self.assertEqual(read_json_path(path), {"a": 1})
+            self.assertEqual(os.listdir(dir_path), ["test.json"])
+
+    def test_path__mode(self):
+        """Check that a new file has the default mode, and an existing file keeps its mode."""
+        old_umask = os.umask(0o022)
+        try:
+            with TemporaryDirectory() as dir_path:
+                path = os.path.join(dir_path, "test.json")
+                write_json({"a": 1}, path=path)
+                self.assertEqual(os.stat(path).st_mode & 0o777, 0o644)
+                os.chmod(path, 0o664)
+                write_json({"a": 2}, path=path)
+                self.assertEqual(os.stat(path).st_mode & 0o777, 0o664)
+        finally:
+            os.umask(old_umask)
+
+    def test_path__error(self):
+        """Check that the file is unchanged if writing fails."""
+        def items():
+            yield 1
+            raise ValueError("error")
+
+        with TemporaryDirectory() as dir_path:
+            path = os.path.join(dir_path, "test.json")
+            write_json({"a": 1}, path=path)
+            with self.assertRaises(ValueError):
+                write_json({"a": items()}, path=path)
+            self.assertEqual(read_json_path(path), {"a": 1})
+            self.assertEqual(os.listdir(dir_path), ["test.json"])
+
+
+class JsonStreamReaderTest(UnitCase):
+
+    TEXT = """ {"a": [1, 23, {"b": "x\\"y"}], "bb": 1.5e10,
+                "c": {"d": [], "e": [true, null]}, "f": "" } """
+
+    def make_reader(self, text, chunk_size):
+        return JsonStreamReader(StringIO(text), chunk_size=chunk_size)
+
+    def test_read_value(self):
+        for chunk_size in (1, 2, 3, 1000):
+            with self.subTest(chunk_size=chunk_size):
+                reader = self.make_reader(self.TEXT, chunk_size)
+                self.assertEqual(reader.read_value(), json.loads(self.TEXT))
+
+    def test_read_value__number_at_chunk_end(self):
+        """Check that a number split across chunks is read whole."""
+        for text, expected in [("1234", 1234), ("1.5e10", 1.5e10)]:
+            for chunk_size in (1, 2, 3):
+                with self.subTest(text=text, chunk_size=chunk_size):
+                    reader = self.make_reader('{"a": %s}' % text, chunk_size=chunk_size)
+                    for key in reader.iter_object():
+                        self.assertEqual(reader.read_value(), expected)
+
+    def test_tell(self):
+        text = '["ab", {"c": 1}]'
+        for chunk_size in (1, 2, 1000):
+            with self.subTest(chunk_size=chunk_size):
+                reader = self.make_reader(text, chunk_size)
+                spans = []
+                for _ in reader.iter_array():
+                    start = reader.tell()
+                    reader.read_value()
+                    spans.append(text[start:reader.tell()])
+                self.assertEqual(spans, ['"ab"', ' {"c": 1}'])
+
+    def test_read_value__invalid(self):
+        reader = self.make_reader('{"a": [1, }', chunk_size=2)
+        with self.assertRaises(JsonDeserializeError):
+            reader.read_value()
+
+    def test_read_value__hooks(self):
+        def hook(items):
+            return [-item for item in items]
+
+        hooks = {("c", "e"): lambda items: list(map(str, items)), ("a", ): hook}
+        text = '{"a": [1, 2], "c": {"d": [3], "e": [4, {"x": 5}]}}'
+        for chunk_size in (1, 1000):
+            with self.subTest(chunk_size=chunk_size):
+                reader = self.make_reader(text, chunk_size)
+                self.assertEqual(reader.read_value(hooks=hooks),
+                                 {"a": [-1, -2], "c": {"d": [3], "e": ["4", "{'x': 5}"]}})
+
+    def test_read_value__hook_partial(self):
+        """Check that items a hook doesn't consume are skipped."""
+        reader = self.make_reader('{"a": [1, 2], "b": 3}', chunk_size=1)
+        self.assertEqual(reader.read_value(hooks={("a", ): next}), {"a": 1, "b": 3})
+
+    def test_iter_object(self):
+        reader = self.make_reader(self.TEXT, chunk_size=2)
+        actual = []
+        for key in reader.iter_object():
+            if key == "a":
+                actual.append((key, list(reader.iter_array_values())))
+            else:
+                actual.append((key, reader.read_value()))
+        self.assertEqual(dict(actual), json.loads(self.TEXT))
+
+
+class OpenJsonArrayTest(UnitCase):
+
+    def read(self, text, key="items"):
+        with TemporaryDirectory() as dir_path:
+            path = os.path.join(dir_path, "test.json")
+            with open(path, "w") as f:
+                f.write(text)
+            with open_json_array(path, key) as (jsdict, items):
+                return jsdict, list(items)
+
+    def test(self):
+        self.assertEqual(self.read('{"_meta": {"a": 1}, "items": [1, [2]]}'),
+                         ({"_meta": {"a": 1}}, [1, [2]]))
+
+    def test__missing_key(self):
+        self.assertEqual(self.read('{"_meta": 1}'), ({"_meta": 1}, []))
+
+    def test__key_after_array(self):
+        with self.assertRaises(JsonDeserializeError):
+            self.read('{"items": [], "z": 1}')
+
+
+class LazyAttributeTest(UnitCase):
+
+    JSOBJ = {"_meta": {"id": 1}, "simple": {"bar": 2}, "items": [{"bar": 3}]}
+
+    def test_from_jsobj(self):
+        jsonable = _SampleLazyJsonable.from_jsobj(self.JSOBJ)
+        self.assertEqual(jsonable.id, 1)
+        self.assertFalse(jsonable.is_loaded("simple"))
+        self.assertFalse(jsonable.is_loaded("items"))
+        self.assertEqual(jsonable.simple, _SampleJsonable(bar=2))
+        self.assertTrue(jsonable.is_loaded("simple"))
+        self.assertFalse(jsonable.is_loaded("items"))
+        self.assertEqual(jsonable.items, [_SampleJsonable(bar=3)])
+
+    def test_to_jsobj__not_loaded(self):
+        """Check that JSON objects not yet deserialized are passed through."""
+        jsonable = _SampleLazyJsonable.from_jsobj(self.JSOBJ)
+        jsobj = jsonable.to_jsobj()
+        self.assertEqual(jsobj, self.JSOBJ)
+        self.assertIs(jsobj["items"], self.JSOBJ["items"])
+        self.assertFalse(jsonable.is_loaded("items"))
+        self.assertEqual("".join(iter_json(jsonable)), "".join(iter_json(self.JSOBJ)))
+        self.assertFalse(jsonable.is_loaded("simple"))
+
+    def test_to_jsobj__loaded(self):
+        jsonable = _SampleLazyJsonable.from_jsobj(self.JSOBJ)
+        jsonable.simple.bar = 5
+        jsonable.items = []
+        self.assertEqual(jsonable.to_jsobj(),
+                         {"_meta": {"id": 1}, "simple": {"bar": 5}, "items": []})
+
+    def test_init(self):
+        jsonable = _SampleLazyJsonable(simple=_SampleJsonable(bar=2))
+        self.assertTrue(jsonable.is_loaded("simple"))
+        self.assertIsNone(jsonable.items)
+        self.assertEqual(jsonable.to_jsobj(), {"simple": {"bar": 2}})
+
+    def test_is_loaded__bad_name(self):
+        jsonable = _SampleLazyJsonable()
+        with self.assertRaises(AttributeError):
+            jsonable.is_loaded("foo")
+
+
 class JsonableMixinTest(UnitCase):
 
     def test_init(self):
@@ -95,6 +329,62 @@ class JsonableMixinTest(UnitCase):
         j = _SampleJsonable(fizz=3)
         self.assertEqual(j.repr_info(), "bar=None foo=3")
 
+    def test_keywords_to_attrs(self):
+        attrs = _SampleJsonable.keywords_to_attrs()
+        self.assertEqual(sorted(attrs), ["bar", "fizz"])
+        self.assertEqual(attrs["fizz"].name, "foo")
+        # Check that the class's own map can't be modified.
+        attrs.clear()
+        self.assertEqual(len(_SampleJsonable.keywords_to_attrs()), 2)
+
+    def test_keywords_to_init_defaults(self):
+        self.assertEqual(_SampleJsonable.keywords_to_init_defaults(),
+                         {"bar": None, "fizz": None})
+
+    def test_attr_slots(self):
+        class Sample(JsonableMixin):
+            meta_attrs = (Attribute('id'), )
+            data_attrs = (Attribute('foo', keyword='fizz'), )
+            __slots__ = attr_slots(meta_attrs, data_attrs)
+
+        self.assertEqual(Sample.__slots__, ("id", "foo"))
+        sample = Sample(id=1, fizz=2)
+        self.assertEqual(sample.to_jsobj(), {"_meta": {"id": 1}, "foo": 2})
+        with self.assertRaises(AttributeError):
+            sample.bar = 3
+
+    def test_to_jsobj__attribute_error(self):
+        class Sample(JsonableMixin):
+            data_attrs = (Attribute('foo'), )
+
+            @property
+            def foo(self):
+                raise TypeError("bad")
+
+            @foo.setter
+            def foo(self, value):
+                pass
+
+        with self.assertRaises(JsonableError) as cm:
+            Sample().to_jsobj()
+        self.assertEqual(str(cm.exception), "error getting attribute: 'foo'")
+
+    def test_attrs_to_jsdict(self):
+        sample = _SampleJsonable(bar=1, fizz=2)
+        attrs = _SampleJsonable.data_attrs[1:]
+        jsdict = {}
+        sample._attrs_to_jsdict(attrs, jsdict)
+        self.assertEqual(jsdict, {"foo": 2})
+        # Check that the functions are cached on the class.
+        funcs = _SampleJsonable._jsdict_funcs
+        self.assertIs(_SampleJsonable._get_jsdict_funcs(list(attrs)), funcs[attrs])
+        self.assertIs(funcs[_SampleJsonable.data_attrs][0], _SampleJsonable._data_to_jsdict)
+
+    def test_attrs_from_jsdict(self):
+        sample = _SampleJsonable(bar=1, fizz=2)
+        sample._attrs_from_jsdict(_SampleJsonable.data_attrs[:1], {"bar": 3, "foo": 4})
+        self.assertEqual((sample.bar, sample.foo), (3, 2))
+
     def test_eq(self):
         sample1 = _SampleJsonable()
         sample2 = _SampleJsonable()
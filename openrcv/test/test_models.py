@@ -20,10 +20,13 @@
 # DEALINGS IN THE SOFTWARE.
 #
 
+from contextlib import contextmanager
 from textwrap import dedent
 
 from openrcv import models
-from openrcv.models import normalize_ballots, normalize_ballots_to, BallotsResource, ContestInput
+from openrcv.models import (external_normalize_ballots_to, normalize_ballots,
+                            normalize_ballots_to, BallotsResource, CompactBallotsResource,
+                            ContestInput)
 from openrcv import streams
 from openrcv.streams import ListResource
 from openrcv.utils import StringInfo
@@ -57,6 +60,50 @@ class NormalizeBallotsToTest(UnitCase):
         self.assertEqual(normalized, [(3, ()), (4, (1,)), (2, (2,)), (1, (3,))])
 
 
+class ExternalNormalizeBallotsToTest(UnitCase):
+
+    """Tests of external_normalize_ballots_to()."""
+
+    BALLOTS = [
+        (1, (2, )),
+        (1, ()),
+        (1, (3, )),
+        (2, ()),
+        (4, (1, )),
+        (1, (2, )),
+        (1, (3, 1)),
+    ]
+
+    EXPECTED = [(3, ()), (4, (1,)), (2, (2,)), (1, (3,)), (1, (3, 1))]
+
+    def normalize(self, max_tally_size):
+        runs = []
+
+        @contextmanager
+        def make_temp():
+            run = ListResource()
+            runs.append(run)
+            yield run
+
+        target = ListResource()
+        external_normalize_ballots_to(ListResource(self.BALLOTS), target, make_temp,
+                                      max_tally_size=max_tally_size)
+        return target, runs
+
+    def test(self):
+        for max_tally_size in (1, 2, 3):
+            with self.subTest(max_tally_size=max_tally_size):
+                target, runs = self.normalize(max_tally_size)
+                self.assertTrue(runs)
+                self.assertResourceContents(target, self.EXPECTED)
+
+    def test__in_memory(self):
+        """Check that no runs are written if the tally fits in memory."""
+        target, runs = self.normalize(100)
+        self.assertEqual(runs, [])
+        self.assertResourceContents(target, self.EXPECTED)
+
+
 class NormalizeBallotTest(UnitCase):
 
     """Tests of normalize_ballots()."""
@@ -80,25 +127,24 @@ class NormalizeBallotTest(UnitCase):
         # Check that the original resource was normalized.
         with resource.reading() as gen:
             original_ballots = list(gen)
-        # TODO
-        #self.assertEqual(original_ballots, expected)
-        # TODO: check that the original backing list was also normalized.
+        self.assertEqual(original_ballots, expected)
 
 
 class BallotsResourceTest(UnitCase):
 
+    # We deliberately choose a list of ballots complicated enough to
+    # have better tests for (1) count_ballots() (by including weights
+    # greater than 1), and (2) normalize() (by listing the ballots out
+    # out of order and including multiple ballots with the same choice).
+    BALLOTS = [
+        (1, (3, )),
+        (1, ()),
+        (1, (2, )),
+        (2, ()),
+    ]
+
     def make_ballots_resource(self):
-        # We deliberately choose a list of ballots complicated enough to
-        # have better tests for (1) count_ballots() (by including weights
-        # greater than 1), and (2) normalize() (by listing the ballots out
-        # out of order and including multiple ballots with the same choice).
-        ballots = [
-            (1, (3, )),
-            (1, ()),
-            (1, (2, )),
-            (2, ()),
-        ]
-        resource = ListResource(ballots)
+        resource = ListResource(list(self.BALLOTS))
         ballots_resource = BallotsResource(resource)
         return ballots_resource
 
@@ -111,6 +157,10 @@ class BallotsResourceTest(UnitCase):
         count = resource.count_ballots()
         self.assertEqual(count, 5)
 
+    def test_stats(self):
+        resource = self.make_ballots_resource()
+        self.assertEqual(resource.stats(), models.BallotStats(4, 5, 3))
+
     def test_normalize(self):
         resource = self.make_ballots_resource()
         resource.normalize()
@@ -133,6 +183,33 @@ class BallotsResourceTest(UnitCase):
         self.assertEqual(ballots, [(1, (2, 3))])
 
 
+class CompactBallotsResourceTest(BallotsResourceTest):
+
+    def make_ballots_resource(self):
+        ballots_resource = CompactBallotsResource()
+        with ballots_resource.writing() as gen:
+            for ballot in self.BALLOTS:
+                gen.send(ballot)
+        return ballots_resource
+
+    def test_repr(self):
+        resource = self.make_ballots_resource()
+        self.assertStartsWith(repr(resource), "<CompactBallotsResource: [ballots=4] ")
+
+    def test_extend_ballots(self):
+        resource = self.make_ballots_resource()
+        resource.extend_ballots([3, 1], [1, 2, 4], [2, 3])
+        self.assertResourceContents(resource, [(1, (3,)), (1, ()), (1, (2,)), (2, ()),
+                                               (3, (1, 2)), (1, (4, ))])
+        self.assertEqual(resource.count_ballots(), 9)
+
+    def test_writing_batches(self):
+        resource = self.make_ballots_resource()
+        with resource.writing_batches() as gen:
+            gen.send([(1, (2, 3)), (2, ())])
+        self.assertResourceContents(resource, [(1, (2, 3)), (2, ())])
+
+
 class ContestInputTest(UnitCase):
 
     def test_init__defaults(self):
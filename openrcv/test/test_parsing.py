@@ -22,15 +22,52 @@
 
 from io import StringIO
 import os
+from tempfile import TemporaryDirectory
 from textwrap import dedent
 import unittest
+from unittest.mock import patch
 
-from openrcv.models import ContestInput
-from openrcv.parsing import BLTParser, ParsingError
+from openrcv.formats.internal import internal_ballots_resource
+from openrcv.models import CompactBallotsResource, ContestInput
+from openrcv.parsing import (_parse_blt_chunk, BLTParser, BulkBLTParser, ParallelBLTParser,
+                             ParsingError)
+from openrcv.streams import ListResource, StringResource
 from openrcv.utils import PathInfo, StringInfo
 from openrcv.utiltest.helpers import UnitCase
 
 
+# (old, new) replacements in BLTParserTest.BLT_STRING to check that other
+# parsers match BLTParser, e.g. for characters that str.splitlines() but
+# not BLTParser treats as line boundaries.
+PARITY_CASES = [
+    ('"Alice"', '"A\u2028B"'),
+    ('"My Election"', '"My\x85Election"'),
+    ("2 2 0", "1\x0c\x0c"),
+    ("2 2 0", "2 2\x0b0"),
+    ("2 2 0", "2 x\x0c0"),
+    ("1 2 4 3 1 0", "1 2\x1c4 3 1 0\u2029"),
+    ("\n    0\n", "\n    \x850\n"),
+    ("\n    0\n", "\n    0_0\n"),
+    # The optional withdrawn line.
+    ("-3\n", ""),
+    ("-3\n", "\n"),
+    ("-3\n", "2 x 0\n"),
+    ("-3\n    2 2 0\n    1 2 4 3 1 0\n", ""),
+]
+
+
+def get_parse_result(parser, stream_info):
+    """Return the parsed contest as a tuple, or the parsing error message."""
+    try:
+        info = parser.parse(stream_info)
+    except ParsingError as err:
+        # Unwrap the exception raised by StreamInfo.open().
+        return str(err.__context__)
+    with info.ballots_resource.reading() as gen:
+        ballots = list(gen)
+    return (info.name, info.candidates, info.withdrawn, info.ballot_count, ballots)
+
+
 class BLTParserTest(UnitCase):
 
     BLT_STRING = """\
@@ -46,44 +83,49 @@ class BLTParserTest(UnitCase):
     "My Election"
     """
 
-    def make_parser(self, blt_string, output_info=None):
-        parser = BLTParser(output_info)
+    def make_parser(self, blt_string, ballots_resource=None):
+        parser = BLTParser(ballots_resource)
         blt_stream = StringInfo(blt_string)
         return parser, blt_stream
 
-    def parse_blt(self, blt_string, output_info=None):
+    def parse_blt(self, blt_string, ballots_resource=None):
         """
         Arguments:
           blt_str: a BLT-formatted string.
-          output_info: a StreamInfo object.
+          ballots_resource: a ballots resource.
 
         """
-        parser, blt_stream = self.make_parser(blt_string, output_info=output_info)
+        parser, blt_stream = self.make_parser(blt_string, ballots_resource=ballots_resource)
         info = parser.parse(blt_stream)
         return info
 
     def test_init(self):
-        output_info = StringInfo()
-        parser = BLTParser(output_info)
-        self.assertIs(parser.output_info, output_info)
+        ballots_resource = ListResource()
+        parser = BLTParser(ballots_resource)
+        self.assertIs(parser.ballots_resource, ballots_resource)
 
     def test_init__no_args(self):
         parser = BLTParser()
-        output_info = parser.output_info
-        self.assertIs(type(output_info), PathInfo)
-        self.assertEqual(output_info.path, os.devnull)
+        self.assertIs(type(parser.ballots_resource), CompactBallotsResource)
 
-    # TODO: test passing
     # TODO: test extra blank and non-empty lines at end.
     def test_parse(self):
-        """Test passing an output StreamInfo object."""
-        output_info = StringInfo()
-        info = self.parse_blt(self.BLT_STRING, output_info=output_info)
+        """Test passing a ballots resource."""
+        ballots_resource = ListResource()
+        info = self.parse_blt(self.BLT_STRING, ballots_resource=ballots_resource)
         # TODO: test the other attributes.
         self.assertEqual(type(info), ContestInput)
         self.assertEqual(info.name, '"My Election"')
         self.assertEqual(info.ballot_count, 2)
-        self.assertEqual(output_info.value, "2 2\n1 2 4 3 1\n")
+        self.assertIs(info.ballots_resource, ballots_resource)
+        self.assertResourceContents(ballots_resource, [(2, (2, )), (1, (2, 4, 3, 1))])
+
+    def test_parse__internal_format(self):
+        """Test passing a ballots resource that serializes ballots."""
+        resource = StringResource()
+        info = self.parse_blt(self.BLT_STRING,
+                              ballots_resource=internal_ballots_resource(resource))
+        self.assertEqual(resource.contents, "2 2\n1 2 4 3 1\n")
 
     def test_parse__terminal_empty_lines(self):
         """Test a BLT string with empty lines at the end."""
@@ -105,9 +147,203 @@ class BLTParserTest(UnitCase):
                 with self.assertRaises(ParsingError):
                     info = self.parse_blt(self.BLT_STRING + suffix)
 
-    def test_parse__no_output_info(self):
-        """Test passing no output StreamInfo object."""
+    def test_parse__no_withdrawn_line(self):
+        """Test a BLT string without the optional withdrawn line."""
+        cases = [
+            ("-3\n", [(2, (2, )), (1, (2, 4, 3, 1))]),
+            ("-3\n    2 2 0\n    1 2 4 3 1 0\n", []),
+        ]
+        for old, ballots in cases:
+            with self.subTest(old=old):
+                ballots_resource = ListResource()
+                info = self.parse_blt(dedent(self.BLT_STRING.replace(old, "")),
+                                      ballots_resource=ballots_resource)
+                self.assertEqual(info.withdrawn, [])
+                self.assertEqual(info.ballot_count, len(ballots))
+                self.assertEqual(info.candidates, ['"Jen"', '"Alice"', '"Steve"', '"Bill"'])
+                self.assertResourceContents(ballots_resource, ballots)
+
+    def test_parse__no_ballots_resource(self):
+        """Test passing no ballots resource."""
         info = self.parse_blt(self.BLT_STRING)
         # TODO: test the other attributes.
         self.assertEqual(type(info), ContestInput)
         self.assertEqual(info.ballot_count, 2)
+        self.assertResourceContents(info.ballots_resource, [(2, (2, )), (1, (2, 4, 3, 1))])
+
+
+class BulkBLTParserTest(UnitCase):
+
+    BLT_STRING = BLTParserTest.BLT_STRING
+
+    # Small block sizes exercise lines that span block boundaries.
+    block_sizes = (1, 5, 1000)
+
+    def parse_blt(self, parser, blt_string):
+        return parser.parse(StringInfo(dedent(blt_string)))
+
+    def parsing_error(self, parser, blt_string):
+        """Return the message of the ParsingError raised by the parser."""
+        with self.assertRaises(ParsingError) as cm:
+            self.parse_blt(parser, blt_string)
+        # Unwrap the exception raised by StringInfo.open().
+        return str(cm.exception.__context__)
+
+    def test_init__no_args(self):
+        parser = BulkBLTParser()
+        self.assertIs(type(parser.ballots_resource), CompactBallotsResource)
+
+    def test_parse(self):
+        for block_size in self.block_sizes:
+            with self.subTest(block_size=block_size):
+                parser = BulkBLTParser(block_size=block_size)
+                info = self.parse_blt(parser, self.BLT_STRING)
+                self.assertEqual(type(info), ContestInput)
+                self.assertEqual(info.name, '"My Election"')
+                self.assertEqual(info.seat_count, 2)
+                self.assertEqual(info.withdrawn, [3])
+                self.assertEqual(info.candidates, ['"Jen"', '"Alice"', '"Steve"', '"Bill"'])
+                self.assertEqual(info.ballot_count, 2)
+                self.assertIs(info.ballots_resource, parser.ballots_resource)
+                self.assertResourceContents(info.ballots_resource,
+                                            [(2, (2, )), (1, (2, 4, 3, 1))])
+
+    def test_parse__same_as_line_parser(self):
+        """Check ballots that the bulk conversion does not handle."""
+        blt_string = self.BLT_STRING.replace("2 2 0", "2  2 0 \n    3 1")
+        expected = BLTParser().parse(StringInfo(dedent(blt_string)))
+        for block_size in self.block_sizes:
+            with self.subTest(block_size=block_size):
+                info = self.parse_blt(BulkBLTParser(block_size=block_size), blt_string)
+                self.assertEqual(info.ballot_count, expected.ballot_count)
+                self.assertResourceContents(info.ballots_resource,
+                                            [(2, (2, )), (3, ()), (1, (2, 4, 3, 1))])
+        self.assertResourceContents(expected.ballots_resource,
+                                    [(2, (2, )), (3, ()), (1, (2, 4, 3, 1))])
+
+    def test_parse__errors(self):
+        """Check that errors are reported the same as by BLTParser."""
+        cases = [
+            # Invalid ballot.
+            ("2 2 0", "2 x 0", 3),
+            # Blank ballot line.
+            ("1 2 4 3 1 0", "\n1 2 4 3 1 0", 4),
+            # Invalid line ending the ballots.
+            ("\n    0\n", "\n    0 x\n", 5),
+            # Missing candidate.
+            ('"Bill"\n', "", 9),
+            # Extra lines.
+            ('"My Election"\n', '"My Election"\nfoo', 11),
+        ]
+        for old, new, line_no in cases:
+            blt_string = self.BLT_STRING.replace(old, new)
+            expected = self.parsing_error(BLTParser(), blt_string)
+            self.assertStartsWith(expected, "error while parsing line %d: " % line_no)
+            for block_size in self.block_sizes:
+                with self.subTest(new=new, block_size=block_size):
+                    actual = self.parsing_error(BulkBLTParser(block_size=block_size),
+                                                blt_string)
+                    self.assertEqual(actual, expected)
+
+    def test_parse__parity(self):
+        """Check that the parser matches BLTParser for the PARITY_CASES."""
+        for old, new in PARITY_CASES:
+            blt_string = self.BLT_STRING.replace(old, new)
+            for block_size in self.block_sizes:
+                with self.subTest(new=new, block_size=block_size):
+                    expected = get_parse_result(BLTParser(), StringInfo(dedent(blt_string)))
+                    actual = get_parse_result(BulkBLTParser(block_size=block_size),
+                                              StringInfo(dedent(blt_string)))
+                    self.assertEqual(actual, expected)
+
+
+class ParallelBLTParserTest(UnitCase):
+
+    BLT_STRING = BLTParserTest.BLT_STRING
+
+    def parse_blt(self, blt_string, chunk_size=1):
+        """Parse a BLT string from a file, using small chunks."""
+        parser = ParallelBLTParser(processes=2, chunk_size=chunk_size)
+        with TemporaryDirectory() as dirname:
+            path = os.path.join(dirname, "test.blt")
+            with open(path, "w") as f:
+                f.write(dedent(blt_string))
+            return parser.parse(PathInfo(path, encoding="utf-8"))
+
+    def test_parse(self):
+        for chunk_size in (1, 1000):
+            with self.subTest(chunk_size=chunk_size):
+                info = self.parse_blt(self.BLT_STRING, chunk_size=chunk_size)
+                self.assertEqual(info.name, '"My Election"')
+                self.assertEqual(info.candidates, ['"Jen"', '"Alice"', '"Steve"', '"Bill"'])
+                self.assertEqual(info.ballot_count, 2)
+                self.assertResourceContents(info.ballots_resource,
+                                            [(2, (2, )), (1, (2, 4, 3, 1))])
+
+    def test_parse__in_memory(self):
+        """Check that in-memory streams are parsed without chunking."""
+        parser = ParallelBLTParser(processes=2, chunk_size=1)
+        info = parser.parse(StringInfo(dedent(self.BLT_STRING)))
+        self.assertEqual(info.ballot_count, 2)
+
+    def test_parse__error(self):
+        """Check that errors are reported with the line number in the file."""
+        blt_string = self.BLT_STRING.replace("1 2 4 3 1 0", "1 2 4 3 1 0\n    3 x 0")
+        with self.assertRaises(ParsingError) as cm:
+            self.parse_blt(blt_string)
+        self.assertEqual(str(cm.exception.__context__),
+                         "error while parsing line 5: '3 x 0\\n'")
+
+    def test_parse__parity(self):
+        """Check that the parser matches BLTParser for the PARITY_CASES."""
+        for old, new in PARITY_CASES:
+            blt_string = self.BLT_STRING.replace(old, new)
+            with self.subTest(new=new):
+                with TemporaryDirectory() as dirname:
+                    path = os.path.join(dirname, "test.blt")
+                    with open(path, "w", encoding="utf-8") as f:
+                        f.write(dedent(blt_string))
+                    stream_info = PathInfo(path, encoding="utf-8")
+                    expected = get_parse_result(BLTParser(), stream_info)
+                    actual = get_parse_result(ParallelBLTParser(processes=2, chunk_size=1),
+                                              stream_info)
+                self.assertEqual(actual, expected)
+
+    def test_parse__stops_at_ballots_end(self):
+        """Check that chunks after the end of the ballots section are not parsed."""
+        blt_string = self.BLT_STRING.replace('"Bill"\n', '"Bill"\n' + 40 * '    "Extra"\n')
+        blt_string = blt_string.replace("4 2\n", "44 2\n")
+        chunks = []
+        def parse_chunk(args):
+            chunks.append(args)
+            return _parse_blt_chunk(args)
+        with patch("openrcv.parsing._parse_blt_chunk", parse_chunk):
+            with TemporaryDirectory() as dirname:
+                path = os.path.join(dirname, "test.blt")
+                with open(path, "w") as f:
+                    f.write(dedent(blt_string))
+                parser = ParallelBLTParser(processes=1, chunk_size=1)
+                info = parser.parse(PathInfo(path, encoding="utf-8"))
+        self.assertEqual(len(info.candidates), 44)
+        # The two ballot lines and the line ending the ballots section.
+        self.assertEqual(len(chunks), 3)
+
+    def test_parse__error_crlf(self):
+        """Check that errors in CRLF files match those of BLTParser."""
+        cases = [
+            ("header", self.BLT_STRING.replace("-3", "-x")),
+            ("ballot", self.BLT_STRING.replace("1 2 4 3 1 0", "1 2 4 3 1 0\n    3 x 0")),
+        ]
+        for label, blt_string in cases:
+            with self.subTest(label=label):
+                with TemporaryDirectory() as dirname:
+                    path = os.path.join(dirname, "test.blt")
+                    with open(path, "w", newline="\r\n") as f:
+                        f.write(dedent(blt_string))
+                    messages = []
+                    for parser in (BLTParser(), ParallelBLTParser(processes=2, chunk_size=1)):
+                        with self.assertRaises(ParsingError) as cm:
+                            parser.parse(PathInfo(path, encoding="utf-8"))
+                        messages.append(str(cm.exception.__context__))
+                self.assertEqual(messages[0], messages[1])
+                self.assertNotIn("\\r", messages[0])
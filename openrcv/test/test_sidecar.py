@@ -0,0 +1,96 @@
+#
+# Copyright (c) 2014 Chris Jerdonek. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+
+import os
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from openrcv.sidecar import SidecarIndexMixin
+from openrcv.utiltest.helpers import UnitCase
+
+
+class _LineIndex(SidecarIndexMixin):
+
+    """Indexes the number of lines in a file."""
+
+    def __init__(self, path, version=1):
+        self.path = path
+        self.version = version
+        self.build_count = 0
+        self._index = None
+
+    def index_params(self):
+        return {"version": self.version}
+
+    def build_index(self, stat):
+        self.build_count += 1
+        with open(self.path) as f:
+            line_count = sum(1 for line in f)
+        return {"version": self.version, "size": stat.st_size, "mtime": stat.st_mtime,
+                "lines": line_count}
+
+
+class SidecarIndexMixinTest(UnitCase):
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "test.txt")
+        self.write("a\nb\n")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, text):
+        with open(self.path, "w") as f:
+            f.write(text)
+
+    def test_get_index(self):
+        index = _LineIndex(self.path)
+        self.assertEqual(index.get_index()["lines"], 2)
+        self.assertEqual(sorted(os.listdir(self.temp_dir.name)), ["test.txt", "test.txt.idx"])
+        # Check that a new object reads the index rather than scanning.
+        index = _LineIndex(self.path)
+        self.assertEqual(index.get_index()["lines"], 2)
+        self.assertEqual(index.build_count, 0)
+
+    def test_get_index__file_changed(self):
+        index = _LineIndex(self.path)
+        index.get_index()
+        self.write("a\nb\nc\n")
+        self.assertEqual(index.get_index()["lines"], 3)
+        self.assertEqual(index.build_count, 2)
+
+    def test_get_index__params_changed(self):
+        _LineIndex(self.path).get_index()
+        index = _LineIndex(self.path, version=2)
+        self.assertEqual(index.get_index()["version"], 2)
+        self.assertEqual(index.build_count, 1)
+
+    def test_write_index__error(self):
+        """Check that an error writing the index is logged, not raised."""
+        index = _LineIndex(self.path)
+        with patch("os.replace", side_effect=PermissionError("denied")):
+            with self.assertLogs("openrcv.sidecar", level="WARNING") as cm:
+                self.assertEqual(index.get_index()["lines"], 2)
+        self.assertIn("denied", cm.output[0])
+        # Check that the temp file was removed.
+        self.assertEqual(os.listdir(self.temp_dir.name), ["test.txt"])
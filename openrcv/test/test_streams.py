@@ -24,9 +24,13 @@ from contextlib import contextmanager
 import os
 import tempfile
 from tempfile import TemporaryDirectory
+import threading
+from unittest.mock import patch
 
+from openrcv.formats.internal import internal_ballots_resource
+from openrcv.models import BallotsResource
 from openrcv import streams
-from openrcv.streams import (tracked, FilePathResource,
+from openrcv.streams import (tracked, FilePathResource, ListResource,
                              ReadWriteFileResource, StringResource)
 from openrcv.utiltest.helpers import UnitCase
 
@@ -61,6 +65,25 @@ class TrackedTest(UnitCase):
         self.assertEqual(str(err), "last read item from 'foo' (number=2): 'b'")
         # TODO: check that "foo" is also in the exception.
 
+
+class BufferingPipeTest(UnitCase):
+
+    """Tests of buffering_pipe()."""
+
+    def test(self):
+        batches = []
+        target = streams._batch_sink(lambda target, items: target.append(list(items)),
+                                     batches)
+        gen = streams.buffering_pipe(target, batch_size=2)
+        for i in range(3):
+            gen.send(i)
+        # Check that only full batches were sent before closing.
+        self.assertEqual(batches, [[0, 1]])
+        gen.close()
+        self.assertEqual(batches, [[0, 1], [2]])
+        self.assertGeneratorClosed(gen)
+
+
 class StreamResourceTestMixin(object):
 
     """Base mixin for StreamResource tests."""
@@ -132,6 +155,24 @@ class StreamResourceTestMixin(object):
                 gen.send('c\n')
             self.assertGeneratorClosed(gen)
 
+    def test_writing__many_items(self):
+        """Check writing more items than fit in a single batch."""
+        items = ["%d\n" % i for i in range(2 * streams.WRITE_BATCH_SIZE + 1)]
+        with self.resource() as resource:
+            with resource.writing() as target:
+                for item in items:
+                    target.send(item)
+            self.assertResourceContents(resource, items)
+
+    def test_writing_batches(self):
+        with self.resource() as resource:
+            with resource.writing_batches() as target:
+                target.send(['c\n', 'd\n'])
+                target.send([])
+                target.send(['e\n'])
+            self.assertResourceContents(resource, ['c\n', 'd\n', 'e\n'])
+            self.assertGeneratorClosed(target)
+
     def test_writing__deletes(self):
         """Check that writing() deletes the current data."""
         with self.resource() as resource:
@@ -170,6 +211,24 @@ class ListResourceTest(StreamResourceTestMixin, UnitCase):
             self.assertResourceContents(resource, ["f\n"])
             self.assertResourceContents(temp_resource, [])
 
+    def test_replacement__error(self):
+        with self.resource() as resource:
+            with self.assertRaises(_Exception):
+                with resource.replacement() as temp_resource:
+                    with temp_resource.writing() as gen:
+                        gen.send("f\n")
+                    raise _Exception()
+            self.assertResourceContents(resource, ["a\n", "b\n"])
+
+    def test_move(self):
+        """Check that move() transfers the list rather than copying it."""
+        seq = ["a\n"]
+        resource = self.cls(seq)
+        dest = self.cls()
+        resource.move(dest)
+        self.assertIs(dest._seq, seq)
+        self.assertResourceContents(resource, [])
+
 class FilePathResourceTest(StreamResourceTestMixin, UnitCase):
 
     """FilePathResource tests."""
@@ -184,6 +243,61 @@ class FilePathResourceTest(StreamResourceTestMixin, UnitCase):
                 f.write('a\nb\n')
             yield FilePathResource(path)
 
+    def test_replacement(self):
+        with self.resource() as resource:
+            os.chmod(resource.path, 0o640)
+            with resource.replacement() as temp_resource:
+                self.assertEqual(os.path.dirname(temp_resource.path),
+                                 os.path.dirname(resource.path))
+                with temp_resource.writing() as gen:
+                    gen.send("f\n")
+                self.assertResourceContents(resource, ["a\n", "b\n"])
+            self.assertResourceContents(resource, ["f\n"])
+            self.assertEqual(os.stat(resource.path).st_mode & 0o777, 0o640)
+            # Check that the temp file was renamed rather than left behind.
+            self.assertEqual(os.listdir(os.path.dirname(resource.path)), ["temp.txt"])
+
+    def test_replacement__new_file(self):
+        """Check that a new file gets the default mode rather than mkstemp()'s."""
+        old_umask = os.umask(0o022)
+        try:
+            with TemporaryDirectory() as dirname:
+                resource = FilePathResource(os.path.join(dirname, 'new.txt'))
+                with resource.replacement() as temp_resource:
+                    with temp_resource.writing() as gen:
+                        gen.send("a\n")
+                self.assertEqual(os.stat(resource.path).st_mode & 0o777, 0o644)
+        finally:
+            os.umask(old_umask)
+
+    def test_copy__umask_unchanged(self):
+        """Check that the umask is not set, since that is not thread-safe."""
+        with TemporaryDirectory() as dirname:
+            resource = FilePathResource(os.path.join(dirname, 'new.txt'))
+            with patch("os.umask", side_effect=AssertionError("umask set")):
+                temp_resource = resource.copy()
+            self.assertTrue(os.path.exists(temp_resource.path))
+
+    def test_replacement__error(self):
+        with self.resource() as resource:
+            with self.assertRaises(_Exception):
+                with resource.replacement() as temp_resource:
+                    with temp_resource.writing() as gen:
+                        gen.send("f\n")
+                    raise _Exception()
+            self.assertResourceContents(resource, ["a\n", "b\n"])
+            self.assertEqual(os.listdir(os.path.dirname(resource.path)), ["temp.txt"])
+
+    def test_replacement__wrapped(self):
+        """Check that a converting resource uses the file's replacement."""
+        with self.resource() as resource:
+            with open(resource.path, "w") as f:
+                f.write("1 2\n2 1\n1 2\n")
+            ballots_resource = internal_ballots_resource(resource)
+            ballots_resource.normalize()
+            self.assertResourceContents(resource, ["2 1\n", "2 2\n"])
+            self.assertEqual(os.listdir(os.path.dirname(resource.path)), ["temp.txt"])
+
 
 class ReadWriteFileResourceTest(StreamResourceTestMixin, UnitCase):
 
@@ -224,6 +338,78 @@ class StringResourceTest(StreamResourceTestMixin, UnitCase):
         yield StringResource('a\nb\n')
 
 
+class ReadAheadResourceTest(StreamResourceTestMixin, UnitCase):
+
+    """ReadAheadResource tests."""
+
+    cls = streams.ReadAheadResource
+
+    def setUp(self):
+        self.thread_count = threading.active_count()
+
+    @contextmanager
+    def resource(self):
+        # Use small batches and a small queue to exercise blocking.
+        yield self.cls(ListResource(["a\n", "b\n"]), batch_size=1, max_batches=1)
+
+    def test_reading__many_items(self):
+        items = list(range(1000))
+        resource = self.cls(ListResource(items), batch_size=7, max_batches=2)
+        self.assertResourceContents(resource, items)
+        stats = resource.stats
+        self.assertEqual(stats.items, 1000)
+        self.assertEqual(stats.batches, 143)
+        self.assertLessEqual(stats.max_depth, 2)
+
+    def test_reading__early_exit(self):
+        """Check that exiting early stops the background thread."""
+        resource = self.cls(ListResource(list(range(1000))), batch_size=1, max_batches=1)
+        with resource.reading() as gen:
+            self.assertEqual(next(gen), 0)
+        self.assertGeneratorClosed(gen)
+        self.assertEqual(threading.active_count(), self.thread_count)
+
+    def test_reading__background_error(self):
+        """Check that errors in the background thread reach the consumer."""
+        backing = StringResource("1 2\n2 b 1\n")
+        resource = self.cls(internal_ballots_resource(backing))
+        with self.assertRaises(ValueError) as cm:
+            with resource.reading() as gen:
+                list(gen)
+        err = cm.exception
+        self.assertEndsWith(str(err), "(number=2): '2 b 1\\n'")
+        self.assertEqual(threading.active_count(), self.thread_count)
+
+    def test_reading__background_base_exception(self):
+        """Check that a BaseException in the background thread reaches the consumer."""
+        class _BaseError(BaseException):
+            pass
+        def fail(item):
+            raise _BaseError()
+        backing = streams.ConvertingResource(ListResource([1, 2]), converter=_Converter())
+        backing.converter.from_resource = fail
+        resource = self.cls(backing)
+        with self.assertRaises(_BaseError):
+            with resource.reading() as gen:
+                list(gen)
+        self.assertEqual(threading.active_count(), self.thread_count)
+
+    def test_reading__thread_exited(self):
+        """Check that the consumer does not wait forever if the thread dies."""
+        resource = self.cls(ListResource([1, 2]))
+        with patch.object(resource, "_produce", lambda *args: None):
+            with self.assertRaises(RuntimeError):
+                with resource.reading() as gen:
+                    list(gen)
+
+    def test_ballots_resource(self):
+        """Check composing with the internal ballots resource."""
+        backing = StringResource("1 2\n2 3 1\n")
+        resource = BallotsResource(self.cls(internal_ballots_resource(backing)))
+        self.assertEqual(resource.count_ballots(), 3)
+        self.assertResourceContents(resource, [(1, (2, )), (2, (3, 1))])
+
+
 class _Converter(object):
 
     def from_resource(self, item):
@@ -233,6 +419,14 @@ class _Converter(object):
         return 3 * item
 
 
+class _FailingConverter(_Converter):
+
+    def to_resource(self, item):
+        if item == 2:
+            raise ValueError("bad item: %r" % item)
+        return super().to_resource(item)
+
+
 class ConvertingResourceTest(UnitCase):
 
     """Tests of the ConvertingResource class."""
@@ -255,3 +449,26 @@ class ConvertingResourceTest(UnitCase):
                 gen.send(i)
         self.assertGeneratorClosed(gen)
         self.assertResourceContents(backing, [0, 3, 6, 9])
+
+    def test_writing__convert_error(self):
+        """Check that a conversion error is raised when the item is sent."""
+        backing = streams.ListResource()
+        resource = streams.ConvertingResource(backing, converter=_FailingConverter())
+        with resource.writing() as gen:
+            gen.send(0)
+            gen.send(1)
+            with self.assertRaises(ValueError) as cm:
+                gen.send(2)
+        self.assertEqual(str(cm.exception), "bad item: 2")
+        # The items sent before the error are still written.
+        self.assertResourceContents(backing, [0, 3])
+
+    def test_writing_batches(self):
+        backing = streams.ListResource()
+        converter = _Converter()
+        resource = streams.ConvertingResource(backing, converter=converter)
+        with resource.writing_batches() as gen:
+            gen.send([0, 1])
+            gen.send([2])
+        self.assertGeneratorClosed(gen)
+        self.assertResourceContents(backing, [0, 3, 6])
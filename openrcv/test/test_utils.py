@@ -20,12 +20,45 @@
 # DEALINGS IN THE SOFTWARE.
 #
 
+from concurrent.futures import ThreadPoolExecutor
 import sys
 
-from openrcv.utils import ObjectExtension, ReprMixin, StringInfo, UncloseableFile
+from openrcv.utils import (iter_executor_map, ObjectExtension, ReprMixin, StringInfo,
+                           UncloseableFile)
 from openrcv.utiltest.helpers import UnitCase
 
 
+class ModuleTest(UnitCase):
+
+    def test_iter_executor_map(self):
+        submitted = []
+
+        def items():
+            for item in range(10):
+                submitted.append(item)
+                yield item
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = iter_executor_map(executor, lambda x: 2 * x, items(), max_pending=3)
+            self.assertEqual(next(results), 0)
+            # Check that only max_pending items were submitted.
+            self.assertEqual(submitted, [0, 1, 2])
+            self.assertEqual(list(results), [2 * x for x in range(1, 10)])
+
+    def test_iter_executor_map__error(self):
+        def func(x):
+            if x == 2:
+                raise ValueError("foo")
+            return x
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = iter_executor_map(executor, func, range(10), max_pending=2)
+            self.assertEqual(next(results), 0)
+            self.assertEqual(next(results), 1)
+            with self.assertRaises(ValueError):
+                next(results)
+
+
 class ReprMixinTest(UnitCase):
 
     class ReprSample(ReprMixin):
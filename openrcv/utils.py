@@ -24,6 +24,8 @@
 Utility functions.
 """
 
+from collections import deque
+import concurrent.futures
 from contextlib import closing, contextmanager
 from datetime import datetime
 from io import StringIO
@@ -66,7 +68,7 @@ def fill(text, width=70):
 
 def join_values(values):
     """Return the values as a space-delimited string."""
-    return " ".join((str(v) for v in values))
+    return " ".join(map(str, values))
 
 
 def parse_integer_line(line):
@@ -79,7 +81,56 @@ def parse_integer_line(line):
     raised if one of the values does not parse to an integer.
 
     """
-    return (int(s) for s in line.split())
+    return map(int, line.split())
+
+
+def parallel_map(func, iterable, processes=None):
+    """Return a list of func(item) for each item, computed in a process pool.
+
+    The return values are in the same order as the items.
+
+    Arguments:
+      func: a function that can be pickled (e.g. a module-level function).
+        The items and return values must also be picklable.
+      processes: the maximum number of worker processes.  Defaults to the
+        number of CPUs.  A value of 1 calls func in the current process
+        without creating a pool, which is useful for debugging.
+    """
+    items = list(iterable)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = min(processes, len(items))
+    if processes <= 1:
+        return [func(item) for item in items]
+    log.debug("starting process pool (processes=%d): %d items" % (processes, len(items)))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(func, items))
+
+
+def iter_executor_map(executor, func, iterable, max_pending):
+    """Yield func(item) for each item, computed using an executor.
+
+    The return values are yielded in the same order as the items.  Unlike
+    with Executor.map(), at most max_pending items are submitted ahead of
+    the one whose return value is being waited for, so the items need not
+    all be in memory at once.
+
+    Arguments:
+      executor: a concurrent.futures.Executor object.
+      max_pending: the maximum number of items submitted at a time.
+    """
+    pending = deque()
+    try:
+        for item in iterable:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Don't wait for the remaining items, e.g. after an error.
+        for future in pending:
+            future.cancel()
 
 
 def log_create_dir(path):
@@ -188,6 +239,8 @@ class NoImplementation(NotImplementedError):
 
 class ReprMixin(object):
 
+    __slots__ = ()
+
     # TODO: look up the proper return type.
     def __repr__(self):
         desc = self.repr_info() or "--"
@@ -344,3 +397,7 @@ class FileWriter(object):
 
     def writeln(self, line):
         self.file.send(line + "\n")
+
+    def write(self, text):
+        """Write text, which can contain several lines."""
+        self.file.send(text)